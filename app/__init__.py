@@ -1,8 +1,10 @@
+import os
 import json
 from flask import Flask
 from os.path import expanduser
 
 app = Flask(__name__)
+app.secret_key = os.urandom(16)
 
 with open('app/config.json') as f:
     config = json.load(f)
@@ -906,9 +906,21 @@ function createFileItem(id, img_name) {
 }
 
 var images; // global, used in several functions, should consider alternative
+// incremented by every setFolder, so pages of a previous folder are dropped
+var folder_generation = 0;
 function setFolder(folder) {
+    images = [];
+    folder_generation++;
+    document.getElementById('file-list').innerHTML = '';
+    loadFolderPage(folder, 0, folder_generation);
+}
+
+// list the folder a page at a time, so large folders do not block the page
+function loadFolderPage(folder, offset, generation) {
     var formdata = {
-      'folder': folder
+      'folder': folder,
+      'offset': offset,
+      'limit': config.FOLDER_PAGE_SIZE
     };
 
     $.ajax({
@@ -917,32 +929,47 @@ function setFolder(folder) {
         async: true,
         data: formdata
     }).done(function(obj) {
-        images = obj;
+        if (generation !== folder_generation) {
+            return;
+        }
         var file_list = document.getElementById('file-list');
-        file_list.innerHTML = '';
-        for (var i = 0; i < images.length; i++) {
-            var image = images[i];
+        var page = [];
+        for (var j = 0; j < obj.images.length; j++) {
+            var image = obj.images[j];
+            var i = images.length;
+            images.push(image);
             var id = 'file-' + i.toString();
+            page.push({'image': image, 'id': id});
 
             // rewrite file list
             var file_item = createFileItem(id, image['filename']);
             file_list.append(file_item);
+        }
 
-            // get thumbnail urls
-            $.ajax({
-                type: 'POST',
-                url: '/get-thumbnail',
-                async: true,
-                data: {'uri': images[i].uri},
-                success_data: {
-                    'image': image,
-                    'id': id
+        // get thumbnail urls of the whole page at once
+        $.ajax({
+            type: 'POST',
+            url: '/get-thumbnails',
+            async: true,
+            data: {'uris': JSON.stringify(obj.images.map(function(image) { return image.uri; }))},
+            success_data: page
+        }).done(function(thumbnails) {
+            if (generation !== folder_generation) {
+                return;
+            }
+            for (var j = 0; j < thumbnails.length; j++) {
+                if (thumbnails[j] === null) {
+                    continue;
                 }
-            }).done(function(thumbnail) {
-                this.success_data['image'].thumbnail = thumbnail;
-                var img_el = $('#' + this.success_data['id']).children('img')[0];
-                $(img_el).attr('src', thumbnail);
-            });
+                var item = this.success_data[j];
+                item['image'].thumbnail = thumbnails[j];
+                var img_el = $('#' + item['id']).children('img')[0];
+                $(img_el).attr('src', thumbnails[j]);
+            }
+        });
+
+        if (obj.next !== null) {
+            loadFolderPage(folder, obj.next, generation);
         }
     }).fail(function(jq_xhr, text_status, error_thrown) {
         console.log(jq_xhr);
@@ -0,0 +1,72 @@
+"""
+Compare the resize backends over the image sizes the app handles: thumbnails
+of camera images, previews of full resolution images and upscaled crops.
+
+    python -m app.test.bench_resize
+"""
+
+import time
+
+import numpy as np
+
+from ..tools import resampling
+
+
+SIZES = [(512, 512), (1080, 1920), (3162, 4111)]
+SCALES = [0.1, 0.5, 2.0]
+DTYPES = ['uint8', 'uint16', 'float32']
+INTERPOLATIONS = ['nearest', 'linear', 'area']
+REPEATS = 3
+
+
+def smooth_image(shape, dtype):
+    """
+    Return image of SHAPE x 3 and DTYPE with detail at several scales.
+    """
+
+    rows, cols = np.mgrid[0:shape[0], 0:shape[1]]
+    img = np.sin(cols / 7.0) * np.cos(rows / 11.0) + np.sin((rows + cols) / 53.0)
+    img = (img - img.min()) / (img.max() - img.min())
+    if np.dtype(dtype).kind == 'u':
+        img = img * np.iinfo(dtype).max
+    return np.repeat(img[:, :, None], 3, axis=2).astype(dtype)
+
+def time_resize(data, output_shape, interpolation, backend):
+    """
+    Return best time in seconds of REPEATS resizes, or None if BACKEND does
+    not support them.
+    """
+
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        try:
+            resampling.resize(data, output_shape, interpolation, backend=backend)
+        except ValueError:
+            return None
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    header = '{:>12} {:>7} {:>6} {:>8} {:>8}' + ' {:>9}' * len(resampling.BACKENDS)
+    row = '{:>12} {:>7} {:>6} {:>8} {:>8}' + ' {:>9}' * len(resampling.BACKENDS)
+    print(header.format('size', 'dtype', 'scale', 'interp', 'chosen', *resampling.BACKENDS))
+    for shape in SIZES:
+        for dtype in DTYPES:
+            data = smooth_image(shape, dtype)
+            for scale in SCALES:
+                if shape[0] * scale > 4000:
+                    continue
+                output_shape = (int(shape[0] * scale), int(shape[1] * scale))
+                for interpolation in INTERPOLATIONS:
+                    times = [time_resize(data, output_shape, interpolation, backend)
+                             for backend in resampling.BACKENDS]
+                    chosen = resampling.choose_backend(
+                        data, output_shape + data.shape[2:], interpolation)
+                    print(row.format(
+                        '{}x{}'.format(*shape), dtype, scale, interpolation, chosen,
+                        *['-' if t is None else '{:.4f}'.format(t) for t in times]))
+
+if __name__ == '__main__':
+    main()
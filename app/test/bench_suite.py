@@ -0,0 +1,318 @@
+"""
+Benchmark suite for OpNet, the built-in ops and the io helpers. Results are
+written as JSON so runs can be compared over time.
+
+    python -m app.test.bench_suite [--quick] [--filter TEXT] [--output FILE]
+                                   [--compare FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import platform
+import tempfile
+import warnings
+import itertools
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import cv2 as cv
+from imageio import imwrite
+
+from ..tools import opnet, io, ops
+
+
+RESULTS_DIR = os.path.join('app', 'test', 'bench_results')
+# a benchmark is repeated until it ran this often and for this long
+MIN_RUNS = 3
+MIN_SECONDS = 0.2
+# median times this much slower than the baseline are reported as regressions
+REGRESSION_RATIO = 1.1
+
+BENCHMARKS = []
+
+
+def benchmark(name, params=None, quick=None):
+    """
+    Decorator registering a benchmark run for every combination of PARAMS, a
+    dict mapping param names to lists of values. QUICK optionally replaces
+    some of these lists in quick runs. The decorated function is called with
+    a scratch directory and the param values, prepares its inputs, and
+    returns the function to time.
+    """
+
+    def decorate(fn):
+        BENCHMARKS.append((name, fn, params or {}, quick or {}))
+        return fn
+    return decorate
+
+def measure(fn, min_runs=MIN_RUNS, min_seconds=MIN_SECONDS):
+    """
+    Return dict with the minimum, median and mean time in seconds of calls
+    to FN, which is called at least MIN_RUNS times and for MIN_SECONDS.
+    """
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_runs or time.perf_counter() - start < min_seconds:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    return {
+        'min': min(times),
+        'median': float(np.median(times)),
+        'mean': float(np.mean(times)),
+        'runs': len(times)
+    }
+
+def run(quick=False, name_filter=None, log=print):
+    """
+    Run the registered benchmarks whose name contains NAME_FILTER and return
+    the results along with metadata about this machine and revision.
+    """
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for name, fn, params, quick_params in BENCHMARKS:
+            if name_filter and name_filter not in name:
+                continue
+            grid = dict(params, **quick_params) if quick else params
+            keys = list(grid)
+            for values in itertools.product(*(grid[key] for key in keys)):
+                case = dict(zip(keys, values))
+                timed = fn(workdir, **case)
+                stats = measure(timed, min_runs=1 if quick else MIN_RUNS,
+                                min_seconds=0 if quick else MIN_SECONDS)
+                results.append(dict(name=name, params=case, **stats))
+                log('{:<24} {:<56} {:>10.5f} s'.format(
+                    name, _format_params(case), stats['median']))
+
+    return {'meta': _metadata(quick), 'results': results}
+
+def compare(baseline, current, ratio=REGRESSION_RATIO):
+    """
+    Return list of (name, params, baseline median, current median, ratio,
+    regressed) tuples for the benchmarks found in both result dicts.
+    """
+
+    old = {_result_key(r): r for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        before = old.get(_result_key(r))
+        if before is None:
+            continue
+        change = r['median'] / before['median'] if before['median'] > 0 else float('inf')
+        rows.append((r['name'], r['params'], before['median'], r['median'], change,
+                     change > ratio))
+    return rows
+
+def _result_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+def _format_params(params):
+    return ' '.join('{}={}'.format(key, value) for key, value in params.items())
+
+def _metadata(quick):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'quick': quick,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+# OpNet
+
+def _increment(x):
+    return x + 1
+
+def _build_net(n_nodes, shape):
+    """
+    Return OpNet of N_NODES increment nodes. A 'chain' feeds every node into
+    the next one; a 'layered' graph feeds each node of a layer of ten into
+    the node of the same column in the next layer.
+    """
+
+    width = 1 if shape == 'chain' else 10
+    net = opnet.OpNet()
+    nodes = []
+    for i in range(n_nodes):
+        feed = i >= width
+        nodes.append(net.add_node(_increment, {'x': None if feed else 0}, ['x'],
+                                  name='n{}'.format(i)))
+        if feed:
+            net.bind(nodes[i - width], 'x', nodes[i], 'x')
+    return net
+
+@benchmark('opnet.build', {'nodes': [10, 100, 1000, 10000, 50000], 'shape': ['chain', 'layered']},
+           quick={'nodes': [10, 1000]})
+def bench_build(workdir, nodes, shape):
+    return lambda: _build_net(nodes, shape)
+
+@benchmark('opnet.run', {'nodes': [10, 100, 1000, 10000, 50000], 'shape': ['chain', 'layered'],
+                         'executor': ['sequential', 'threads']},
+           quick={'nodes': [10, 1000], 'executor': ['sequential']})
+def bench_run(workdir, nodes, shape, executor):
+    net = _build_net(nodes, shape)
+    return lambda: net.run(executor=executor)
+
+@benchmark('opnet.run_incremental', {'nodes': [1000, 50000]}, quick={'nodes': [1000]})
+def bench_run_incremental(workdir, nodes):
+    net = _build_net(nodes, 'layered')
+    net.run()
+    last = net.get_node('n{}'.format(nodes - 1))
+    return lambda: (last.get_param('x').set_value(0), net.run(incremental=True))
+
+# ops
+
+IMAGE_SHAPES = [(256, 256), (1024, 1024), (3000, 4000, 3)]
+DTYPES = ['uint8', 'uint16', 'float32']
+
+OP_CASES = {
+    'multiply': {'scale': 1.5},
+    'convert_data_type': {'datatype': 'float32'},
+    'rescale_range': {'out_min': 10, 'out_max': 200},
+    'standardize': {},
+    'normalize_percentiles': {'low': 1.0, 'high': 99.0},
+    'resize_image': {'output_shape': (300, 300)},
+    'adjust_brightness': {'b': 20},
+    'adjust_contrast': {'c': 30}
+}
+
+def list_ops():
+    """
+    Return names of the functions defined in app.tools.ops. Raises
+    ValueError if an op has no entry in OP_CASES, so new ops are benchmarked.
+    """
+
+    names = sorted(name for name, fn in inspect.getmembers(ops, inspect.isfunction)
+                   if fn.__module__.startswith(ops.__name__) and not name.startswith('_'))
+    missing = [name for name in names if name not in OP_CASES]
+    if missing:
+        raise ValueError('No benchmark params for ops: {}'.format(', '.join(missing)))
+    return names
+
+def make_image(shape, dtype, seed=0):
+    """
+    Return random image of SHAPE and DTYPE spanning the range of DTYPE, or
+    [0, 1] for floats.
+    """
+
+    rng = np.random.default_rng(seed)
+    if np.dtype(dtype).kind == 'f':
+        return rng.random(shape, dtype=dtype)
+    return rng.integers(0, np.iinfo(dtype).max, shape, dtype=dtype, endpoint=True)
+
+@benchmark('ops', {'op': list_ops(), 'shape': IMAGE_SHAPES, 'dtype': DTYPES},
+           quick={'shape': IMAGE_SHAPES[:2], 'dtype': ['uint8', 'float32']})
+def bench_op(workdir, op, shape, dtype):
+    fn = getattr(ops, op)
+    data = make_image(shape, dtype)
+    return lambda: fn(data=data, **OP_CASES[op])
+
+# io
+
+def _image_folder(workdir, n_images, shape, ext):
+    """
+    Return folder in WORKDIR holding N_IMAGES random images of SHAPE saved
+    with extension EXT, creating it on first use.
+    """
+
+    folder = os.path.join(workdir, 'images-{}-{}-{}'.format(n_images, 'x'.join(map(str, shape)),
+                                                            ext.strip('.')))
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+        for i in range(n_images):
+            imwrite(os.path.join(folder, 'img{:05}{}'.format(i, ext)),
+                    make_image(shape, 'uint8', seed=i))
+    return folder
+
+@benchmark('io.list_files', {'images': [10, 100, 1000]}, quick={'images': [10, 100]})
+def bench_list_files(workdir, images):
+    folder = _image_folder(workdir, images, (8, 8), '.png')
+    return lambda: io.list_files(folder, valid_exts=io.IMAGE_EXTS)
+
+@benchmark('io.count_data_types', {'images': [10, 100], 'size': [256, 1024]},
+           quick={'images': [10], 'size': [256]})
+def bench_count_data_types(workdir, images, size):
+    folder = _image_folder(workdir, images, (size, size, 3), '.png')
+    names = io.list_all_images(folder)
+    return lambda: io.count_data_types(names)
+
+@benchmark('io.create_thumbnail', {'size': [512, 2048, 4096], 'ext': ['.png', '.jpg']},
+           quick={'size': [512, 2048]})
+def bench_create_thumbnail(workdir, size, ext):
+    folder = _image_folder(workdir, 1, (size, size, 3), ext)
+    name = io.list_all_images(folder)[0]
+    thumb = os.path.join(workdir, 'thumb.jpg')
+    return lambda: io.create_thumbnail(name, thumb)
+
+@benchmark('io.json_sanitize', {'size': [256, 1024], 'base64': [False, True]},
+           quick={'size': [256]})
+def bench_json_sanitize(workdir, size, base64):
+    data = make_image((size, size, 3), 'uint8')
+    temp_dir = os.path.join('app', 'static', 'temp')
+    os.makedirs(temp_dir, exist_ok=True)
+
+    def sanitize():
+        path, _ = io.json_sanitize(data, base64_images=base64)
+        if not base64:
+            os.remove(os.path.join(temp_dir, os.path.basename(path)))
+    return sanitize
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='run smaller cases once each')
+    parser.add_argument('--filter', default=None,
+                        help='only run benchmarks whose name contains this text')
+    parser.add_argument('--output', default=None,
+                        help='JSON file to write results to (default: a new file in {})'.format(
+                            RESULTS_DIR))
+    parser.add_argument('--compare', default=None,
+                        help='JSON results of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    results = run(quick=args.quick, name_filter=args.filter)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, '{}-{}.json'.format(
+            stamp, (results['meta']['commit'] or 'unknown')[:8]))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Results written to {}'.format(output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        print('{:<24} {:<56} {:>10} {:>10} {:>7}'.format(
+            'benchmark', 'params', 'baseline', 'current', 'ratio'))
+        for name, params, before, after, change, regressed in compare(baseline, results):
+            regressions += regressed
+            print('{:<24} {:<56} {:>10.5f} {:>10.5f} {:>6.2f}x{}'.format(
+                name, _format_params(params), before, after, change,
+                '  SLOWER' if regressed else ''))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
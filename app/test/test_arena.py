@@ -0,0 +1,60 @@
+import numpy as np
+
+from ..tools import opnet, plan, arena
+from ..tools.ops import adjust_brightness, multiply
+
+
+def test_idle_buffers_are_reused():
+    pool = arena.BufferArena(1 << 20)
+    first = pool.acquire((16, 16), 'uint8')
+    address = first.ctypes.data
+    held = first[4:]
+    del first
+
+    # a view of the buffer is still alive
+    assert pool.acquire((16, 16), 'uint8').ctypes.data != address
+    del held
+    assert pool.acquire((16, 16), 'uint8').ctypes.data == address
+    assert pool.acquire((8, 8), 'float32').dtype == np.float32
+
+def test_budget_evicts_idle_buffers():
+    pool = arena.BufferArena(1000)
+    pool.acquire((100,), 'float64')
+    pool.acquire((50,), 'float64')
+    assert pool.total_bytes <= 1000
+
+    held = pool.acquire((120,), 'float64')
+    assert pool.total_bytes == 960
+    # no room left beside the held buffer, so this one is not kept
+    pool.acquire((10,), 'float64')
+    assert pool.total_bytes == 960
+    del held
+
+def test_runs_recycle_buffers():
+    data = np.random.default_rng(0).integers(0, 200, (64, 64), dtype='uint8')
+    net = opnet.OpNet()
+    net.add_node(adjust_brightness, {'data': data, 'b': 10}, ['data'], name='b')
+    net.add_node(multiply, {'data': None, 'scale': 2}, ['data'], name='m')
+    net.bind('b', 'data', 'm', 'data')
+
+    compiled = plan.Plan(net)
+    state = compiled.new_state()
+    pool = arena.BufferArena(1 << 20)
+    first = compiled.run(state, arena=pool)
+    kept = first[-1]['outputs']['data']
+    expected = np.array(kept)
+
+    for b in (10, 20, 10):
+        results = compiled.run(state, literals={('b', 'b'): b}, arena=pool)
+    np.testing.assert_array_equal(results[-1]['outputs']['data'], expected)
+    # outputs still held by the caller are never handed out again
+    np.testing.assert_array_equal(kept, expected)
+    assert pool.hits > 0
+
+    net_results = net.run(arena=pool)
+    np.testing.assert_array_equal(net_results[-1]['outputs']['data'], expected)
+
+def test_buffer_param_is_hidden_from_client():
+    manager = opnet.OperationsManager([[multiply, 'Math', 'data']])
+    names = [p['name'] for p in manager.ops['multiply']['info']['params']]
+    assert names == ['data', 'scale']
@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+
+from ..tools import bands
+from ..tools.ops import multiply, adjust_brightness, adjust_contrast, convert_data_type
+
+
+def test_bands_cover_rows_with_context():
+    bands.configure(min_bytes=0, workers=4)
+    try:
+        data = np.arange(40 * 3).reshape(40, 3)
+        out = np.zeros_like(data)
+        threads = set()
+
+        def shift_rows(src, dst, top):
+            # each output row is the sum of the rows around it
+            threads.add(threading.current_thread().name)
+            padded = np.pad(src, ((1, 1), (0, 0)))
+            summed = padded[:-2] + padded[1:-1] + padded[2:]
+            dst[...] = summed[top:top + len(dst)]
+
+        bands.map_bands(shift_rows, data, out, halo=1)
+        padded = np.pad(data, ((1, 1), (0, 0)))
+        np.testing.assert_array_equal(out, padded[:-2] + padded[1:-1] + padded[2:])
+        assert all(name.startswith('band') for name in threads)
+    finally:
+        bands.configure()
+
+def test_ops_give_same_results_in_bands():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (97, 64, 3), dtype='uint8')
+    ops = [
+        lambda: multiply(img, 1.5)['data'],
+        lambda: multiply(img, 1.5, precision='native')['data'],
+        lambda: adjust_brightness(img, 20)['data'],
+        lambda: adjust_contrast(img.astype('float32'), 30)['data'],
+        lambda: convert_data_type(img, 'float32')['data'],
+    ]
+    whole = [op() for op in ops]
+
+    bands.configure(min_bytes=0, workers=3)
+    try:
+        for op, ref in zip(ops, whole):
+            got = op()
+            assert got.dtype == ref.dtype
+            np.testing.assert_array_equal(got, ref)
+    finally:
+        bands.configure()
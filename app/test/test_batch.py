@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from ..tools import opnet
+from .example_operations import op_mult
+
+
+def build_net(calls):
+    def constant(arg1, arg2):
+        calls.append('constant')
+        return arg1 + arg2
+
+    net = opnet.OpNet()
+    const = net.add_node(constant, {'arg1': 1, 'arg2': 1}, ['data'], name='const')
+    scale = net.add_node(op_mult, {'arg1': None, 'arg2': None}, ['data'], name='scale')
+    net.bind(const, 'data', scale, 'arg2')
+    return net
+
+def test_run_batch_yields_results_in_order():
+    calls = []
+    net = build_net(calls)
+    inputs = [{('scale', 'arg1'): i} for i in range(5)]
+    out = [(item[('scale', 'arg1')], results[-1]['outputs']['data']) 
+           for item, results in net.run_batch(inputs, loader=lambda v: v * 10)]
+    assert out == [(i, i * 20) for i in range(5)]
+    # the branch that does not depend on the batch input only ran once
+    assert calls == ['constant']
+
+def test_prefetch_is_bounded():
+    loaded = []
+    def load(value):
+        loaded.append(value)
+        return value
+
+    net = build_net([])
+    inputs = ({('scale', 'arg1'): i} for i in range(100))
+    batch = net.run_batch(inputs, loader=load, prefetch=2)
+    next(batch)
+    time.sleep(0.2)
+    # one item running, at most two waiting and one blocked on the queue
+    assert len(loaded) <= 4
+    batch.close()
+
+def test_loader_errors_propagate():
+    def load(value):
+        raise IOError('unreadable')
+
+    net = build_net([])
+    with pytest.raises(IOError):
+        list(net.run_batch([{('scale', 'arg1'): 1}], loader=load))
@@ -0,0 +1,21 @@
+from . import bench_suite
+from ..tools import ops
+
+
+def test_suite_records_comparable_results():
+    results = bench_suite.run(quick=True, name_filter='opnet.build', log=lambda line: None)
+    assert results['meta']['quick']
+    assert {r['name'] for r in results['results']} == {'opnet.build'}
+    assert all(r['runs'] >= 1 and 0 < r['min'] <= r['median'] for r in results['results'])
+
+    slower = {'meta': {}, 'results': [dict(r, median=r['median'] * 2) 
+                                      for r in results['results']]}
+    rows = bench_suite.compare(results, slower)
+    assert len(rows) == len(results['results'])
+    assert all(regressed for *_, regressed in rows)
+    assert not any(regressed for *_, regressed in bench_suite.compare(slower, results))
+
+def test_every_op_is_benchmarked():
+    names = bench_suite.list_ops()
+    assert 'multiply' in names and 'resize_image' in names
+    assert all(callable(getattr(ops, name)) for name in names)
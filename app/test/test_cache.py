@@ -0,0 +1,87 @@
+import os
+import threading
+
+import numpy as np
+
+from ..tools import opnet, cache
+from .example_operations import op_add, op_mult
+
+
+def build_net(data, scale):
+    net = opnet.OpNet()
+    node1 = net.add_node(op_mult, {'arg1': data, 'arg2': scale}, ['data'], name='scale')
+    node2 = net.add_node(op_add, {'arg1': None, 'arg2': 1}, ['data'], name='shift')
+    net.bind(node1, 'data', node2, 'arg1')
+    return net
+
+def test_results_are_reused_across_graphs(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path), 1 << 30)
+    data = np.arange(1 << 19, dtype='float64')
+
+    first = build_net(data, 2.0).run(result_cache=result_cache)
+    result_cache.flush()
+    assert result_cache.misses == 2 and len(result_cache.entries) == 2
+
+    # a fresh cache over the same folder behaves like a restarted server
+    result_cache = cache.ResultCache(str(tmp_path), 1 << 30)
+    second = build_net(data.copy(), 2.0).run(result_cache=result_cache)
+    assert result_cache.hits == 2
+    out = second[1]['outputs']['data']
+    assert isinstance(out, np.memmap)
+    np.testing.assert_array_equal(out, first[1]['outputs']['data'])
+
+    build_net(data, 3.0).run(result_cache=result_cache)
+    assert result_cache.misses == 2
+
+def test_literal_param_keys_and_code_changes():
+    assert cache.value_digest([1, 2.0, 'a']) == cache.value_digest([1, 2.0, 'a'])
+    assert cache.value_digest(np.zeros(3)) != cache.value_digest(np.zeros(3, 'float32'))
+    assert cache.value_digest(object()) is None
+    assert cache.op_digest(op_add) != cache.op_digest(op_mult)
+
+    offset = 1
+    def closure(arg1):
+        return arg1 + offset
+    assert cache.op_digest(closure) is None
+
+def test_op_keys_cover_helpers_and_package_versions(monkeypatch):
+    # changing any local helper changes the keys of local ops
+    local = cache.op_digest(op_add)
+    monkeypatch.setattr(cache, '_tools_digest', 'changed')
+    assert cache.op_digest(op_add) != local
+
+    # upgrading a package changes the keys of its ops, even those with code
+    package = cache.op_digest(np.lib.stride_tricks.as_strided)
+    monkeypatch.setattr(np, '__version__', np.__version__ + '.post1')
+    assert cache.op_digest(np.lib.stride_tricks.as_strided) != package
+
+def test_eviction_is_least_recently_used(tmp_path):
+    block = {'data': np.zeros(1 << 10)}
+    result_cache = cache.ResultCache(str(tmp_path), 1 << 30)
+    result_cache.put('aa1', block)
+    result_cache.max_bytes = 3 * result_cache.total_bytes
+    for key in ('bb2', 'cc3'):
+        result_cache.put(key, block)
+    assert result_cache.get('aa1') is not None
+    result_cache.put('dd4', block)
+    assert 'bb2' not in result_cache
+    assert 'aa1' in result_cache and 'dd4' in result_cache
+
+def test_put_later_serves_entries_until_written(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path), 1 << 30)
+    started = threading.Event()
+    release = threading.Event()
+    # hold the writer so the entry stays pending
+    result_cache.writer.submit(lambda: started.set() or release.wait(5))
+    started.wait(5)
+
+    data = np.arange(10.0)
+    result_cache.put_later('aa1', {'data': data})
+    assert 'aa1' in result_cache and 'aa1' not in result_cache.entries
+    assert result_cache.get('aa1')['data'] is data
+
+    release.set()
+    result_cache.flush()
+    assert not result_cache.pending
+    assert os.path.exists(os.path.join(str(tmp_path), 'aa', 'aa1', cache.INDEX_FNAME))
+    np.testing.assert_array_equal(result_cache.get('aa1')['data'], data)
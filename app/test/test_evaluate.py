@@ -0,0 +1,63 @@
+from ..tools import opnet, cache
+from .example_operations import op_add, op_mult
+
+
+def build_branches(calls):
+    def record(arg1, arg2):
+        calls.append((arg1, arg2))
+        return arg1 + arg2
+
+    # a -> b -> c and a -> d, where d is expensive and not always needed
+    net = opnet.OpNet()
+    a = net.add_node(record, {'arg1': 1, 'arg2': 1}, ['data'], name='a')
+    b = net.add_node(record, {'arg1': None, 'arg2': 10}, ['data'], name='b')
+    c = net.add_node(record, {'arg1': None, 'arg2': 100}, ['data'], name='c')
+    d = net.add_node(record, {'arg1': None, 'arg2': 1000}, ['data'], name='d')
+    net.bind(a, 'data', b, 'arg1')
+    net.bind(b, 'data', c, 'arg1')
+    net.bind(a, 'data', d, 'arg1')
+    return net
+
+def test_evaluate_runs_only_ancestors():
+    calls = []
+    net = build_branches(calls)
+    results = net.evaluate([('b', 'data')])
+
+    assert results == [{'node': 'b', 'outputs': {'data': 12}}]
+    assert calls == [(1, 1), (2, 10)]
+    assert net.get_node('c').is_dirty() and net.get_node('d').is_dirty()
+
+def test_evaluate_reuses_clean_nodes():
+    calls = []
+    net = build_branches(calls)
+    net.evaluate([('b', 'data')], incremental=True)
+    del calls[:]
+
+    results = net.evaluate([('c', 'data'), ('d', 'data')], incremental=True)
+    assert [r['node'] for r in results] == ['d', 'c']
+    assert sorted(calls) == [(2, 1000), (12, 100)]
+
+def test_evaluate_with_keep_retains_targets():
+    calls = []
+    net = build_branches(calls)
+    results = net.evaluate([('c', 'data')], keep=[])
+
+    assert results == [{'node': 'c', 'outputs': {'data': 112}}]
+    assert net.get_node('a').output_values()['data'] is None
+
+def test_cache_hit_skips_upstream_of_target(tmp_path):
+    def build():
+        net = opnet.OpNet()
+        a = net.add_node(op_add, {'arg1': 1, 'arg2': 1}, ['data'], name='a')
+        b = net.add_node(op_mult, {'arg1': None, 'arg2': 3}, ['data'], name='b')
+        net.bind(a, 'data', b, 'arg1')
+        return net
+
+    result_cache = cache.ResultCache(str(tmp_path), 1 << 20)
+    build().evaluate([('b', 'data')], result_cache=result_cache)
+
+    net = build()
+    results = net.evaluate([('b', 'data')], result_cache=result_cache)
+    assert results == [{'node': 'b', 'outputs': {'data': 6}}]
+    # a is not loaded nor executed, since b was found in the cache
+    assert net.get_node('a').output_values()['data'] is None
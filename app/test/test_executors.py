@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from ..tools import opnet, executors
+from .example_operations import op_add, op_mult
+
+
+def build_diamond(barrier=None):
+    def wait_and_add(arg1, arg2):
+        if barrier is not None:
+            barrier.wait()
+        return arg1 + arg2
+
+    net = opnet.OpNet()
+    src = net.add_node(op_add, {'arg1': 1, 'arg2': 2}, ['data'], name='src')
+    left = net.add_node(wait_and_add, {'arg1': None, 'arg2': 10}, ['data'], name='left')
+    right = net.add_node(wait_and_add, {'arg1': None, 'arg2': 20}, ['data'], name='right')
+    join = net.add_node(op_mult, {'arg1': None, 'arg2': None}, ['data'], name='join')
+    net.bind(src, 'data', left, 'arg1')
+    net.bind(src, 'data', right, 'arg1')
+    net.bind(left, 'data', join, 'arg1')
+    net.bind(right, 'data', join, 'arg2')
+    return net
+
+def test_threads_match_sequential():
+    expected = build_diamond().run()
+    assert build_diamond().run(executor='threads', max_workers=4) == expected
+    assert expected[-1] == {'node': 'join', 'outputs': {'data': 13 * 23}}
+
+def test_threads_run_independent_branches_concurrently():
+    # both branches must be waiting at the barrier at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    results = build_diamond(barrier).run(executor='threads', max_workers=2)
+    assert results[-1]['outputs']['data'] == 13 * 23
+
+def test_thread_errors_propagate():
+    def fail(arg1):
+        raise RuntimeError('boom')
+
+    net = opnet.OpNet()
+    node1 = net.add_node(op_add, {'arg1': 1, 'arg2': 2}, ['data'])
+    node2 = net.add_node(fail, {'arg1': None}, ['data'])
+    net.bind(node1, 'data', node2, 'arg1')
+    with pytest.raises(RuntimeError):
+        net.run(executor='threads')
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        build_diamond().run(executor='gpu')
+
+def test_processes_share_large_arrays():
+    np = pytest.importorskip('numpy')
+    data = np.arange(1 << 20, dtype='float32').reshape(1024, 1024)
+
+    net = opnet.OpNet()
+    node1 = net.add_node(op_mult, {'arg1': data, 'arg2': 2.0}, ['data'])
+    node2 = net.add_node(op_add, {'arg1': None, 'arg2': 1.0}, ['data'])
+    # defined locally, so it cannot be pickled and runs in the parent process
+    node3 = net.add_node(lambda arg1: arg1.sum(), {'arg1': None}, ['data'])
+    net.bind(node1, 'data', node2, 'arg1')
+    net.bind(node2, 'data', node3, 'arg1')
+
+    results = net.run(executor='processes', max_workers=2)
+    out = results[1]['outputs']['data']
+    np.testing.assert_array_equal(out, data * 2.0 + 1.0)
+    assert results[2]['outputs']['data'] == (data * 2.0 + 1.0).sum()
+    # results outlive the shared memory blocks of the run
+    assert node2.output_values()['data'] is out
+
+def test_processes_are_not_forked(monkeypatch):
+    contexts = []
+    pool = executors.ProcessPoolExecutor
+    def record(*args, **kwargs):
+        contexts.append(kwargs.get('mp_context'))
+        return pool(*args, **kwargs)
+    monkeypatch.setattr(executors, 'ProcessPoolExecutor', record)
+
+    results = build_diamond().run(executor='processes', max_workers=2)
+    assert results[-1]['outputs']['data'] == build_diamond().run()[-1]['outputs']['data']
+    assert contexts[0].get_start_method() != 'fork'
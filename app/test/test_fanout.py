@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from ..tools import opnet
+from .example_operations import op_add, op_mult
+
+
+@opnet.mutates_params('arg1')
+def add_in_place(arg1, arg2):
+    arg1 += arg2
+    return arg1
+
+def write_in_place(arg1):
+    arg1[0] = -1
+    return arg1
+
+def build_fanout(op):
+    net = opnet.OpNet()
+    src = net.add_node(op_mult, {'arg1': np.ones(4), 'arg2': 2.0}, ['data'], name='src')
+    first = net.add_node(op_add, {'arg1': None, 'arg2': 1.0}, ['data'], name='first')
+    second = net.add_node(op, {'arg1': None, 'arg2': 10.0}, ['data'], name='second')
+    net.bind(src, 'data', first, 'arg1')
+    net.bind(src, 'data', second, 'arg1')
+    return net
+
+def test_output_feeds_many_params_without_copies():
+    net = build_fanout(op_add)
+    src = net.get_node('src').get_output('data')
+    assert len(src.conduits) == 2
+
+    results = {r['node']: r['outputs']['data'] for r in net.run()}
+    np.testing.assert_array_equal(results['first'], np.full(4, 3.0))
+    np.testing.assert_array_equal(results['second'], np.full(4, 12.0))
+
+    value = net.get_node('first').get_param('arg1').get_value()
+    assert np.shares_memory(value, results['src'])
+    assert not value.flags.writeable
+
+def test_mutating_ops_get_private_copies():
+    net = build_fanout(add_in_place)
+    results = {r['node']: r['outputs']['data'] for r in net.run()}
+    np.testing.assert_array_equal(results['src'], np.full(4, 2.0))
+    np.testing.assert_array_equal(results['second'], np.full(4, 12.0))
+
+def test_undeclared_mutation_is_rejected():
+    net = opnet.OpNet()
+    src = net.add_node(op_mult, {'arg1': np.ones(4), 'arg2': 2.0}, ['data'])
+    node = net.add_node(write_in_place, {'arg1': None}, ['data'])
+    net.bind(src, 'data', node, 'arg1')
+    with pytest.raises(ValueError):
+        net.run()
+
+def test_unbinding_one_consumer_keeps_the_other():
+    net = build_fanout(op_add)
+    net.run()
+    conduit = net.get_node('src').get_output('data').conduits[1]
+    net.unbind(conduit)
+    assert net.get_node('second').get_param('arg1').get_value() is None
+    assert net.get_node('first').get_param('arg1').get_value() is not None
+
+def test_rebinding_a_param_replaces_its_conduit():
+    net = build_fanout(op_add)
+    net.bind('first', 'data', 'second', 'arg1')
+    assert len(net.conduits) == 2
+    assert len(net.get_node('src').get_output('data').conduits) == 1
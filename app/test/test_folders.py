@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+from imageio import imwrite
+
+from ..tools import folders, probe, io
+
+
+def test_index_only_probes_new_and_changed_files(tmp_path, monkeypatch):
+    images = tmp_path / 'images'
+    images.mkdir()
+    for i in range(3):
+        imwrite(str(images / 'img{}.png'.format(i)), np.full((4, 6), i, dtype='uint8'))
+    (images / 'notes.txt').write_text('not an image')
+
+    probed = []
+    probe_images = probe.probe_images
+    monkeypatch.setattr(probe, 'probe_images',
+                        lambda uris, max_workers=None: probed.extend(uris) or probe_images(uris))
+
+    db = str(tmp_path / 'index' / 'folders.sqlite')
+    index = folders.FolderIndex(db)
+    names = index.scan(str(images), io.IMAGE_EXTS)
+    assert [os.path.basename(n) for n in names] == ['img0.png', 'img1.png', 'img2.png']
+    assert [p['shape'] for p in index.probes(names)] == [(4, 6)] * 3
+    assert index.entries(names)[names[0]]['thumb_key'] == io.hash_file(names[0])
+    index.close()
+
+    # reopened index keeps the probes of unchanged files
+    imwrite(names[1], np.zeros((8, 8, 3), dtype='uint8'))
+    os.utime(names[1], ns=(0, 10 ** 9))
+    os.remove(names[2])
+    del probed[:]
+    index = folders.FolderIndex(db)
+    names = index.scan(str(images), io.IMAGE_EXTS)
+    assert len(names) == 2
+    assert [p['shape'] for p in index.probes(names)] == [(4, 6), (8, 8, 3)]
+    assert probed == [names[1]]
+
+    del probed[:]
+    index.probes(names)
+    assert probed == []
+    index.close()
@@ -0,0 +1,95 @@
+import pytest
+
+from ..tools import opnet
+from .example_operations import op_add
+
+
+class CountingDict(dict):
+    """
+    Dict counting the keys looked up and the scans over all its items.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+        self.scans = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.lookups += 1
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+    def __iter__(self):
+        self.scans += 1
+        return super().__iter__()
+
+    def keys(self):
+        self.scans += 1
+        return super().keys()
+
+    def values(self):
+        self.scans += 1
+        return super().values()
+
+    def items(self):
+        self.scans += 1
+        return super().items()
+
+def build_and_bind(n, net=None):
+    net = net or opnet.OpNet()
+    for i in range(n):
+        net.add_node(op_add, {'arg1': None if i else 1, 'arg2': 1}, ['data'], 
+                     name='n{}'.format(i))
+    for i in range(1, n):
+        net.bind('n{}'.format(i - 1), 'data', 'n{}'.format(i), 'arg1')
+    return net
+
+def count_build_and_bind(n):
+    net = opnet.OpNet()
+    net._nodes, net._conduits = CountingDict(), CountingDict()
+    build_and_bind(n, net)
+    return net._nodes, net._conduits
+
+def test_build_and_bind_scales_linearly():
+    # the time taken is tracked by the opnet.build benchmark
+    small = count_build_and_bind(500)
+    large = count_build_and_bind(5000)
+    # no node or conduit is found by scanning the graph, and 10x the nodes 
+    # take about 10x the lookups, where quadratic lookups would take ~100x
+    assert all(index.scans == 0 for index in small + large)
+    assert all(big.lookups <= 11 * few.lookups for few, big in zip(small, large))
+
+    net = build_and_bind(50000)
+    assert len(net.nodes) == 50000 and len(net.conduits) == 49999
+    assert net.get_node('n49999').get_param('arg1').is_dirty()
+
+def test_remove_updates_indexes():
+    net = build_and_bind(3)
+    conduit = next(iter(net.conduits))
+    net.remove_node(net.get_node('n1'))
+
+    assert [node.name for node in net.nodes] == ['n0', 'n2']
+    assert len(net.conduits) == 0
+    assert net.get_node('n0').get_output('data').conduits == []
+    with pytest.raises(NameError):
+        net.get_node('n1')
+    with pytest.raises(ValueError):
+        net.unbind(conduit)
+
+def test_node_names_are_unique():
+    net = opnet.OpNet()
+    net.add_node(op_add, {'arg1': 1, 'arg2': 1}, ['data'], name='a')
+    with pytest.raises(ValueError):
+        net.add_node(op_add, {'arg1': 1, 'arg2': 1}, ['data'], name='a')
+
+    # generated names stay unique past the range of their random suffix
+    for _ in range(12000):
+        net.add_node(op_add, {'arg1': 1, 'arg2': 1}, ['data'])
+    assert len({node.name for node in net.nodes}) == 12001
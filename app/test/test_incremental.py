@@ -0,0 +1,53 @@
+from ..tools import opnet
+from .example_operations import op_add, op_mult
+
+
+def build_counted_chain(calls):
+    def counted(name, op):
+        def wrapped(**kwargs):
+            calls.append(name)
+            return op(**kwargs)
+        return wrapped
+
+    net = opnet.OpNet()
+    load = net.add_node(counted('load', op_add), {'arg1': 1, 'arg2': 2}, ['data'], name='load')
+    scale = net.add_node(counted('scale', op_mult), {'arg1': None, 'arg2': 10}, ['data'], name='scale')
+    shift = net.add_node(counted('shift', op_add), {'arg1': None, 'arg2': 5}, ['data'], name='shift')
+    net.add_node(counted('other', op_add), {'arg1': 0, 'arg2': 0}, ['data'], name='other')
+    net.bind(load, 'data', scale, 'arg1')
+    net.bind(scale, 'data', shift, 'arg1')
+    return net
+
+def test_incremental_runs_only_changed_nodes_and_descendants():
+    calls = []
+    net = build_counted_chain(calls)
+    first = net.run(incremental=True)
+    assert sorted(calls) == ['load', 'other', 'scale', 'shift']
+
+    del calls[:]
+    assert net.run(incremental=True) == first
+    assert calls == []
+
+    net.get_node('scale').get_param('arg2').set_value(100)
+    results = net.run(incremental=True)
+    assert calls == ['scale', 'shift']
+    assert results[0] == first[0]
+    assert {r['node']: r['outputs']['data'] for r in results}['shift'] == 305
+
+def test_binding_marks_consumer_dirty():
+    calls = []
+    net = build_counted_chain(calls)
+    net.run(incremental=True)
+
+    del calls[:]
+    net.bind('other', 'data', 'shift', 'arg2')
+    results = net.run(incremental=True)
+    assert calls == ['shift']
+    assert results[-1]['outputs']['data'] == 30
+
+def test_full_run_ignores_flags():
+    calls = []
+    net = build_counted_chain(calls)
+    net.run(incremental=True)
+    net.run()
+    assert len(calls) == 8
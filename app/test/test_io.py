@@ -0,0 +1,37 @@
+import os
+
+from ..tools import io
+
+
+def make_tree(root):
+    # root/{a.png, b.JPG, notes.txt, sub/{c.tif, deeper/d.png}, link -> sub}
+    for name in ('a.png', 'b.JPG', 'notes.txt', 'sub/c.tif', 'sub/deeper/d.png'):
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+    os.symlink(str(root / 'sub'), str(root / 'link'))
+
+def names(paths, root):
+    return sorted(os.path.relpath(p, str(root)) for p in paths)
+
+def test_list_files(tmp_path):
+    make_tree(tmp_path)
+    root = str(tmp_path)
+
+    assert names(io.list_files(root), tmp_path) == ['a.png', 'b.JPG', 'notes.txt']
+    assert names(io.list_all_images(root), tmp_path) == ['a.png', 'b.JPG']
+    assert names(io.list_files(root, return_dirs=True, return_files=False), tmp_path) == \
+        ['link', 'sub']
+    # symbolic links to directories are listed but not searched
+    assert names(io.list_files(root, recursive=True, valid_exts=io.IMAGE_EXTS), tmp_path) == \
+        ['a.png', 'b.JPG', 'sub/c.tif', 'sub/deeper/d.png']
+    assert names(io.list_files(root, return_dirs=True, recursive=True), tmp_path) == \
+        ['a.png', 'b.JPG', 'link', 'notes.txt', 'sub', 'sub/c.tif', 'sub/deeper',
+         'sub/deeper/d.png']
+
+def test_scan_files_yields_parents_first(tmp_path):
+    make_tree(tmp_path)
+    entries = io.scan_files(str(tmp_path), return_dirs=True, recursive=True)
+    assert next(entries).path.startswith(str(tmp_path))
+    order = [os.path.relpath(e.path, str(tmp_path)) for e in entries]
+    assert order.index('sub') < order.index('sub/c.tif') < order.index('sub/deeper/d.png')
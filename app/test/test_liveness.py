@@ -0,0 +1,57 @@
+import numpy as np
+
+from ..tools import opnet
+from .example_operations import op_add, op_mult
+
+
+def build_chain(n, data):
+    net = opnet.OpNet()
+    prev = net.add_node(op_mult, {'arg1': data, 'arg2': 1}, ['data'], name='n0')
+    for i in range(1, n):
+        node = net.add_node(op_add, {'arg1': None, 'arg2': 1}, ['data'], name='n{}'.format(i))
+        net.bind(prev, 'data', node, 'arg1')
+        prev = node
+    return net
+
+def test_intermediates_are_released_after_last_consumer():
+    live = []
+    def track(node, outs):
+        # number of nodes still holding an array when NODE finishes
+        live.append(sum(n.output_values()['data'] is not None for n in net.nodes))
+
+    net = build_chain(6, np.zeros(16))
+    results = net.run(keep=[('n5', 'data')], callback=track)
+
+    assert [r['node'] for r in results] == ['n5']
+    np.testing.assert_array_equal(results[0]['outputs']['data'], np.full(16, 5.0))
+    assert max(live) <= 2
+    assert net.get_node('n2').output_values()['data'] is None
+    assert net.get_node('n5').output_values()['data'] is not None
+
+def test_released_nodes_rerun_incrementally():
+    net = build_chain(3, np.zeros(4))
+    net.run(keep=[('n2', 'data')], incremental=True)
+    assert net.get_node('n0').is_dirty()
+    assert net.get_node('n0').output_values()['data'] is None
+
+    results = net.run(incremental=True)
+    assert results[-1]['outputs']['data'][0] == 2.0
+
+def test_fan_in_keeps_value_until_all_consumers_ran():
+    net = opnet.OpNet()
+    a = net.add_node(op_add, {'arg1': 1, 'arg2': 1}, ['data'], name='a')
+    b = net.add_node(op_add, {'arg1': 2, 'arg2': 2}, ['data'], name='b')
+    c = net.add_node(op_mult, {'arg1': None, 'arg2': None}, ['data'], name='c')
+    net.bind(a, 'data', c, 'arg1')
+    net.bind(b, 'data', c, 'arg2')
+    for executor in ('sequential', 'threads'):
+        results = net.run(executor=executor, keep=[('c', 'data')])
+        assert results == [{'node': 'c', 'outputs': {'data': 8}}]
+
+def test_processes_keep_released_nodes_dirty():
+    net = build_chain(3, np.zeros((512, 512)))
+    net.run(executor='processes', max_workers=2, keep=[('n1', 'data')])
+    # n1 is detached from shared memory after n2 ran on it
+    assert net.get_node('n1').output_values()['data'] is not None
+    assert net.get_node('n2').output_values()['data'] is None
+    assert net.get_node('n2').is_dirty()
@@ -0,0 +1,96 @@
+import numpy as np
+
+from ..tools import opnet, plan, lut, profiling
+from ..tools.ops import adjust_brightness, adjust_contrast, rescale_range
+
+
+def reference_brightness(data, b):
+    return np.clip(data + float(b), 0, 255.0).astype('uint8')
+
+def reference_contrast(data, c):
+    correction = (259.0 * (c + 255.0)) / (255.0 * (259.0 - c))
+    return np.clip(correction * (data - 128.0) + 128.0, 0, 255.0).astype('uint8')
+
+def reference_rescale(data, out_min, out_max):
+    out = (out_max - out_min) / (data.max() - data.min()) * (data - data.min()) + out_min
+    return out.astype(data.dtype)
+
+def random_image(shape=(40, 30, 3)):
+    return np.random.default_rng(0).integers(20, 220, shape, dtype='uint8')
+
+def build_chain(data):
+    net = opnet.OpNet()
+    net.add_node(adjust_brightness, {'data': data, 'b': 15}, ['data'], name='b')
+    net.add_node(adjust_contrast, {'data': None, 'c': 40.0}, ['data'], name='c')
+    net.add_node(rescale_range, {'data': None, 'out_min': 0, 'out_max': 100}, 
+                 ['data', 'out_min', 'out_max'], name='r')
+    net.bind('b', 'data', 'c', 'data')
+    net.bind('c', 'data', 'r', 'data')
+    return net
+
+def test_tables_match_arithmetic():
+    data = random_image()
+    for b in (-255, -20, 0, 13.5, 200):
+        np.testing.assert_array_equal(adjust_brightness(data, b)['data'], 
+                                      reference_brightness(data, b))
+    for c in (-100.0, 0.0, 20.0, 77.5):
+        np.testing.assert_array_equal(adjust_contrast(data, c)['data'], 
+                                      reference_contrast(data, c))
+    outs = rescale_range(data, 5, 250)
+    expected = reference_rescale(data, 5, 250)
+    np.testing.assert_array_equal(outs['data'], expected)
+    assert (outs['out_min'], outs['out_max']) == (expected.min(), expected.max())
+
+    # shapes cv.LUT does not take
+    flat = data.ravel()
+    np.testing.assert_array_equal(adjust_brightness(flat, 7)['data'], 
+                                  reference_brightness(flat, 7))
+
+def test_plan_fuses_point_op_chain():
+    data = random_image()
+    expected = reference_rescale(reference_contrast(reference_brightness(data, 15), 40.0), 0, 100)
+
+    compiled = plan.Plan(build_chain(data))
+    for executor in ('sequential', 'threads', 'processes'):
+        state = compiled.new_state()
+        results = compiled.run(state, executor=executor, keep=[('r', 'data')])
+        np.testing.assert_array_equal(results[0]['outputs']['data'], expected)
+        assert state.values[compiled.output_slots[('b', 'data')]] is None
+
+    # brightness and contrast were folded into the rescale
+    for run in (compiled.run, build_chain(data).run):
+        profiler = profiling.Profiler()
+        run(keep=[('r', 'data')], profiler=profiler)
+        assert [r['node'] for r in profiler.records] == ['r']
+
+def test_reported_outputs_are_not_fused():
+    data = random_image()
+    compiled = plan.Plan(build_chain(data))
+    results = compiled.run(keep=[('c', 'data'), ('r', 'data')])
+    assert [r['node'] for r in results] == ['c', 'r']
+    np.testing.assert_array_equal(
+        results[0]['outputs']['data'], 
+        reference_contrast(reference_brightness(data, 15), 40.0))
+
+def test_chain_falls_back_for_other_dtypes():
+    data = random_image().astype('float32')
+    outs = lut.apply_chain([adjust_brightness, adjust_contrast], 
+                           [{'b': 15}, {'c': 40.0}], data)
+    np.testing.assert_array_equal(
+        outs['data'], reference_contrast(reference_brightness(data, 15), 40.0))
+
+def test_steps_are_not_fused_for_callbacks_or_kept_intermediates():
+    data = random_image()
+    compiled = plan.Plan(build_chain(data))
+    finished = []
+    compiled.run(keep=[('r', 'data')], callback=lambda step, outs: finished.append(step.name))
+    assert finished == ['b', 'c', 'r']
+
+    # targeted runs keep intermediates, so unchanged reruns execute nothing
+    state = compiled.new_state()
+    for _ in range(3):
+        results = compiled.run(state, targets=[('c', 'data')])
+        assert state.stale == [False, False, True]
+    np.testing.assert_array_equal(
+        results[0]['outputs']['data'], 
+        reference_contrast(reference_brightness(data, 15), 40.0))
@@ -0,0 +1,104 @@
+import numpy as np
+
+from ..tools import opnet, plan, cache
+from .example_operations import op_add, op_mult
+
+
+def build_net(op=op_add):
+    # a -> b -> d and c -> d
+    net = opnet.OpNet()
+    a = net.add_node(op, {'arg1': 1, 'arg2': 1}, ['data'], name='a')
+    b = net.add_node(op, {'arg1': None, 'arg2': 10}, ['data'], name='b')
+    c = net.add_node(op, {'arg1': 5, 'arg2': 5}, ['data'], name='c')
+    d = net.add_node(op_mult, {'arg1': None, 'arg2': None}, ['data'], name='d')
+    net.bind(a, 'data', b, 'arg1')
+    net.bind(b, 'data', d, 'arg1')
+    net.bind(c, 'data', d, 'arg2')
+    return net
+
+def test_plan_matches_net():
+    net = build_net()
+    compiled = plan.Plan(net)
+    assert [step.name for step in compiled.steps] == ['a', 'c', 'b', 'd']
+    for executor in ('sequential', 'threads', 'processes'):
+        assert compiled.run(executor=executor) == net.run()
+
+def test_literal_swap_reruns_affected_steps():
+    calls = []
+    def record(arg1, arg2):
+        calls.append((arg1, arg2))
+        return arg1 + arg2
+
+    compiled = plan.Plan(build_net(record))
+    state = compiled.new_state()
+    compiled.run(state)
+    del calls[:]
+
+    results = compiled.run(state, literals={('b', 'arg2'): 20})
+    assert calls == [(2, 20)]
+    assert results[-1] == {'node': 'd', 'outputs': {'data': 220}}
+
+    # the plan itself is unchanged and still runs with its defaults
+    assert compiled.run()[-1] == {'node': 'd', 'outputs': {'data': 120}}
+
+def test_targeted_run_flags_steps_downstream():
+    compiled = plan.Plan(build_net())
+    state = compiled.new_state()
+    compiled.run(state)
+    state.set_literal('a', 'arg1', 10)
+    assert compiled.run(state, targets=[('b', 'data')]) == \
+        [{'node': 'b', 'outputs': {'data': 21}}]
+    # d was not run with the new value of b
+    assert state.stale == [False, False, False, True]
+    assert compiled.run(state)[-1] == {'node': 'd', 'outputs': {'data': 210}}
+
+def test_net_runs_on_its_compiled_plan():
+    net = build_net()
+    compiled = net.get_plan()
+    assert net.get_plan() is compiled
+    net.run(incremental=True)
+    assert not any(node.is_dirty() for node in net.nodes)
+
+    net.get_node('a').get_param('arg1').set_value(10)
+    net.run(incremental=True, targets=[('b', 'data')])
+    assert [node.name for node in net.nodes if node.is_dirty()] == ['d']
+    assert net.run(incremental=True)[-1] == {'node': 'd', 'outputs': {'data': 210}}
+
+    net.unbind(next(iter(net.conduits)))
+    assert net.get_plan() is not compiled
+
+def test_targets_and_keep():
+    compiled = plan.Plan(build_net())
+    state = compiled.new_state()
+    results = compiled.run(state, targets=[('b', 'data')], keep=[])
+    assert results == [{'node': 'b', 'outputs': {'data': 12}}]
+    assert state.stale == [True, True, False, True]
+
+    results = compiled.run(state, keep=[('d', 'data')])
+    assert results == [{'node': 'd', 'outputs': {'data': 120}}]
+    assert state.values[compiled.output_slots[('b', 'data')]] is None
+
+def test_plan_shares_cache_with_net(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path), 1 << 20)
+    build_net().run(result_cache=result_cache)
+
+    compiled = plan.Plan(build_net())
+    state = compiled.new_state()
+    results = compiled.run(state, result_cache=result_cache, targets=[('d', 'data')])
+    assert results == [{'node': 'd', 'outputs': {'data': 120}}]
+    assert result_cache.hits == 1
+    assert state.stale == [True, True, True, False]
+
+def test_arrays_are_passed_read_only():
+    def write(arg1):
+        arg1 += 1
+        return arg1
+
+    net = opnet.OpNet()
+    src = net.add_node(op_mult, {'arg1': np.zeros(4), 'arg2': 1}, ['data'], name='src')
+    dst = net.add_node(opnet.mutates_params('arg1')(write), {'arg1': None}, ['data'], name='dst')
+    net.bind(src, 'data', dst, 'arg1')
+
+    results = plan.Plan(net).run()
+    np.testing.assert_array_equal(results[0]['outputs']['data'], np.zeros(4))
+    np.testing.assert_array_equal(results[1]['outputs']['data'], np.ones(4))
@@ -0,0 +1,71 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from ..tools import opnet, plan
+from ..tools.ops import adjust_brightness, multiply, rescale_range, resize_image
+
+
+def test_policies_set_compute_and_result_types():
+    data = np.arange(12, dtype='uint16').reshape(3, 4)
+
+    assert multiply(data, 0.5)['data'].dtype == np.float64
+    assert multiply(data, 0.5, precision='float32')['data'].dtype == np.float32
+    halved = multiply(data, 0.5, precision='native')['data']
+    assert halved.dtype == np.uint16
+    np.testing.assert_array_equal(halved, np.rint(data * 0.5))
+    # products are saturated rather than wrapped around
+    assert multiply(data, -1, precision='native')['data'].max() == 0
+
+    assert resize_image(data, (6, 8), precision='float32')['data'].dtype == np.float32
+    assert resize_image(data, (6, 8), precision='native')['data'].dtype == np.uint16
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        ref = rescale_range(data, 0, 1000, precision='float64')['data']
+        np.testing.assert_array_equal(
+            rescale_range(data, 0, 1000, precision='float32')['data'], ref)
+        bright = adjust_brightness(data, 250, precision='native')['data']
+    np.testing.assert_array_equal(bright, np.clip(data + 250, 0, 255))
+
+    with pytest.raises(ValueError):
+        multiply(data, 2, precision='float16')
+
+def test_run_sets_policy_of_graph():
+    data = np.ones((4, 4), dtype='uint8')
+    net = opnet.OpNet()
+    net.add_node(multiply, {'data': data, 'scale': 1.5}, ['data'], name='m')
+    net.add_node(multiply, {'data': None, 'scale': 2.0}, ['data'], name='n')
+    net.bind('m', 'data', 'n', 'data')
+
+    # the policy is a param of the node, hidden from the client
+    assert net.get_node('m').get_param('precision').get_value() is None
+    ops = opnet.OperationsManager([(multiply, 'math', 'data')])
+    assert [p['name'] for p in ops.ops['multiply']['info']['params']] == ['data', 'scale']
+
+    results = net.run(precision='float32')
+    assert results[1]['outputs']['data'].dtype == np.float32
+
+    # changing the policy re-executes the affected nodes
+    results = net.run(incremental=True, precision='native')
+    assert [r['outputs']['data'].dtype for r in results] == [np.uint8, np.uint8]
+    assert not any(node.is_dirty() for node in net.nodes)
+
+    with pytest.raises(ValueError):
+        net.run(precision='double')
+
+def test_plan_applies_policy_to_state():
+    data = np.ones((4, 4), dtype='uint8')
+    net = opnet.OpNet()
+    net.add_node(multiply, {'data': data, 'scale': 1.5}, ['data'], name='m')
+    compiled = plan.Plan(net)
+    assert compiled.precision_params == (('m', 'precision'),)
+
+    state = compiled.new_state()
+    assert compiled.run(state, precision='float32')[0]['outputs']['data'].dtype == np.float32
+    assert not any(state.stale)
+    compiled.run(state, precision='float32')
+    assert not any(state.stale)
+    results = compiled.run(state, precision='native')
+    assert results[0]['outputs']['data'].dtype == np.uint8
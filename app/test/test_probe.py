@@ -0,0 +1,50 @@
+import warnings
+
+import numpy as np
+import cv2 as cv
+import tifffile
+from PIL import Image
+from imageio import imread
+
+from ..tools import probe, io
+
+
+def write_images(folder):
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (5, 7, 3), dtype='uint8')
+    Image.fromarray(rgb[..., 0]).save(str(folder / 'gray.png'))
+    Image.fromarray(rng.integers(0, 65536, (5, 7), dtype='uint16')).save(str(folder / 'gray16.png'))
+    Image.fromarray(rgb).save(str(folder / 'rgb.png'))
+    Image.fromarray(rgb).convert('P').save(str(folder / 'palette.png'))
+    cv.imwrite(str(folder / 'rgb16.png'), rng.integers(0, 65536, (5, 7, 3), dtype='uint16'))
+    Image.fromarray(rgb).save(str(folder / 'rgb.jpg'))
+    Image.fromarray(rgb[..., 0]).save(str(folder / 'gray.jpg'), progressive=True)
+    Image.fromarray(rgb).save(str(folder / 'rgb.bmp'))
+    Image.fromarray(rgb).convert('P').save(str(folder / 'palette.bmp'))
+    tifffile.imwrite(str(folder / 'float.tif'), rng.random((5, 7), dtype='float32'))
+    tifffile.imwrite(str(folder / 'rgb.tif'), rgb, photometric='rgb')
+    tifffile.imwrite(str(folder / 'big_endian.tif'), rgb[..., 0].astype('uint16'), byteorder='>')
+    tifffile.imwrite(str(folder / 'stack.tif'), rng.integers(0, 256, (4, 5, 7), dtype='uint8'))
+    return sorted(str(f) for f in folder.iterdir())
+
+def test_probe_matches_decoded_images(tmp_path):
+    names = write_images(tmp_path)
+    probes = probe.probe_images(names, max_workers=4)
+    assert [p['uri'] for p in probes] == names
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for p in probes:
+            img = imread(p['uri'])
+            assert (p['dtype'], p['shape']) == (img.dtype.name, img.shape), p['uri']
+
+    decoded = {p['uri'].rsplit('/', 1)[1] for p in probes if p['decoded']}
+    assert decoded == {'palette.png', 'rgb16.png', 'palette.bmp', 'stack.tif'}
+    assert {p['format'] for p in probes} == {'png', 'jpeg', 'bmp', 'tiff'}
+
+def test_data_summary_helpers_share_probes(tmp_path):
+    names = write_images(tmp_path)
+    probes = probe.probe_images(names)
+    assert io.count_data_types(names, probes) == io.count_data_types(names)
+    assert io.count_data_types(names) == {'uint8': 10, 'uint16': 2, 'float32': 1}
+    assert io.get_image_shapes(names, probes)[names.index(str(tmp_path / 'rgb.jpg'))] == (5, 7, 3)
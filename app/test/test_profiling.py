@@ -0,0 +1,50 @@
+import json
+
+import numpy as np
+
+from ..tools import opnet, plan, profiling
+from ..tools.ops import multiply, adjust_brightness, adjust_contrast
+
+
+def build_net():
+    net = opnet.OpNet()
+    a = net.add_node(multiply, {'data': np.ones((20, 30), dtype='uint8'), 'scale': 2},
+                     ['data'], name='a')
+    b = net.add_node(adjust_brightness, {'data': None, 'b': 10}, ['data'], name='b')
+    net.bind(a, 'data', b, 'data')
+    return net
+
+def test_profiler_records_executed_nodes(tmp_path):
+    net = build_net()
+    profiler = profiling.Profiler(memory=True)
+    net.run(profiler=profiler)
+    net.run(incremental=True, profiler=profiler)
+
+    records = {r['node']: r for r in profiler.summary()}
+    assert sorted(records) == ['a', 'b'] and len(profiler.records) == 2
+    assert records['a']['op'] == 'multiply'
+    assert records['a']['inputs']['data'] == {'shape': [20, 30], 'dtype': 'uint8', 'nbytes': 600}
+    assert records['a']['inputs']['scale'] == {'type': 'int'}
+    assert records['b']['outputs']['data']['shape'] == [20, 30]
+    assert all(r['wall'] >= 0 and r['cpu'] >= 0 and r['peak_bytes'] >= 0
+               for r in records.values())
+
+    path = tmp_path / 'trace.json'
+    profiler.save_trace(str(path))
+    trace = json.loads(path.read_text())
+    assert [e['name'] for e in trace['traceEvents']] == ['a', 'b']
+    assert all(e['ph'] == 'X' and e['dur'] >= 0 for e in trace['traceEvents'])
+
+def test_profiler_records_fused_plan_steps():
+    net = build_net()
+    c = net.add_node(adjust_contrast, {'data': None, 'c': 20.0}, ['data'], name='c')
+    net.bind(net.get_node('b'), 'data', c, 'data')
+    compiled = plan.Plan(net)
+    profiler = profiling.Profiler()
+    compiled.run(keep=[('c', 'data')], profiler=profiler)
+
+    # brightness and contrast run as one pass recorded under the last step
+    assert [r['node'] for r in profiler.records] == ['a', 'c']
+    record = profiler.records[1]
+    assert record['op'] == 'apply_chain' and record['peak_bytes'] is None
+    assert set(record['inputs']) == {'data', 'b.b', 'b.precision', 'c.c', 'c.precision'}
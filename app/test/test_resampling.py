@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from ..tools import resampling
+from ..tools.ops import resize_image
+
+
+def gradient(shape, dtype='uint8'):
+    rows, cols = np.mgrid[0:shape[0], 0:shape[1]]
+    return ((rows + cols) * 255 // (shape[0] + shape[1] - 2)).astype(dtype)
+
+def test_backends_agree_and_keep_type():
+    data = np.dstack([gradient((120, 160))] * 3)
+    for interpolation in ('nearest', 'linear', 'area'):
+        ref = resampling.resize(data, (60, 80), interpolation, backend='skimage')
+        got = resampling.resize(data, (60, 80), interpolation, backend='opencv')
+        assert got.dtype == np.uint8 and got.shape == (60, 80, 3)
+        assert np.abs(got.astype(int) - ref).max() <= 2
+
+    np.testing.assert_array_equal(
+        resampling.resize(data, (60, 80), 'nearest', backend='numpy'),
+        resampling.resize(data, (60, 80), 'nearest', backend='opencv'))
+    np.testing.assert_allclose(
+        resampling.resize(data, (30, 40), 'area', backend='numpy'),
+        resampling.resize(data, (30, 40), 'area', backend='opencv'), atol=1)
+
+    with pytest.raises(ValueError):
+        resampling.resize(data, (50, 70), 'linear', backend='numpy')
+    with pytest.raises(ValueError):
+        resampling.resize(data, (50, 70), 'bicubic')
+
+def test_backend_choice():
+    img = gradient((64, 64))
+    assert resampling.choose_backend(img, (32, 32), 'linear') == 'opencv'
+    assert resampling.choose_backend(img.astype('int32'), (32, 32), 'nearest') == 'numpy'
+    assert resampling.choose_backend(np.zeros((8, 8, 8)), (4, 4, 8), 'area') == 'numpy'
+    assert resampling.choose_backend(np.zeros((8, 8, 8)), (5, 5, 8), 'linear') == 'skimage'
+
+    # types OpenCV lacks are converted and come back in their own type
+    assert resampling.resize(img.astype('int32'), (16, 16)).dtype == np.int32
+    assert resampling.resize(img > 100, (16, 16)).dtype == bool
+    assert resampling.resize(img[:, :, None], (16, 16)).shape == (16, 16, 1)
+
+def test_large_downscale_is_antialiased():
+    # stripes one pixel wide average to mid grey instead of aliasing
+    stripes = np.tile(np.array([0, 255], dtype='uint8'), (280, 140))
+    small = resampling.resize(stripes, (40, 40), 'linear')
+    assert np.abs(small.astype(int) - 128).max() <= 2
+    aliased = resampling.resize(stripes, (40, 40), 'linear', antialias=False)
+    assert np.abs(aliased.astype(int) - 128).max() > 100
+
+def test_op_writes_into_buffer():
+    data = gradient((100, 100), 'uint16')
+    out = np.empty((50, 25), dtype='uint16')
+    assert resize_image(data, (50, 25), out=out)['data'] is out
+    assert resize_image(data, (50, 25), 'cubic')['data'].dtype == np.uint16
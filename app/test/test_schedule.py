@@ -0,0 +1,64 @@
+import pytest
+
+from ..tools import opnet
+from .example_operations import op_add, op_mult
+
+
+def build_chain(n):
+    net = opnet.OpNet()
+    prev = net.add_node(op_add, {'arg1': 1, 'arg2': 1}, ['data'], name='n0')
+    for i in range(1, n):
+        node = net.add_node(op_add, {'arg1': None, 'arg2': 1}, ['data'], name='n{}'.format(i))
+        net.bind(prev, 'data', node, 'arg1')
+        prev = node
+    return net
+
+def test_order_follows_conduits():
+    net = opnet.OpNet()
+    # add nodes in reverse of their execution order
+    n3 = net.add_node(op_mult, {'arg1': None, 'arg2': None}, ['data'], name='n3')
+    n2 = net.add_node(op_add, {'arg1': None, 'arg2': 10}, ['data'], name='n2')
+    n1 = net.add_node(op_add, {'arg1': 1, 'arg2': 2}, ['data'], name='n1')
+    net.bind(n1, 'data', n2, 'arg1')
+    net.bind(n2, 'data', n3, 'arg1')
+    n4 = net.add_node(op_add, {'arg1': 0, 'arg2': 5}, ['data'], name='n4')
+    net.bind(n4, 'data', n3, 'arg2')
+
+    order = [node.name for node in net.get_schedule().order]
+    assert order.index('n1') < order.index('n2') < order.index('n3')
+    assert order.index('n4') < order.index('n3')
+    assert (n1.depth, n2.depth, n3.depth, n4.depth) == (0, 1, 2, 0)
+
+    results = net.run()
+    assert results[-1] == {'node': 'n3', 'outputs': {'data': 65}}
+
+def test_schedule_is_cached_until_topology_changes():
+    net = build_chain(3)
+    schedule = net.get_schedule()
+    assert net.get_schedule() is schedule
+
+    net.add_node(op_add, {'arg1': 1, 'arg2': 1}, ['data'])
+    assert net.get_schedule() is not schedule
+
+def test_cycle_raises_before_execution():
+    calls = []
+    def record(arg1):
+        calls.append(arg1)
+        return arg1
+
+    net = opnet.OpNet()
+    a = net.add_node(record, {'arg1': None}, ['data'], name='a')
+    b = net.add_node(record, {'arg1': None}, ['data'], name='b')
+    net.add_node(record, {'arg1': 1}, ['data'], name='c')
+    net.bind(a, 'data', b, 'arg1')
+    net.bind(b, 'data', a, 'arg1')
+
+    with pytest.raises(opnet.GraphCycleError) as err:
+        net.run()
+    assert 'a' in str(err.value) and 'b' in str(err.value)
+    assert calls == []
+
+def test_long_chain_does_not_recurse():
+    net = build_chain(5000)
+    results = net.run()
+    assert results[-1]['outputs']['data'] == 5001
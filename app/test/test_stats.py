@@ -0,0 +1,48 @@
+import numpy as np
+
+from ..tools import stats
+from ..tools.ops import rescale_range, standardize, normalize_percentiles
+
+
+def test_kernels_match_numpy_across_chunks():
+    rng = np.random.default_rng(0)
+    data = rng.normal(5, 3, size=(300, 500)).astype('float32')
+    small = dict(chunk_bytes=4096)
+    assert len(list(stats.chunks(data, **small))) > 100
+    # row slices of a strided view are chunked without copying
+    assert all(chunk.base is not None for (chunk,) in stats.chunks(data[:, ::3], **small))
+
+    assert stats.min_max(data[:, ::3]) == (data[:, ::3].min(), data[:, ::3].max())
+    mean, var = stats.mean_var(data, ddof=1)
+    assert np.isclose(mean, data.mean(dtype='float64'))
+    assert np.isclose(var, data.var(dtype='float64', ddof=1))
+
+    counts, edges = stats.histogram(data, 64)
+    ref_counts, ref_edges = np.histogram(data, 64)
+    np.testing.assert_array_equal(counts, ref_counts)
+    np.testing.assert_allclose(edges, ref_edges)
+
+    levels = rng.integers(100, 200, 1000, dtype='uint16')
+    counts, edges = stats.histogram(levels, None)
+    assert edges[0] == levels.min() and counts.sum() == 1000
+    assert np.isclose(stats.quantiles(counts, edges, [0.5])[0], np.median(levels), atol=1)
+
+def test_rescale_matches_whole_array_formula():
+    data = np.random.default_rng(1).integers(0, 4096, (200, 300), dtype='uint16')
+    ref = ((990 / (data.max() - data.min())) * (data - data.min()) + 10).astype('uint16')
+    outs = rescale_range(data, 10, 1000)
+    np.testing.assert_array_equal(outs['data'], ref)
+    assert (outs['out_min'], outs['out_max']) == (ref.min(), ref.max())
+
+def test_normalization_ops():
+    data = np.random.default_rng(2).integers(0, 1000, (100, 100), dtype='int32')
+    outs = standardize(data)
+    assert outs['data'].dtype == np.float64
+    assert np.isclose(outs['data'].mean(), 0) and np.isclose(outs['data'].std(), 1)
+    assert standardize(data, precision='float32')['data'].dtype == np.float32
+    assert not standardize(np.full((4, 4), 7.0))['data'].any()
+
+    outs = normalize_percentiles(data, 5, 95)
+    lo, hi = np.percentile(data, [5, 95])
+    assert abs(outs['low'] - lo) <= 1 and abs(outs['high'] - hi) <= 1
+    assert outs['data'].min() == 0 and outs['data'].max() == 1
@@ -0,0 +1,97 @@
+import os
+import time
+
+import numpy as np
+import cv2 as cv
+from imageio import imread
+
+from ..tools import io, thumbnails
+
+
+def write_jpeg(path, shape):
+    rows, cols = np.mgrid[0:shape[0], 0:shape[1]]
+    img = np.stack([rows % 256, cols % 256, (rows + cols) % 256], axis=2).astype('uint8')
+    cv.imwrite(str(path), img)
+
+def test_large_jpegs_are_read_reduced(tmp_path):
+    write_jpeg(tmp_path / 'large.jpg', (1300, 2500))
+    write_jpeg(tmp_path / 'small.jpg', (500, 500))
+    # the largest reduction keeping both sides at least 300 pixels
+    assert io.read_reduced(str(tmp_path / 'large.jpg'), 300).shape == (325, 625, 3)
+    assert io.read_reduced(str(tmp_path / 'small.jpg'), 300) is None
+
+    io.create_thumbnail(str(tmp_path / 'large.jpg'), str(tmp_path / 'thumb.jpg'))
+    assert imread(str(tmp_path / 'thumb.jpg')).shape == (300, 300, 3)
+
+def test_pool_creates_queued_and_requested_thumbnails(tmp_path):
+    names = []
+    for i in range(6):
+        names.append(str(tmp_path / 'img{}.jpg'.format(i)))
+        write_jpeg(names[-1], (400 + i, 600))
+    broken = str(tmp_path / 'broken.jpg')
+    with open(broken, 'wb') as f:
+        f.write(b'not an image')
+
+    store = thumbnails.ThumbnailStore(str(tmp_path / 'thumbs'))
+    pool = thumbnails.ThumbnailPool(store, max_workers=2)
+    try:
+        pool.queue(names)
+        paths = pool.get_many(names[::-1] + [broken])
+        assert paths[-1] is None
+        assert paths[:-1] == [store.relative_path(io.hash_file(name)) for name in names[::-1]]
+        assert pool.get(names[0]) == paths[-2]
+
+        # queued thumbnails are all created in the background
+        pool.queue(names[:2])
+        deadline = time.time() + 10
+        while (pool.running or pool.queued) and time.time() < deadline:
+            time.sleep(0.01)
+        assert sorted(store.entries) == sorted(io.hash_file(name) for name in names)
+        assert store.stats()['entries'] == 6
+    finally:
+        pool.close()
+
+def test_store_evicts_least_recently_used(tmp_path):
+    thumbs_dir = tmp_path / 'thumbs'
+    thumbs_dir.mkdir()
+    # thumbnails stored flat by earlier versions, 'old' unused for two days
+    for key in ('aa01', 'bb02', 'old3'):
+        (thumbs_dir / (key + '.jpg')).write_bytes(b'x' * 100)
+    os.utime(str(thumbs_dir / 'old3.jpg'), (time.time() - 2 * 86400,) * 2)
+    os.utime(str(thumbs_dir / 'aa01.jpg'), (time.time() - 60,) * 2)
+
+    store = thumbnails.ThumbnailStore(str(thumbs_dir), max_bytes=250, max_age=86400)
+    assert list(store.entries) == ['aa01', 'bb02']
+    assert sorted(p.name for p in thumbs_dir.rglob('*.jpg')) == ['aa01.jpg', 'bb02.jpg']
+    assert (thumbs_dir / 'bb' / 'bb02.jpg').exists()
+    assert store.lookup('aa01') == os.path.join('aa', 'aa01.jpg')
+    assert store.lookup('cc04') is None
+
+    tmp = tmp_path / 'new.jpg'
+    tmp.write_bytes(b'x' * 100)
+    store.add('cc04', str(tmp))
+    # bb02 was used least recently
+    assert list(store.entries) == ['aa01', 'cc04']
+    assert not (thumbs_dir / 'bb' / 'bb02.jpg').exists()
+    assert store.stats() == {'hits': 1, 'misses': 1, 'entries': 2, 'bytes': 200}
+
+def test_store_keeps_recent_temp_files_and_expires_on_lookup(tmp_path, monkeypatch):
+    thumbs_dir = tmp_path / 'thumbs'
+    thumbs_dir.mkdir()
+    for name in ('aa01-1-1.tmp.jpg', 'bb02-2-2.tmp.jpg'):
+        (thumbs_dir / name).write_bytes(b'x' * 100)
+    # left over by a creation that did not finish
+    os.utime(str(thumbs_dir / 'bb02-2-2.tmp.jpg'), (time.time() - 2 * thumbnails.TMP_MAX_AGE,) * 2)
+    for key in ('aa01', 'bb02'):
+        (thumbs_dir / (key + '.jpg')).write_bytes(b'x' * 100)
+
+    store = thumbnails.ThumbnailStore(str(thumbs_dir), max_age=3600)
+    # another process may still be writing the recent temporary file
+    assert sorted(p.name for p in thumbs_dir.glob('*.tmp*')) == ['aa01-1-1.tmp.jpg']
+
+    # no thumbnail is added, but the unused one still expires
+    later = time.time() + 2 * 3600
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert store.lookup('aa01') is not None
+    assert list(store.entries) == ['aa01']
+    assert not any(p.name == 'bb02.jpg' for p in thumbs_dir.rglob('*.jpg'))
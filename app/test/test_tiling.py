@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from ..tools import opnet, ops, tiling, io
+from .example_operations import op_add
+
+
+@tiling.stencil(1)
+def box_blur(data):
+    padded = np.pad(data.astype('float64'), 1, mode='edge')
+    rows, cols = data.shape
+    return sum(padded[i:i + rows, j:j + cols] for i in range(3) for j in range(3)) / 9.0
+
+def build_net(img):
+    net = opnet.OpNet()
+    bright = net.add_node(ops.adjust_brightness, {'data': img, 'b': 10}, ['data'], name='bright')
+    blur1 = net.add_node(box_blur, {'data': None}, ['data'], name='blur1')
+    blur2 = net.add_node(box_blur, {'data': None}, ['data'], name='blur2')
+    offset = net.add_node(op_add, {'arg1': 1, 'arg2': 2}, ['data'], name='offset')
+    scale = net.add_node(ops.multiply, {'data': None, 'scale': None}, ['data'], name='scale')
+    net.bind(bright, 'data', blur1, 'data')
+    net.bind(blur1, 'data', blur2, 'data')
+    net.bind(blur2, 'data', scale, 'data')
+    net.bind(offset, 'data', scale, 'scale')
+    return net
+
+def test_tiled_run_matches_whole_image(tmp_path):
+    img = np.random.RandomState(0).randint(0, 255, (70, 90)).astype('uint8')
+    expected = build_net(img).run()[-1]['outputs']['data']
+
+    src = tmp_path / 'src.npy'
+    np.save(src, img)
+    net = build_net(None)
+    out = net.run_tiled(
+        {('bright', 'data'): io.open_image_lazy(str(src))}, 
+        {('scale', 'data'): str(tmp_path / 'out.npy')}, 
+        tile_shape=(16, 32)
+    )[(net.get_node('scale'), 'data')]
+
+    np.testing.assert_allclose(np.load(tmp_path / 'out.npy'), expected)
+    np.testing.assert_allclose(out, expected)
+
+def test_untileable_ops_are_rejected():
+    net = opnet.OpNet()
+    node = net.add_node(ops.rescale_range, {'data': None, 'out_min': 0, 'out_max': 1}, 
+                        ['data', 'out_min', 'out_max'])
+    with pytest.raises(ValueError):
+        net.run_tiled({(node, 'data'): np.zeros((8, 8))}, {(node, 'data'): np.zeros((8, 8))})
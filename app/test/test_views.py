@@ -0,0 +1,135 @@
+import os
+import json
+
+import pytest
+import numpy as np
+import cv2 as cv
+
+from .. import app, views
+from ..tools import io
+
+
+@pytest.fixture(autouse=True)
+def temp_dir(monkeypatch, tmp_path):
+    # outputs are written here instead of the static folder of the app
+    path = tmp_path / 'temp'
+    path.mkdir()
+    monkeypatch.setattr(views, 'TEMP_DIR', str(path))
+    monkeypatch.setattr(io, 'TEMP_DIR', str(path))
+    return path
+
+def make_node(name, op, params):
+    return {
+        'name': name, 
+        'op': op, 
+        'outputs': ['data'],
+        'params': [{'name': n, 'type': t, 'value': v} for n, t, v in params]
+    }
+
+def point_op_graph(tmp_path):
+    # convert_data_type -> adjust_brightness -> adjust_contrast can be fused
+    image = str(tmp_path / 'image.png')
+    cv.imwrite(image, np.random.default_rng(0).integers(0, 255, (64, 48, 3), dtype='uint8'))
+    return {
+        'nodes': [
+            make_node('a', 'multiply', [('data', 'image', image), ('scale', 'number', 1)]),
+            make_node('b', 'convert_data_type', [('data', 'conduit', None), 
+                                                 ('datatype', 'string', 'uint8')]),
+            make_node('c', 'adjust_brightness', [('data', 'conduit', None), ('b', 'number', 10)]),
+            make_node('d', 'adjust_contrast', [('data', 'conduit', None), ('c', 'number', 20.0)])
+        ],
+        'conduits': [
+            {'output_node': src, 'output': 'data', 'param_node': dst, 'param': 'data'}
+            for src, dst in (('a', 'b'), ('b', 'c'), ('c', 'd'))
+        ]
+    }
+
+def test_run_graph_releasing_intermediates(monkeypatch, tmp_path):
+    monkeypatch.setitem(views.config, 'RELEASE_INTERMEDIATES', True)
+    monkeypatch.setattr(views, 'result_cache', None)
+
+    client = app.test_client()
+    graph = point_op_graph(tmp_path)
+    for brightness in (10, 30):
+        graph['nodes'][2]['params'][1]['value'] = brightness
+        response = client.post('/run-graph', data={'graph': json.dumps(graph)})
+        assert response.status_code == 200
+        results = response.get_json()
+        assert [r['node'] for r in results] == ['a', 'b', 'c', 'd']
+        assert all(r['outputs']['data']['datatype'] == 'image' for r in results)
+
+def test_run_graph_after_reload_sends_existing_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(views, 'result_cache', None)
+
+    client = app.test_client()
+    data = {'graph': json.dumps(point_op_graph(tmp_path))}
+    client.post('/run-graph', data=data)
+    # reloading the page clears the temp folder
+    client.get('/')
+    results = client.post('/run-graph', data=data).get_json()
+    for r in results:
+        url = r['outputs']['data']['value']
+        assert os.path.isfile(os.path.join(views.TEMP_DIR, os.path.basename(url)))
+
+def test_set_folder_refuses_pages_of_previous_folder(monkeypatch, tmp_path):
+    monkeypatch.setattr(views, 'folder_listing', {})
+    monkeypatch.setattr(views, 'folder_index', None)
+    monkeypatch.setattr(views.folder_bp, 'static_folder', views.folder_bp.static_folder)
+    monkeypatch.setitem(views.config, 'FILE_DIR', views.config['FILE_DIR'])
+    monkeypatch.setitem(views.config, 'THUMBNAIL_PREFETCH', False)
+    folders = []
+    for name in ('a', 'b'):
+        folder = tmp_path / name
+        folder.mkdir()
+        for i in range(3):
+            cv.imwrite(str(folder / 'img{}.png'.format(i)), np.full((4, 6), i, dtype='uint8'))
+        folders.append(str(folder))
+
+    client = app.test_client()
+    page = client.post('/set-folder', data={'folder': folders[0], 'limit': 2}).get_json()
+    assert page['next'] == 2
+    client.post('/set-folder', data={'folder': folders[1], 'limit': 2})
+    # the next page of the first folder must not switch back to it
+    response = client.post('/set-folder', data={'folder': folders[0], 'offset': 2, 'limit': 2})
+    assert response.status_code == 409
+    assert views.config['FILE_DIR'] == folders[1]
+    page = client.post('/set-folder', data={'folder': folders[1], 'offset': 2, 'limit': 2})
+    assert page.get_json()['next'] is None
+
+    for form in ({'limit': 0}, {'limit': 2, 'offset': -1}):
+        form['folder'] = folders[1]
+        assert client.post('/set-folder', data=form).status_code == 400
+
+def test_run_batch_reports_failed_images(monkeypatch, tmp_path):
+    folder = tmp_path / 'images'
+    folder.mkdir()
+    for i in range(3):
+        cv.imwrite(str(folder / 'img{}.png'.format(i)), np.full((4, 6), i, dtype='uint8'))
+    (folder / 'img1.png').write_bytes(b'not an image')
+    monkeypatch.setitem(views.config, 'FILE_DIR', str(folder))
+    monkeypatch.setattr(views, 'folder_index', None)
+
+    graph = {
+        'nodes': [make_node('a', 'multiply', [('data', 'image', None), ('scale', 'number', 2)])],
+        'conduits': []
+    }
+    client = app.test_client()
+    response = client.post('/run-batch', data={
+        'graph': json.dumps(graph), 'node': 'a', 'param': 'data'})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['index'] for line in lines] == [0, 1, 2]
+    failed = [line for line in lines if 'error' in line]
+    assert [os.path.basename(line['uri']) for line in failed] == ['img1.png']
+    assert all('results' in line for line in lines if line not in failed)
+
+def test_run_batch_checks_request_before_streaming():
+    graph = {
+        'nodes': [make_node('a', 'multiply', [('data', 'image', None), ('scale', 'number', 2)])],
+        'conduits': []
+    }
+    client = app.test_client()
+    for form in ({'node': 'a', 'param': 'missing'}, 
+                 {'node': 'a', 'param': 'data', 'outputs': json.dumps([['a', 'missing']])},
+                 {'node': 'a', 'param': 'data', 'outputs': json.dumps([['a']])}):
+        form['graph'] = json.dumps(graph)
+        assert client.post('/run-batch', data=form).status_code == 400
@@ -0,0 +1,147 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+BUFFER_PARAM = 'out'
+
+
+class BufferArena:
+    """
+    Pool of preallocated arrays handed to ops that declared an output buffer
+    with output_buffer. The arena keeps every buffer it allocated and reuses
+    one as soon as nothing outside the arena references it or any view of it,
+    so buffers are recycled between nodes and between runs without ops or
+    executors releasing them explicitly. Idle buffers are evicted least
+    recently used first once the arena exceeds its budget.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Inputs:
+            max_bytes: Maximum total size in bytes of the buffers kept.
+        """
+
+        self.max_bytes = max_bytes
+        self.buffers = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # reference count of a buffer nobody else holds, measured the same
+        # way it is checked later since it depends on the interpreter
+        self._idle_refs = self._refcounts([np.empty(0)])[0]
+
+    def acquire(self, shape, dtype):
+        """
+        Return writeable array of SHAPE and DTYPE. Its contents are undefined.
+        """
+
+        dtype = np.dtype(dtype)
+        key = (tuple(shape), dtype.str)
+        with self.lock:
+            bufs = self.buffers.get(key)
+            if bufs:
+                for i, refs in enumerate(self._refcounts(bufs)):
+                    if refs <= self._idle_refs:
+                        self.buffers.move_to_end(key)
+                        self.hits += 1
+                        return bufs[i].view()
+            self.misses += 1
+
+            buf = np.empty(key[0], dtype)
+            self._evict(self.max_bytes - buf.nbytes)
+            if self.total_bytes + buf.nbytes > self.max_bytes:
+                # every buffer is in use, so this one is not kept
+                return buf
+            self.total_bytes += buf.nbytes
+            self.buffers.setdefault(key, []).append(buf)
+            self.buffers.move_to_end(key)
+            return buf.view()
+
+    def prepare(self, op, params):
+        """
+        Add a buffer from this arena to dict PARAMS if OP declared one and it
+        was not given explicitly. Returns PARAMS.
+        """
+
+        spec = getattr(op, 'buffer_spec', None)
+        if spec is None or params.get(BUFFER_PARAM) is not None:
+            return params
+        layout = spec(params)
+        if layout is not None:
+            params[BUFFER_PARAM] = self.acquire(*layout)
+        return params
+
+    def _evict(self, max_bytes):
+        """
+        Drop idle buffers, least recently used first, until the arena holds 
+        at most MAX_BYTES.
+        """
+
+        for key in list(self.buffers):
+            if self.total_bytes <= max_bytes:
+                return
+            bufs = self.buffers[key]
+            idle = [i for i, refs in enumerate(self._refcounts(bufs))
+                    if refs <= self._idle_refs]
+            for i in reversed(idle):
+                self.total_bytes -= bufs[i].nbytes
+                del bufs[i]
+                if self.total_bytes <= max_bytes:
+                    break
+            if not bufs:
+                del self.buffers[key]
+
+    def clear(self):
+        """
+        Drop all buffers. Buffers still in use are left to their holders.
+        """
+
+        with self.lock:
+            self.buffers.clear()
+            self.total_bytes = 0
+
+    @staticmethod
+    def _refcounts(bufs):
+        return [sys.getrefcount(buf) for buf in bufs]
+
+def output_buffer(spec):
+    """
+    Decorator declaring that an op can write its output array into a buffer
+    passed as its 'out' param. SPEC is called with the dict of param values
+    and returns the (shape, dtype) of the output, or None if no buffer can be
+    used for these values. The 'out' param is not shown to the client.
+    """
+
+    def decorate(op):
+        op.buffer_spec = spec
+        op.buffer_param = BUFFER_PARAM
+        return op
+    return decorate
+
+def cast_into(value, dtype, out=None):
+    """
+    Return array VALUE cast to DTYPE, written to buffer OUT if given.
+    """
+
+    if out is None:
+        return value.astype(dtype)
+    np.copyto(out, value, casting='unsafe')
+    return out
+
+def same_layout(dtype=None):
+    """
+    Return buffer spec for ops whose output has the shape of their 'data'
+    param and either DTYPE or, if None, the dtype of 'data'.
+    """
+
+    def spec(params):
+        data = params.get('data')
+        if not isinstance(data, np.ndarray):
+            return None
+        return data.shape, data.dtype if dtype is None else dtype
+    return spec
@@ -0,0 +1,89 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# arrays smaller than this are processed by the calling thread, since handing
+# bands to the pool costs more than it saves
+BAND_MIN_BYTES = 1 << 22
+# rows of context read around a band are limited to this many, so only small
+# stencils are split
+MAX_HALO = 64
+
+_settings = {'min_bytes': BAND_MIN_BYTES, 'workers': None}
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(min_bytes=None, workers=None):
+    """
+    Set the size in bytes from which arrays are split into bands and the
+    number of threads of the shared band pool. None restores the defaults,
+    which are BAND_MIN_BYTES and the number of CPUs.
+    """
+
+    global _pool
+    with _pool_lock:
+        _settings['min_bytes'] = BAND_MIN_BYTES if min_bytes is None else min_bytes
+        if workers != _settings['workers'] and _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        _settings['workers'] = workers
+
+def n_workers():
+    """
+    Return number of threads the band pool runs.
+    """
+
+    workers = _settings['workers']
+    return workers if workers is not None else (os.cpu_count() or 1)
+
+def get_pool():
+    """
+    Return thread pool shared by all band-parallel ops, created on first use.
+    """
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=n_workers(), thread_name_prefix='band')
+        return _pool
+
+def map_bands(fn, data, out, halo=0):
+    """
+    Compute array OUT from array DATA of the same number of rows by calling
+    FN(src, dst, top) on bands of rows run concurrently on the shared pool.
+    DST is a band of OUT to write in place and SRC the same rows of DATA
+    along with up to HALO rows of context on either side, TOP being the row
+    of SRC where the band starts. Arrays smaller than the configured size
+    are passed to FN whole. Returns OUT.
+
+    FN must release the GIL for the bands to run in parallel, as NumPy
+    ufuncs and OpenCV functions do on large arrays.
+    """
+
+    rows = data.shape[0] if data.ndim else 0
+    workers = n_workers()
+    # bands are not split again, so pool threads never wait on each other
+    if getattr(_local, 'in_band', False) or workers < 2 or rows < 2 \
+            or halo > MAX_HALO or out.shape[:1] != data.shape[:1] \
+            or max(data.nbytes, out.nbytes) < _settings['min_bytes']:
+        fn(data, out, 0)
+        return out
+
+    n_bands = min(workers, rows)
+    bounds = [rows * i // n_bands for i in range(n_bands + 1)]
+
+    def run_band(r0, r1):
+        s0, s1 = max(r0 - halo, 0), min(r1 + halo, rows)
+        _local.in_band = True
+        try:
+            fn(data[s0:s1], out[r0:r1], r0 - s0)
+        finally:
+            _local.in_band = False
+
+    futures = [get_pool().submit(run_band, r0, r1) for r0, r1 in zip(bounds, bounds[1:])]
+    for future in futures:
+        future.result()
+    return out
@@ -0,0 +1,321 @@
+import os
+import pickle
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+# arrays at least this large are memory mapped when loaded from the cache
+MMAP_MIN_BYTES = 1 << 20
+INDEX_FNAME = 'outputs.pkl'
+# entries waiting for the background writer before put_later blocks
+MAX_PENDING_WRITES = 8
+# ops of packages without a version may call any helper in this folder, so
+# its sources are part of their keys
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_tools_digest = None
+
+
+class ResultCache:
+    """
+    Persistent store of node outputs addressed by the hash of the operation and
+    its inputs. Entries are evicted least recently used first once the total
+    size on disk exceeds a budget. Entries stored with put_later are written by
+    a background thread and served from memory until then.
+    """
+
+    def __init__(self, directory, max_bytes):
+        """
+        Open cache stored at DIRECTORY, creating it if needed.
+
+        Inputs:
+            directory: Path to folder holding the cache entries.
+            max_bytes: Maximum total size in bytes of all entries.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.pending = {}
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache')
+        self.slots = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for shard in os.scandir(directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                index = os.path.join(entry.path, INDEX_FNAME)
+                if entry.name.endswith('.tmp') or not os.path.exists(index):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    continue
+                found.append((os.path.getmtime(index), entry.name, _dir_size(entry.path)))
+
+        # order entries by last access, which is recorded as the index mtime
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def __contains__(self, key):
+        return key in self.entries or key in self.pending
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Return dict of outputs stored under KEY or None if KEY is not cached.
+        """
+
+        path = self._entry_path(key)
+        with self.lock:
+            if key in self.pending:
+                self.hits += 1
+                return dict(self.pending[key])
+            if key not in self.entries:
+                # may have been stored by another process sharing the folder
+                if not os.path.exists(os.path.join(path, INDEX_FNAME)):
+                    self.misses += 1
+                    return None
+                self.entries[key] = _dir_size(path)
+                self.total_bytes += self.entries[key]
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        try:
+            with open(os.path.join(path, INDEX_FNAME), 'rb') as f:
+                index = pickle.load(f)
+            os.utime(os.path.join(path, INDEX_FNAME))
+
+            outs = {}
+            for name, value, is_array in index:
+                if is_array:
+                    fpath = os.path.join(path, value)
+                    mmap_mode = 'r' if os.path.getsize(fpath) >= MMAP_MIN_BYTES else None
+                    value = np.load(fpath, mmap_mode=mmap_mode)
+                outs[name] = value
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            # entry was evicted by another process or is corrupt
+            with self.lock:
+                if self.entries.pop(key, None) is not None:
+                    shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        return outs
+
+    def put(self, key, outs):
+        """
+        Store dict of outputs OUTS under KEY. Returns False if an output could
+        not be serialized.
+        """
+
+        if key in self.entries:
+            return True
+
+        path = self._entry_path(key)
+        tmp_path = '{}-{}-{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        os.makedirs(tmp_path, exist_ok=True)
+        try:
+            index = []
+            for i, (name, value) in enumerate(outs.items()):
+                if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+                    fname = '{}.npy'.format(i)
+                    np.save(os.path.join(tmp_path, fname), value)
+                    index.append((name, fname, True))
+                else:
+                    index.append((name, value, False))
+            with open(os.path.join(tmp_path, INDEX_FNAME), 'wb') as f:
+                pickle.dump(index, f)
+            os.rename(tmp_path, path)
+        except (OSError, pickle.PicklingError, AttributeError, TypeError):
+            # entry was stored concurrently or outputs are not picklable
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return os.path.exists(path)
+
+        size = _dir_size(path)
+        with self.lock:
+            self.entries[key] = size
+            self.total_bytes += size
+            self._evict()
+
+        return True
+
+    def put_later(self, key, outs):
+        """
+        Store dict of outputs OUTS under KEY on a background thread, so the 
+        caller does not wait for the disk. Until it is written, the entry is 
+        served from memory. Blocks only while MAX_PENDING_WRITES entries are 
+        waiting to be written.
+        """
+
+        with self.lock:
+            if key in self.entries or key in self.pending:
+                return
+            # the arrays are held until written, so buffers in them are not reused
+            self.pending[key] = outs
+        self.slots.acquire()
+        self.writer.submit(self._write, key, outs)
+
+    def flush(self):
+        """
+        Wait until every entry stored with put_later is written.
+        """
+
+        self.writer.submit(lambda: None).result()
+
+    def _write(self, key, outs):
+        try:
+            self.put(key, outs)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+            self.slots.release()
+
+    def _evict(self):
+        """
+        Remove least recently used entries until the cache fits its budget.
+        """
+
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        with self.lock:
+            for key in self.entries:
+                shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            self.entries.clear()
+            self.total_bytes = 0
+
+def node_key(op, param_keys):
+    """
+    Return content address of calling OP with params identified by PARAM_KEYS,
+    or None if the call cannot be cached.
+
+    Inputs:
+        op: Reference to function.
+        param_keys: Dict with param names as keys and digests of their values
+            (see value_digest) as values.
+    """
+
+    if not getattr(op, 'cacheable', True) or None in param_keys.values():
+        return None
+    op_hash = op_digest(op)
+    if op_hash is None:
+        return None
+
+    h = hashlib.blake2b(op_hash.encode('utf-8'), digest_size=20)
+    for name in sorted(param_keys):
+        h.update(name.encode('utf-8'))
+        h.update(param_keys[name].encode('utf-8'))
+    return h.hexdigest()
+
+def op_digest(op):
+    """
+    Return hash of the identity and code of OP, or None if OP captures state
+    that cannot be hashed. The code of the helpers OP calls is not hashed, so
+    the hash also covers the version of the package OP belongs to, or else 
+    the sources of the local tools.
+    """
+
+    if getattr(op, '__closure__', None):
+        return None
+
+    h = hashlib.blake2b(digest_size=20)
+    h.update('{}.{}'.format(
+        getattr(op, '__module__', None), getattr(op, '__qualname__', repr(op))).encode('utf-8'))
+
+    code = getattr(op, '__code__', None)
+    if code is not None:
+        _update_code_hash(h, code)
+
+    package = (getattr(op, '__module__', None) or '').split('.')[0]
+    try:
+        h.update(str(__import__(package).__version__).encode('utf-8'))
+    except (ImportError, AttributeError, ValueError):
+        # builtins and ufuncs can only be identified by their package version
+        if code is None:
+            return None
+        h.update(tools_digest().encode('utf-8'))
+
+    defaults = value_digest(getattr(op, '__defaults__', None))
+    if defaults is None:
+        return None
+    h.update(defaults.encode('utf-8'))
+    return h.hexdigest()
+
+def tools_digest():
+    """
+    Return hash of the sources in TOOLS_DIR, computed once per process.
+    """
+
+    global _tools_digest
+    if _tools_digest is None:
+        h = hashlib.blake2b(digest_size=20)
+        for fname in sorted(os.listdir(TOOLS_DIR)):
+            if fname.endswith('.py'):
+                h.update(fname.encode('utf-8'))
+                with open(os.path.join(TOOLS_DIR, fname), 'rb') as f:
+                    h.update(f.read())
+        _tools_digest = h.hexdigest()
+    return _tools_digest
+
+def value_digest(value):
+    """
+    Return hash of the content of VALUE, or None if VALUE is of a type that
+    cannot be hashed reliably.
+    """
+
+    h = hashlib.blake2b(digest_size=20)
+    if not _update_value_hash(h, value):
+        return None
+    return h.hexdigest()
+
+def _update_value_hash(h, value):
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return False
+        h.update('ndarray{}{}'.format(value.dtype.str, value.shape).encode('utf-8'))
+        h.update(memoryview(np.ascontiguousarray(value)).cast('B'))
+    elif isinstance(value, np.generic):
+        h.update('{}{!r}'.format(value.dtype.str, value.item()).encode('utf-8'))
+    elif value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        h.update('{}{!r}'.format(type(value).__name__, value).encode('utf-8'))
+    elif isinstance(value, (list, tuple)):
+        h.update('{}{}'.format(type(value).__name__, len(value)).encode('utf-8'))
+        return all(_update_value_hash(h, v) for v in value)
+    elif isinstance(value, dict):
+        h.update('dict{}'.format(len(value)).encode('utf-8'))
+        for k in sorted(value, key=repr):
+            if not (_update_value_hash(h, k) and _update_value_hash(h, value[k])):
+                return False
+    else:
+        return False
+    return True
+
+def _update_code_hash(h, code):
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode('utf-8'))
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _update_code_hash(h, const)
+        else:
+            h.update(repr(const).encode('utf-8'))
+
+def _dir_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
@@ -0,0 +1,434 @@
+import queue
+import pickle
+import weakref
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# arrays at least this large are passed to worker processes through shared 
+# memory instead of being pickled
+SHARED_MEMORY_MIN_BYTES = 1 << 20
+# worker processes are not forked, since forking while other threads of the 
+# server hold locks can deadlock the workers
+PROCESS_START_METHOD = 'forkserver' \
+    if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def run_sequential(schedule, execute, max_workers=None, on_complete=None):
+    """
+    Execute every node of SCHEDULE one after another in topological order.
+
+    Inputs:
+        schedule: Schedule of the nodes to run.
+        execute: Function taking a Node, running it and returning its outputs.
+        max_workers: Ignored. Accepted for compatibility with other executors.
+        on_complete: Optional function called with each node and its outputs 
+            once the node finished. Its return value is stored in place of 
+            the outputs. (default: None)
+    Outputs:
+        outputs: Dict with nodes as keys and their returned outputs as values.
+    """
+
+    return {node: _complete(on_complete, node, execute(node)) 
+            for node in schedule.order}
+
+def run_threaded(schedule, execute, max_workers=None, on_complete=None):
+    """
+    Execute the nodes of SCHEDULE on a thread pool, starting each node as soon
+    as every node feeding its params has finished.
+
+    Inputs:
+        schedule: Schedule of the nodes to run.
+        execute: Function taking a Node, running it and returning its outputs.
+        max_workers: Maximum number of threads. If None, uses the default of
+            ThreadPoolExecutor. (default: None)
+        on_complete: Optional function called from the scheduling thread with 
+            each node and its outputs once the node finished. Its return value 
+            is stored in place of the outputs. (default: None)
+    Outputs:
+        outputs: Dict with nodes as keys and their returned outputs as values.
+    """
+
+    pending = {node: len(schedule.predecessors[node]) for node in schedule.order}
+    outputs = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {pool.submit(execute, node): node
+                   for node in schedule.order if pending[node] == 0}
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    outputs[node] = _complete(on_complete, node, future.result())
+                    for succ in schedule.successors[node]:
+                        pending[succ] -= 1
+                        if pending[succ] == 0:
+                            running[pool.submit(execute, succ)] = succ
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+
+    return outputs
+
+def run_processes(schedule, execute, max_workers=None, on_complete=None):
+    """
+    Execute the nodes of SCHEDULE on a process pool, starting each node as soon
+    as every node feeding its params has finished. Large arrays are handed 
+    between processes through shared memory rather than pickled. Nodes whose 
+    op cannot be pickled (lambdas, closures) are executed in this process. 
+    Workers are started with PROCESS_START_METHOD.
+
+    Inputs:
+        schedule: Schedule of the nodes to run.
+        execute: Function taking a Node, running it and returning its outputs.
+            Used for nodes that cannot be sent to a worker process.
+        max_workers: Maximum number of processes. If None, uses the default of
+            ProcessPoolExecutor. (default: None)
+        on_complete: Optional function called from this process with each 
+            node and its outputs once the node finished. Its return value is 
+            stored in place of the outputs. (default: None)
+    Outputs:
+        outputs: Dict with nodes as keys and their returned outputs as values.
+    """
+
+    pending = {node: len(schedule.predecessors[node]) for node in schedule.order}
+    outputs = {}
+    blocks = SharedArrayRegistry()
+    context = multiprocessing.get_context(PROCESS_START_METHOD)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool, \
+            ThreadPoolExecutor(max_workers=1) as local:
+
+        def submit(node):
+            if not _is_picklable(node.op):
+                return local.submit(execute, node)
+            params = {name: blocks.share(value) 
+                      for name, value in node.unpack_params().items()}
+            return pool.submit(_execute_in_worker, node.op, params)
+
+        running = {submit(node): node
+                   for node in schedule.order if pending[node] == 0}
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    outs = _store_worker_outputs(node, future.result(), blocks)
+                    outputs[node] = _complete(on_complete, node, outs)
+                    del outs
+                    for succ in schedule.successors[node]:
+                        pending[succ] -= 1
+                        if pending[succ] == 0:
+                            running[submit(succ)] = succ
+        except BaseException:
+            for future in running:
+                future.cancel()
+            blocks.close()
+            raise
+
+    # move results out of shared memory before the blocks are released
+    for node in outputs:
+        if any(blocks.owns(value) for value in outputs[node].values()):
+            outputs[node] = {name: blocks.detach(value) 
+                             for name, value in outputs[node].items()}
+            # consumers already ran on the same data
+            for name, value in outputs[node].items():
+                node.get_output(name).replace_value(value)
+    blocks.close()
+
+    return outputs
+
+class SharedArray:
+    """
+    Picklable reference to an ndarray stored in a shared memory block.
+    """
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    @classmethod
+    def create(cls, arr):
+        """
+        Copy ARR into a new shared memory block. Returns the block and a 
+        reference to it.
+        """
+
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        ref = cls(shm.name, arr.shape, arr.dtype.str)
+        np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+        return shm, ref
+
+    def open(self):
+        """
+        Attach to the referenced block. Returns the block and a read-only 
+        ndarray backed by it.
+        """
+
+        shm = shared_memory.SharedMemory(name=self.name)
+        arr = np.ndarray(self.shape, np.dtype(self.dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        return shm, arr
+
+class WorkerOutputs:
+    """
+    Wrapper marking values returned by _execute_in_worker.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+class SharedArrayRegistry:
+    """
+    Tracks the shared memory blocks created or attached by the parent process 
+    during a run so each array is shared at most once and every block is 
+    released afterwards.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.refs = {}
+        self.lock = threading.Lock()
+
+    def owns(self, value):
+        return id(value) in self.refs
+
+    def _lookup(self, value):
+        """
+        Return id of the tracked array that VALUE is or is a full view of.
+        """
+
+        arr = value
+        while isinstance(arr, np.ndarray):
+            if id(arr) in self.refs:
+                if arr is value or (arr.shape == value.shape 
+                        and arr.strides == value.strides and arr.dtype == value.dtype
+                        and arr.ctypes.data == value.ctypes.data):
+                    return id(arr)
+                return None
+            arr = arr.base
+        return None
+
+    def share(self, value):
+        """
+        Return a SharedArray reference for large arrays and VALUE otherwise. 
+        Arrays already in shared memory, or read-only views of them, are not 
+        copied again.
+        """
+
+        if not _should_share(value):
+            return value
+        arr_id = self._lookup(value)
+        if arr_id is None:
+            shm, ref = SharedArray.create(value)
+            self.blocks.append(shm)
+            arr_id = id(value)
+            self.refs[arr_id] = (ref, value)
+        return self.refs[arr_id][0]
+
+    def attach(self, value):
+        """
+        Replace SharedArray references in VALUE (an op's return value) with 
+        arrays backed by their blocks.
+        """
+
+        if isinstance(value, dict):
+            return {key: self.attach(val) for key, val in value.items()}
+        if not isinstance(value, SharedArray):
+            return value
+        shm, arr = value.open()
+        with self.lock:
+            self.blocks.append(shm)
+            self.refs[id(arr)] = (value, None)
+        # free the block as soon as nothing references the array anymore
+        weakref.finalize(arr, self._release, id(arr), shm)
+        return arr
+
+    def _release(self, arr_id, shm):
+        with self.lock:
+            if shm not in self.blocks:
+                return
+            self.refs.pop(arr_id, None)
+            self.blocks.remove(shm)
+        _close_quietly(shm)
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def detach(self, value):
+        """
+        Return a private copy of VALUE if it is backed by a shared block.
+        """
+
+        if self.owns(value):
+            return np.array(value)
+        return value
+
+    def close(self):
+        """
+        Release all blocks tracked by this registry.
+        """
+
+        with self.lock:
+            blocks = list(self.blocks)
+            self.blocks.clear()
+            self.refs.clear()
+        for shm in blocks:
+            _close_quietly(shm)
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+def _store_worker_outputs(node, outs, blocks):
+    """
+    Store outputs returned by a worker process at NODE, attaching to their 
+    shared memory blocks.
+    """
+
+    if isinstance(outs, WorkerOutputs):
+        outs = node.set_outputs(blocks.attach(outs.value))
+        node.mark_clean()
+    return outs
+
+def _complete(on_complete, node, outs):
+    if on_complete is None:
+        return outs
+    return on_complete(node, outs)
+
+def _execute_in_worker(op, params):
+    """
+    Run OP in a worker process with PARAMS, attaching shared arrays and 
+    placing large returned arrays in new shared memory blocks.
+    """
+
+    handles = []
+
+    def attach(val):
+        if isinstance(val, SharedArray):
+            shm, val = val.open()
+            handles.append(shm)
+        return val
+
+    kwargs = {name: attach(value) for name, value in params.items()}
+    for name in getattr(op, 'mutated_params', ()):
+        if isinstance(kwargs.get(name), np.ndarray):
+            kwargs[name] = np.array(kwargs[name])
+    outs = op(**kwargs)
+    del kwargs
+
+    def export(val):
+        if _should_share(val):
+            shm, ref = SharedArray.create(val)
+            shm.close()
+            return ref
+        if isinstance(val, np.ndarray):
+            # may be a view into an input block that is about to be closed
+            return np.array(val)
+        return val
+
+    if isinstance(outs, dict):
+        outs = {key: export(val) for key, val in outs.items()}
+    else:
+        outs = export(outs)
+
+    for shm in handles:
+        _close_quietly(shm)
+    return WorkerOutputs(outs)
+
+def _should_share(value):
+    return isinstance(value, np.ndarray) and value.nbytes >= SHARED_MEMORY_MIN_BYTES \
+        and not value.dtype.hasobject
+
+def _is_picklable(op):
+    try:
+        pickle.dumps(op)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+def _close_quietly(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # an array backed by this block is still referenced. The mapping is 
+        # released when the process exits.
+        pass
+
+EXECUTORS = {
+    'sequential': run_sequential,
+    'threads': run_threaded,
+    'processes': run_processes
+}
+
+def get_executor(name):
+    """
+    Return the executor function registered under NAME.
+    """
+
+    try:
+        return EXECUTORS[name]
+    except KeyError:
+        raise ValueError("Unknown executor: {} (valid: {})".format(
+            name, ', '.join(EXECUTORS)))
+
+def prefetch(iterable, fn=None, depth=2):
+    """
+    Iterate over ITERABLE while a background thread applies FN to the items 
+    ahead of the consumer. At most DEPTH prepared items are held at once.
+
+    Inputs:
+        iterable: Iterable of items to prepare.
+        fn: Function applied to each item in the background. If None, items 
+            are passed through unchanged. (default: None)
+        depth: Maximum number of prepared items waiting to be consumed. 
+            (default: 2)
+    Outputs:
+        Generator of (item, fn(item)) tuples, in the order of ITERABLE.
+    """
+
+    ready = queue.Queue(maxsize=max(depth, 1))
+    stop = threading.Event()
+    done = object()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                ready.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                value = item if fn is None else fn(item)
+                if not put((item, value, None)):
+                    return
+        except BaseException as e:
+            put((None, None, e))
+            return
+        put(done)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            entry = ready.get()
+            if entry is done:
+                break
+            item, value, error = entry
+            if error is not None:
+                raise error
+            yield item, value
+    finally:
+        stop.set()
+        worker.join()
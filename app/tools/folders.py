@@ -0,0 +1,146 @@
+import os
+import json
+import sqlite3
+import threading
+
+from . import io, probe
+
+
+# bump when the tables change, so indexes written by older versions are rebuilt
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    thumb_key TEXT NOT NULL,
+    format TEXT,
+    dtype TEXT,
+    shape TEXT,
+    decoded INTEGER
+);
+CREATE INDEX files_folder ON files (folder);
+"""
+# paths looked up per query, below the SQLite limit on query parameters
+QUERY_PATHS = 500
+
+
+class FolderIndex:
+    """
+    Persistent index of the files of the folders opened so far, stored in an
+    SQLite database. Files are identified by path, size and modification
+    time, and the probed metadata and thumbnail key of each file are kept
+    until the file changes, so reopening a folder only stats its files and
+    probes the ones that are new or changed.
+    """
+
+    def __init__(self, path):
+        """
+        Open index stored in the SQLite file at PATH, creating it if needed.
+        """
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            if self.db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                self.db.execute('DROP TABLE IF EXISTS files')
+                self.db.executescript(SCHEMA)
+                self.db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+
+    def scan(self, folder, valid_exts=None):
+        """
+        Update the entries of FOLDER to match its files, resetting entries of
+        files whose size or modification time changed and dropping entries of
+        removed files. Returns sorted list of the paths of the files in
+        FOLDER, restricted to extensions in VALID_EXTS if given (see 
+        io.scan_files).
+        """
+
+        found = {}
+        for entry in io.scan_files(folder, valid_exts=valid_exts):
+            try:
+                found[entry.path] = entry.stat()
+            except OSError:
+                # removed while scanning
+                continue
+
+        with self.lock, self.db:
+            known = {path: (size, mtime_ns) for path, size, mtime_ns in self.db.execute(
+                'SELECT path, size, mtime_ns FROM files WHERE folder = ?', (folder,))}
+            changed = [
+                # thumbnail keys match io.hash_file without another stat
+                (path, folder, stat.st_size, stat.st_mtime_ns, io.hash_str(path + str(stat.st_mtime)))
+                for path, stat in found.items()
+                if known.get(path) != (stat.st_size, stat.st_mtime_ns)
+            ]
+            removed = [(path,) for path in known if path not in found]
+            if changed:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO files (path, folder, size, mtime_ns, thumb_key) '
+                    'VALUES (?, ?, ?, ?, ?)', changed)
+            if removed:
+                self.db.executemany('DELETE FROM files WHERE path = ?', removed)
+
+        return sorted(found)
+
+    def entries(self, paths):
+        """
+        Return dict mapping those of PATHS that are indexed to dicts with
+        their 'size', 'mtime_ns', 'thumb_key' and, if probed, 'probe'.
+        """
+
+        paths = list(paths)
+        found = {}
+        with self.lock:
+            for start in range(0, len(paths), QUERY_PATHS):
+                chunk = paths[start:start + QUERY_PATHS]
+                rows = self.db.execute(
+                    'SELECT path, size, mtime_ns, thumb_key, format, dtype, shape, decoded '
+                    'FROM files WHERE path IN ({})'.format(','.join('?' * len(chunk))), chunk)
+                for path, size, mtime_ns, thumb_key, fmt, dtype, shape, decoded in rows:
+                    found[path] = {'size': size, 'mtime_ns': mtime_ns, 'thumb_key': thumb_key}
+                    if dtype is not None:
+                        found[path]['probe'] = {
+                            'uri': path,
+                            'format': fmt,
+                            'dtype': dtype,
+                            'shape': tuple(json.loads(shape)),
+                            'decoded': bool(decoded)
+                        }
+        return found
+
+    def probes(self, paths, max_workers=None):
+        """
+        Return list of probe.probe_image dicts for the images at PATHS, in
+        order. Only images not probed since they last changed are read, and
+        their results are stored for indexed files.
+        """
+
+        paths = list(paths)
+        known = self.entries(paths)
+        missing = [path for path in paths if 'probe' not in known.get(path, {})]
+        probed = dict(zip(missing, probe.probe_images(missing, max_workers)))
+
+        updates = [
+            (p['format'], p['dtype'], json.dumps(p['shape']), int(p['decoded']),
+             path, known[path]['size'], known[path]['mtime_ns'])
+            for path, p in probed.items() if path in known
+        ]
+        if updates:
+            with self.lock, self.db:
+                # files that changed since they were scanned are left unprobed
+                self.db.executemany(
+                    'UPDATE files SET format = ?, dtype = ?, shape = ?, decoded = ? '
+                    'WHERE path = ? AND size = ? AND mtime_ns = ?', updates)
+
+        return [probed[path] if path in probed else known[path]['probe'] for path in paths]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -11,19 +11,72 @@ import cv2 as cv
 from imageio.core.util import Image
 from imageio import imread, imwrite, get_reader
 
-from . import opnet
+from . import opnet, probe
 
 
-TEMP_B64 = '/tmp/.hydrogentk.b64img'
+# save_image drops extensions, so this name must not look like it has one
+TEMP_B64 = '/tmp/.hydrogentk-b64img'
+# image outputs are saved to TEMP_DIR and sent as their path under TEMP_URL
+TEMP_DIR = './app/static/temp/'
+TEMP_URL = '/static/temp/'
 IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp',)
 THUMBNAIL_SETTINGS = {
     'dims': (300, 300),
     'crop_mode': 'top-left'
 }
+# JPEG images can be decoded directly at a fraction of their size by scaling 
+# their DCT blocks, which is much faster than decoding them whole
+REDUCED_READ_FLAGS = (
+    (8, cv.IMREAD_REDUCED_COLOR_8),
+    (4, cv.IMREAD_REDUCED_COLOR_4),
+    (2, cv.IMREAD_REDUCED_COLOR_2)
+)
+
+def scan_files(loc, return_dirs=False, return_files=True, recursive=False, valid_exts=None):
+    """
+    Yield os.DirEntry of every file and/or directory within directory LOC, 
+    reading each directory once with os.scandir. Entries are yielded in 
+    directory order, and the contents of subdirectories after the entries of 
+    their parent. Symbolic links to directories are not followed.
+    Inputs:
+        loc - Path to directory to list files from.
+        return_dirs - If true, yields directories in loc. (default: False)
+        return_files - If true, yields files in loc. (default: True)
+        recursive - If true, searches directories recursively. (default: False)
+        valid_exts - If a list, only yields files with extensions in list, 
+            ignoring case. If None, does nothing. (default: None)
+    Outputs:
+        entries - Iterator of os.DirEntry objects.
+    """
+
+    if valid_exts is not None:
+        valid_exts = tuple(e.lower() for e in valid_exts)
+
+    subdirs = []
+    with os.scandir(loc) as it:
+        for entry in it:
+            # entry types are cached from the directory listing, so this 
+            # only stats symbolic links
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if return_dirs:
+                    yield entry
+                if recursive and not entry.is_symlink():
+                    subdirs.append(entry.path)
+            elif return_files and entry.is_file() and (
+                    valid_exts is None or entry.name.lower().endswith(valid_exts)):
+                yield entry
+
+    for d in subdirs:
+        yield from scan_files(d, return_dirs=return_dirs, return_files=return_files, 
+                              recursive=recursive, valid_exts=valid_exts)
 
 def list_files(loc, return_dirs=False, return_files=True, recursive=False, valid_exts=None):
     """
-    Return a list of all filenames within a directory loc.
+    Return a list of all filenames within a directory loc. See scan_files.
     Inputs:
         loc - Path to directory to list files from.
         return_dirs - If true, returns directory names in loc. (default: False)
@@ -34,43 +87,9 @@ def list_files(loc, return_dirs=False, return_files=True, recursive=False, valid
     Outputs:
         files - List of names of all files and/or directories in loc.
     """
-    
-    files = [os.path.join(loc, x) for x in os.listdir(loc)]
-
-    if return_dirs or recursive:
-        # check if file is directory and add it to output if so
-        is_dir = [os.path.isdir(x) for x in files]
-        found_dirs = [files[x] for x in range(len(files)) if os.path.is_dir[x]]
-    else:
-        found_dirs = []
-
-    if return_files:
-        # check if file is not directory and add it to output
-        is_file = [os.path.isfile(x) for x in files]
-        found_files = [files[x] for x in range(len(files)) if is_file[x]]
-    else:
-        found_files = []
-
-    if recursive and not return_dirs:
-        new_dirs = []
-    else:
-        new_dirs = found_dirs
-
-    deeper_files = []
-    if recursive:
-        for d in found_dirs:
-            deeper_files.extend(list_files(d, return_dirs=return_dirs, 
-                return_files=return_files, recursive=recursive))
-
-    if isinstance(valid_exts, (list, tuple)):
-        concat_files = found_files + deeper_files
-        new_files = []
-        for e in valid_exts:
-            new_files.extend([f for f in concat_files if f.endswith(e)])
-    else:
-        new_files = found_files + deeper_files
 
-    return new_dirs + new_files
+    return [entry.path for entry in scan_files(loc, return_dirs=return_dirs, 
+        return_files=return_files, recursive=recursive, valid_exts=valid_exts)]
 
 def hash_str(my_str):
     return hashlib.md5(my_str.encode('utf-8')).hexdigest()
@@ -108,10 +127,13 @@ def get_image_info(uri):
 
 def create_thumbnail(img_uri, thumb_uri):
     """
-    Create thumbnail for image at IMG_URI and save as THUMB_URI.
+    Create thumbnail for image at IMG_URI and save as THUMB_URI. JPEG images 
+    at least twice the thumbnail size are decoded at reduced resolution.
     """
 
-    img = imread(img_uri)
+    img = read_reduced(img_uri, max(THUMBNAIL_SETTINGS['dims']))
+    if img is None:
+        img = imread(img_uri)
 
     if THUMBNAIL_SETTINGS['crop_mode'] == 'top-left':
         min_dim = min(img.shape[0:2])
@@ -129,6 +151,25 @@ def create_thumbnail(img_uri, thumb_uri):
     imwrite(thumb_uri, thumbnail)
     return True
 
+def read_reduced(uri, min_size):
+    """
+    Return RGB image at URI decoded at the lowest resolution reduced by a 
+    factor in REDUCED_READ_FLAGS that keeps both sides at least MIN_SIZE, or 
+    None if URI is not a JPEG image large enough to be reduced.
+    """
+
+    fmt, header = probe.read_header(uri)
+    if fmt != 'jpeg' or header is None:
+        return None
+
+    height, width = header[1][:2]
+    for factor, flag in REDUCED_READ_FLAGS:
+        if min(height, width) // factor >= min_size:
+            # orientation is ignored as it is by imread
+            img = cv.imread(uri, flag | cv.IMREAD_IGNORE_ORIENTATION)
+            return None if img is None else cv.cvtColor(img, cv.COLOR_BGR2RGB)
+    return None
+
 def count_file_types(img_names):
     """
     Return Counter object for all image file types in IMG_NAMES.
@@ -143,31 +184,29 @@ def count_file_types(img_names):
     counts = dict((key, value) for (key, value) in counts.items())
     return counts
 
-def count_data_types(img_names):
+def count_data_types(img_names, probes=None):
     """
-    Return Counter object for all image data types in IMG_NAMES.
+    Return Counter object for all image data types in IMG_NAMES. PROBES are 
+    the probe.probe_images dicts of IMG_NAMES, which are computed if None.
     """
 
-    all_dtypes = []
-    for f in img_names:
-        d = imread(f).dtype
-        all_dtypes.append(d)
+    if probes is None:
+        probes = probe.probe_images(img_names)
 
-    counts = Counter(all_dtypes)
-    counts = dict((key.name, value) for (key, value) in counts.items())
+    counts = Counter(p['dtype'] for p in probes)
+    counts = dict((key, value) for (key, value) in counts.items())
     return counts
 
-def get_image_shapes(img_names):
+def get_image_shapes(img_names, probes=None):
     """
-    Return shape of all image files in IMG_NAMES.
+    Return shape of all image files in IMG_NAMES. PROBES are the 
+    probe.probe_images dicts of IMG_NAMES, which are computed if None.
     """
 
-    all_shapes = []
-    for f in img_names:
-        img = imread(f)
-        all_shapes.append(img.shape)
+    if probes is None:
+        probes = probe.probe_images(img_names)
 
-    return all_shapes
+    return [p['shape'] for p in probes]
 
 def load_image(name):
     """
@@ -176,6 +215,27 @@ def load_image(name):
     
     return imread(name)
 
+def open_image_lazy(name):
+    """
+    Return array-like for image at uri NAME that only reads the regions that 
+    are sliced from it. Supports .npy files and uncompressed TIFF files (with 
+    tifffile installed); other images are fully decoded.
+    """
+
+    ext = os.path.splitext(name)[1].lower()
+    if ext == '.npy':
+        return np.load(name, mmap_mode='r')
+    if ext in ('.tif', '.tiff'):
+        try:
+            import tifffile
+            return tifffile.memmap(name, mode='r')
+        except ImportError:
+            warnings.warn('tifffile is not installed. Decoding all of {}'.format(name))
+        except ValueError:
+            warnings.warn('{} is compressed or not contiguous. Decoding all of it'.format(name))
+
+    return imread(name)
+
 def save_image(name, img):
     """
     Save IMG to uri NAME.
@@ -208,9 +268,9 @@ def json_sanitize(val, base64_images=False):
         else:
             datatype = 'image'
             code = random_str(6)
-            img_path = os.path.join('./app/static/temp/', code)
+            img_path = os.path.join(TEMP_DIR, code)
             save_image(img_path, val)
-            newval = os.path.join('/static/temp/', code)
+            newval = os.path.join(TEMP_URL, code)
     elif isinstance(val, np.generic):
         datatype = 'literal'
         newval = val.item()
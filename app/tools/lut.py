@@ -0,0 +1,93 @@
+import numpy as np
+import cv2 as cv
+
+from . import bands
+from .arena import output_buffer
+
+
+IDENTITY = np.arange(256, dtype='uint8')
+
+
+def lookup_table(build):
+    """
+    Decorator declaring that an op mapping the uint8 levels of its 'data'
+    param to uint8 output levels can be expressed as a lookup table. Chains of
+    such ops are composed into a single table and applied in one pass.
+
+    BUILD is called with the dict of the op's params other than 'data' and a
+    function returning the sorted array of levels present in the data. It
+    returns the 256-entry uint8 table and a dict of the op's other outputs.
+    """
+
+    def decorate(op):
+        op.lut = build
+        return op
+    return decorate
+
+def is_point_op(op):
+    """
+    Return True if OP was declared with lookup_table.
+    """
+
+    return getattr(op, 'lut', None) is not None
+
+def apply_table(data, table, out=None):
+    """
+    Return uint8 array DATA with every level replaced by its entry in TABLE, 
+    written to OUT if given. Large arrays are processed in parallel bands.
+    """
+
+    def lookup(src, dst, top):
+        if src.ndim in (2, 3) and src.shape[-1] <= 512 and dst.flags.c_contiguous:
+            cv.LUT(src, table, dst=dst)
+        else:
+            np.take(table, src, out=dst)
+
+    return bands.map_bands(lookup, data, np.empty(data.shape, np.uint8) if out is None else out)
+
+def _chain_layout(params):
+    data = params.get('data')
+    if isinstance(data, np.ndarray) and data.dtype == np.uint8:
+        return data.shape, data.dtype
+    return None
+
+@output_buffer(_chain_layout)
+def apply_chain(ops, params, data, out=None):
+    """
+    Apply point OPS one after another to DATA. For uint8 data, the lookup
+    tables of the ops are composed first, so the data is read and written
+    only once. Other data is passed through the ops themselves.
+
+    Inputs:
+        ops: List of ops declared with lookup_table.
+        params: List with the dict of params other than 'data' of each op.
+        data: Array passed to the 'data' param of the first op.
+        out: Optional uint8 array of the shape of DATA to write the result 
+            to. Only used for uint8 data. (default: None)
+    Outputs:
+        outs: Dict of outputs of the last op.
+    """
+
+    if not (isinstance(data, np.ndarray) and data.dtype == np.uint8 and data.size):
+        for op, op_params in zip(ops, params):
+            outs = op(data=data, **op_params)
+            data = outs['data'] if isinstance(outs, dict) else outs
+        return outs
+
+    present = []
+
+    def input_levels():
+        if not present:
+            hist = cv.calcHist([data.reshape(-1, 1)], [0], None, [256], [0, 256])
+            present.append(np.flatnonzero(hist.ravel()))
+        return present[0]
+
+    table = IDENTITY
+    for op, op_params in zip(ops, params):
+        current = table
+        op_table, extra = op.lut(op_params, lambda: np.unique(current[input_levels()]))
+        table = op_table[table]
+
+    outs = {'data': apply_table(data, table, out)}
+    outs.update(extra)
+    return outs
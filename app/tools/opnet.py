@@ -1,25 +1,60 @@
 import warnings
 from random import randint
 
+import numpy as np
+
+from . import cache, executors, plan, tiling
+from .precision import check_policy
+from .schedule import Schedule, GraphCycleError
+
 
 class OpNet:
     """
-    Manager class for all created nodes, ports, and conduits.
+    Manager class for all created nodes, ports, and conduits. Nodes are 
+    indexed by name and conduits are kept in an insertion-ordered set, so 
+    lookups, binding and removal take constant time regardless of graph size.
     """
 
     def __init__(self):
-        self.nodes = []
-        self.conduits = []
+        self._nodes = {}
+        self._conduits = {}
+        self._schedule = None
+        self._plan = None
+
+    @property
+    def nodes(self):
+        """
+        View of the nodes of this net in insertion order.
+        """
+
+        return self._nodes.values()
+
+    @property
+    def conduits(self):
+        """
+        View of the conduits of this net in insertion order.
+        """
+
+        return self._conduits.keys()
 
     def add_node(self, op, params, outputs, name=None):
         """
-        Add new node to net.
+        Add new node to net. Raises ValueError if NAME is already taken.
         """
 
         if name is None:
             name = op.__name__ + "-{:04}".format(randint(0, 9999))
+            # random names collide once a graph holds many nodes of one op
+            base, i = name, 1
+            while name in self._nodes:
+                name = "{}-{}".format(base, i)
+                i += 1
+        elif name in self._nodes:
+            raise ValueError("Node {0} already exists in this graph instance.".format(name))
+
         new_node = Node(op, name, params, outputs)
-        self.nodes.append(new_node)
+        self._nodes[name] = new_node
+        self._schedule = None
         return new_node
 
     def remove_node(self, node):
@@ -27,35 +62,34 @@ class OpNet:
         Unbind conduits attached to node and remove node from net.
         """
 
+        if self._nodes.get(node.name) is not node:
+            raise ValueError("node not found in this instance of OpNet.")
+
         for param in node.params:
             if isinstance(param._value, Conduit):
                 self.unbind(param._value)
 
         for output in node.outputs:
-            if isinstance(output._value, Conduit):
-                self.unbind(output._value)
-
-        # remove conduit from opnet internal list
-        located = False
-        for idx, n in enumerate(self.nodes):
-            if n is node:
-                del self.nodes[idx]
-                located = True
-                break
-
-        if not located:
-            raise ValueError("node not found in this instance of OpNet.")
+            for conduit in list(output.conduits):
+                self.unbind(conduit)
 
+        del self._nodes[node.name]
+        self._schedule = None
         node = None
         return node
 
     def _add_conduit(self, node1_output, node2_param):
         """
-        Add new conduit to net.
+        Add new conduit to net. A param has a single source, so any conduit 
+        already bound to NODE2_PARAM is removed first.
         """
 
+        if isinstance(node2_param._value, Conduit):
+            self._remove_conduit(node2_param._value)
+
         conduit = Conduit(node1_output, node2_param)
-        self.conduits.append(conduit)
+        self._conduits[conduit] = None
+        self._schedule = None
         return conduit
 
     def _remove_conduit(self, conduit):
@@ -63,24 +97,20 @@ class OpNet:
         Unbind conduit and remove from net.
         """
 
+        if conduit not in self._conduits:
+            raise ValueError("conduit not found in this instance of OpNet.")
+        del self._conduits[conduit]
+
         # remove conduit from references in its bound parameters
-        conduit.source._value = None
+        conduit.source.conduits.remove(conduit)
         conduit.output._value = None
+        conduit.output.dirty = True
 
         # remove references to parameters from conduit
         conduit.source = None
         conduit.output = None
 
-        # remove conduit from opnet internal list
-        located = False
-        for idx, c in enumerate(self.conduits):
-            if c is conduit:
-                del self.conduits[idx]
-                located = True
-                break
-
-        if not located:
-            raise ValueError("conduit not found in this instance of OpNet.")
+        self._schedule = None
 
     def bind(self, node1, node1_output_name, node2, node2_param_name):
         """
@@ -113,17 +143,11 @@ class OpNet:
         Return node in this graph with the name equal to NAME.
         """
 
-        target = None
-        for node in self.nodes:
-            if node.name == name:
-                target = node
-                break
-
-        if target is None:
+        try:
+            return self._nodes[name]
+        except KeyError:
             raise NameError("Node {0} was not found in this graph instance.".format(name))
 
-        return target
-
     def get_root_nodes(self):
         """
         Return list of nodes that have non-conduit inputs.
@@ -136,55 +160,220 @@ class OpNet:
 
         return rootnodes
 
-    def _walk_conduits_for_depth(self, node, depth=0):
+    def get_schedule(self):
         """
-        Traverse output conduits from node to determine depth of node.
+        Return the topological Schedule of this net, rebuilding it only if 
+        nodes or conduits changed since it was last computed. Raises 
+        GraphCycleError if the conduits form a cycle.
         """
 
-        new_depth = depth
-        for output in node.outputs:
-            if isinstance(output._value, Conduit):
-                dest_node = output._value.output.node
-                new_depth = min(depth, self._walk_conduits_for_depth(dest_node, depth + 1))
-            
-        if node.depth is not None:
-            node.depth = max(node.depth, new_depth)
-        else:
-            node.depth = new_depth
-        return new_depth
+        if self._schedule is None:
+            self._schedule = Schedule(self.nodes, self.conduits)
+            for node, depth in self._schedule.depths.items():
+                node.depth = depth
+
+        return self._schedule
+
+    def get_plan(self):
+        """
+        Return the Plan compiled from this net, compiling it again only if 
+        nodes or conduits changed since it was last compiled. Raises 
+        GraphCycleError if the conduits form a cycle.
+        """
+
+        return self._get_state().plan
 
-    def _compute_depths(self):
+    def _get_state(self):
         """
-        Traverse graph from root nodes and assign depth to all nodes.
+        Return NetState running the compiled plan of this net on its nodes.
         """
 
-        rootnodes = self.get_root_nodes()
+        schedule = self.get_schedule()
+        if self._plan is None or self._plan[0] is not schedule:
+            compiled = plan.Plan(self)
+            self._plan = (schedule, plan.NetState(compiled, self))
 
-        for rootnode in rootnodes:
-            self._walk_conduits_for_depth(rootnode)
+        return self._plan[1]
 
-    def run(self):
+    def cache_keys(self):
         """
-        Evaluate all node operations in ascending order of depth.
+        Return dict with nodes as keys and the content address of their outputs 
+        as values. A node's address is derived from its op, its literal params 
+        and the addresses of the nodes feeding it, so it is known before the 
+        node runs. Nodes that cannot be cached map to None.
         """
 
-        self._compute_depths()
-        sorted_nodes = sorted(self.nodes, key=lambda x: x.depth)
-        results = []
-        for node in sorted_nodes:
-            result = {
-                'node': node.name,
-                'outputs': node.execute()
-            }
-            results.append(result)
+        state = self._get_state()
+        return dict(zip(state.nodes, state.plan.cache_keys(state)))
 
-        return results
+    def run(self, executor='sequential', max_workers=None, incremental=False, 
+            result_cache=None, keep=None, callback=None, targets=None, arena=None, 
+            precision=None, profiler=None):
+        """
+        Evaluate all node operations in topological order. The net is run as 
+        its compiled Plan (see get_plan), which reads and stores the values at 
+        the nodes.
+
+        Inputs:
+            executor: Name of the executor used to run the nodes. 'sequential' 
+                runs one node at a time; 'threads' runs independent nodes 
+                concurrently on a thread pool; 'processes' runs them on a 
+                process pool, passing large arrays through shared memory. 
+                (default: 'sequential')
+            max_workers: Maximum number of concurrent workers for parallel 
+                executors. (default: None)
+            incremental: If true, only executes nodes whose params changed 
+                since their last execution and the nodes downstream of them. 
+                Other nodes report the outputs stored from their previous 
+                execution. (default: False)
+            result_cache: ResultCache to load node outputs from instead of 
+                executing the node, and to store newly computed outputs in. 
+                Outputs are written by its background thread, so no node waits 
+                for the disk. (default: None)
+            keep: If None, every output is kept and returned. Otherwise a list 
+                of (node, output name) pairs, where node is a Node or its name. 
+                Only these outputs are returned, and the value of any other 
+                output produced by this run is released as soon as the last 
+                node consuming it has executed. Nodes with released outputs 
+                are flagged to be executed again by later incremental runs. 
+                Without CALLBACK, chains of point ops whose outputs are 
+                released are fused into a single pass. (default: None)
+            callback: Optional function called with each node and its outputs 
+                as soon as the node finished, before any value is released. 
+                (default: None)
+            targets: If None, every node is evaluated. Otherwise a list of 
+                (node, output name) pairs, and only the nodes these outputs 
+                depend on are evaluated. (default: None)
+            arena: BufferArena providing output buffers to ops that declared 
+                one, so arrays are reused across nodes and runs. Not used by 
+                worker processes. (default: None)
+            precision: Precision policy set on every node whose op was 
+                declared with precision.precision_policy, one of 
+                precision.POLICIES. Nodes whose policy changes are executed 
+                again by incremental runs. If None, the policies of the nodes 
+                are left as they are. (default: None)
+            profiler: profiling.Profiler recording the time, memory and arrays 
+                of every node executed. Nodes loaded from RESULT_CACHE or run 
+                by worker processes are not recorded, and a fused chain of 
+                point ops is recorded once, as its last node. (default: None)
+        Outputs:
+            results: List of dicts with the name and outputs of each node, in 
+                the order of the schedule regardless of executor. If KEEP or 
+                TARGETS is given, only the nodes and outputs they list are 
+                reported.
+        """
+
+        state = self._get_state()
+        state.incremental = incremental
+        if targets is not None:
+            targets = [(self._get(node).name, name) for node, name in targets]
+        if keep is not None:
+            keep = [(self._get(node).name, name) for node, name in keep]
+        on_step = None
+        if callback is not None:
+            def on_step(step, outs):
+                callback(state.nodes[step.index], outs)
+
+        return state.plan.run(
+            state, 
+            executor=executor, 
+            max_workers=max_workers, 
+            result_cache=result_cache, 
+            keep=keep, 
+            callback=on_step, 
+            targets=targets, 
+            arena=arena, 
+            precision=precision, 
+            profiler=profiler
+        )
+
+    def set_precision(self, precision):
+        """
+        Set the precision policy of every node whose op declared one. Raises 
+        ValueError if PRECISION is not one of precision.POLICIES.
+        """
+
+        check_policy(precision)
+        for node in self._nodes.values():
+            name = getattr(node.op, 'precision_param', None)
+            if name is None:
+                continue
+            param = node.get_param(name)
+            if not isinstance(param._value, Conduit) and param._value != precision:
+                param.set_value(precision)
+
+    def evaluate(self, targets, **run_kwargs):
+        """
+        Evaluate only the nodes needed to compute TARGETS, a list of (node, 
+        output name) pairs where node is a Node or its name. Returns the 
+        results of run for the target outputs. See run for RUN_KWARGS.
+        """
+
+        return self.run(targets=targets, **run_kwargs)
+
+    def run_batch(self, inputs, loader=None, prefetch=2, **run_kwargs):
+        """
+        Run the net once for each set of param values in INPUTS, yielding 
+        results as each run finishes. The next inputs are loaded on a 
+        background thread while the current run executes, and the schedule is 
+        computed once for the whole batch. Nodes that do not depend on the 
+        changing params are executed only once.
+
+        Inputs:
+            inputs: Iterable of dicts mapping (node, param name) pairs, where 
+                node is a Node or its name, to the value of that param.
+            loader: Optional function applied to each value of INPUTS on the 
+                background thread before it is set, e.g. io.load_image to 
+                decode image paths. (default: None)
+            prefetch: Maximum number of loaded inputs waiting to be run. 
+                (default: 2)
+            run_kwargs: Keyword arguments passed to run. incremental defaults 
+                to True.
+        Outputs:
+            Generator of (inputs, results) tuples, where inputs is the item of 
+            INPUTS and results is the return value of run.
+        """
+
+        self.get_schedule()
+        run_kwargs.setdefault('incremental', True)
+
+        def load(item):
+            if loader is None:
+                return item
+            return {key: loader(value) for key, value in item.items()}
+
+        for item, values in executors.prefetch(inputs, load, prefetch):
+            for (node, name), value in values.items():
+                self._get(node).get_param(name).set_value(value)
+            del values
+            yield item, self.run(**run_kwargs)
+
+    def run_tiled(self, inputs, outputs, tile_shape=tiling.DEFAULT_TILE_SHAPE, 
+                  **run_kwargs):
+        """
+        Run the net tile by tile over images larger than memory. See 
+        tiling.run_tiled.
+        """
+
+        return tiling.run_tiled(self, inputs, outputs, tile_shape, **run_kwargs)
+
+    def _get(self, node):
+        """
+        Return NODE, looking it up by name if it is a string.
+        """
+
+        if isinstance(node, str):
+            return self.get_node(node)
+        return node
 
 class Node:
     """
     Represents an operation and its associated input parameters and outputs.
     """
 
+    __slots__ = ('op', 'name', 'params', 'outputs', '_param_index', '_output_index', 
+                 'depth', 'dirty')
+
     def __init__(self, op, name, params, outputs):
         """
         Create new node.
@@ -202,8 +391,14 @@ class Node:
         self.op = op
         self.name = name
         self.params = [Param(name, self, value) for (name, value) in params.items()]
+        policy = getattr(op, 'precision_param', None)
+        if policy is not None and policy not in params:
+            self.params.append(Param(policy, self))
         self.outputs = [Output(name, self) for name in outputs]
+        self._param_index = {param.name: param for param in self.params}
+        self._output_index = {output.name: output for output in self.outputs}
         self.depth = None
+        self.dirty = True
 
     def __repr__(self):
         return "<Node op:{} name:{} params:{} outputs:{} depth:{}>".format(
@@ -225,39 +420,29 @@ class Node:
         Return parameter with given name from node.
         """
 
-        target_param = None
-        for param in self.params:
-            if param.name == name:
-                target_param = param
-                break
-
-        if target_param is None:
-            raise NameError("{0} was not found in params of node2.".format(name))
-
-        return target_param
+        try:
+            return self._param_index[name]
+        except KeyError:
+            raise NameError("{0} was not found in params of node {1}.".format(name, self.name))
 
     def get_output(self, name):
         """
         Return output with given name from node.
         """
 
-        target_output = None
-        for output in self.outputs:
-            if output.name == name:
-                target_output = output
-                break
-
-        if target_output is None:
-            raise NameError("{0} was not found in outputs of node1.".format(name))
-
-        return target_output
+        try:
+            return self._output_index[name]
+        except KeyError:
+            raise NameError("{0} was not found in outputs of node {1}.".format(name, self.name))
 
     def unpack_params(self):
         """
-        Return dict of params with key as name and source as value.
+        Return dict of params with key as name and source as value. Params the 
+        op declared as mutated receive copies of array values.
         """
 
-        return {param.name: param.get_value() for param in self.params}
+        params = {param.name: param.get_value() for param in self.params}
+        return copy_mutated(self.op, params)
 
     def list_outputs(self):
         """
@@ -280,22 +465,59 @@ class Node:
 
         return {output.name: output.get_value() for output in self.outputs}
 
-    def execute(self):
+    def execute(self, arena=None):
         """
-        Run operation stored at node. 
+        Run operation stored at node. If ARENA is given, ops that declared an 
+        output buffer write their output to a buffer taken from it.
         """
 
-        outs = self.op(**self.unpack_params())
-        
-        if not isinstance(outs, dict):
-            outs = {'data': outs}
+        params = self.unpack_params()
+        if arena is not None:
+            # drop the previous outputs first so their buffers can be reused
+            for output in self.outputs:
+                output.replace_value(None)
+            arena.prepare(self.op, params)
+        outs = self.op(**params)
+        outs = self.set_outputs(outs)
+        self.mark_clean()
+        return outs
 
-        # store outputs as value
-        for s_out, out in zip(self.outputs, outs):
-            s_out.set_value(outs[out])
+    def release_output(self, name):
+        """
+        Drop the value stored at output NAME. The node is flagged to be 
+        executed again by the next incremental run.
+        """
+
+        self.get_output(name).set_value(None)
+        self.dirty = True
+
+    def is_dirty(self):
+        """
+        Return True if this node has not executed since it was created or 
+        since any of its params changed.
+        """
+
+        return self.dirty or any(param.is_dirty() for param in self.params)
+
+    def mark_clean(self):
+        """
+        Flag this node and its params as up to date.
+        """
 
-        # convert to dict for output
-        outs = {name: outs[out] for name, out in zip(self.list_outputs(), outs)}
+        self.dirty = False
+        for param in self.params:
+            param.mark_clean()
+
+    def set_outputs(self, outs):
+        """
+        Store values returned by the operation at this node's outputs and 
+        return them in a dict keyed by output name.
+        """
+
+        outs = pack_outputs(self.list_outputs(), outs)
+        for output in self.outputs:
+            if output.name in outs:
+                output.set_value(outs[output.name])
         return outs
 
 class Port:
@@ -304,6 +526,8 @@ class Port:
     management logic.
     """
 
+    __slots__ = ('name', 'node', '_value', 'datatypes')
+
     def __init__(self, name, node, value=None, datatypes=(None,)):
         self.name = name
         self.node = node
@@ -337,14 +561,83 @@ class Param(Port):
     Subclass of Port with behavior specific to operation parameters.
     """
 
-    pass
+    __slots__ = ('dirty', 'key')
+
+    def __init__(self, name, node, value=None, datatypes=(None,)):
+        super().__init__(name, node, value, datatypes)
+        self.dirty = True
+        self.key = None
+
+    def set_value(self, value, key=None):
+        """
+        Set value stored at this param and flag it as changed since the node 
+        last executed. KEY optionally identifies the content of VALUE for the 
+        result cache (e.g. a hash of the file it was loaded from) so it does 
+        not have to be hashed.
+        """
+
+        super().set_value(value)
+        if not isinstance(self._value, Conduit):
+            self.dirty = True
+            self.key = key
+
+    def content_key(self):
+        """
+        Return hash identifying the literal value of this param, or None if 
+        it cannot be hashed.
+        """
+
+        if self.key is None:
+            self.key = cache.value_digest(self._value)
+        return self.key
+
+    def is_dirty(self):
+        """
+        Return True if the value of this param changed since the node last 
+        executed.
+        """
+
+        if isinstance(self._value, Conduit):
+            return self._value.dirty
+        return self.dirty
+
+    def mark_clean(self):
+        """
+        Flag the current value of this param as seen by its node.
+        """
+
+        if isinstance(self._value, Conduit):
+            self._value.dirty = False
+        self.dirty = False
 
 class Output(Port):
     """
-    Subclass of Port with behavior specific to operation outputs.
+    Subclass of Port with behavior specific to operation outputs. An output 
+    may feed any number of params, each through its own conduit.
     """
 
-    pass
+    __slots__ = ('conduits',)
+
+    def __init__(self, name, node, value=None, datatypes=(None,)):
+        super().__init__(name, node, value, datatypes)
+        self.conduits = []
+
+    def set_value(self, value):
+        """
+        Set value stored at this output and flag its conduits as changed.
+        """
+
+        self._value = value
+        for conduit in self.conduits:
+            conduit.dirty = True
+
+    def replace_value(self, value):
+        """
+        Swap the value stored at this output for an equal one, such as a copy 
+        of it, without flagging its conduits as changed.
+        """
+
+        self._value = value
 
 class Conduit:
     """
@@ -352,12 +645,73 @@ class Conduit:
     another Node.
     """
 
+    __slots__ = ('source', 'output', 'dirty')
+
     def __init__(self, source, output):
-        source._value = self
+        source.conduits.append(self)
         output._value = self
         self.source = source
         self.output = output
-        self.value = None
+        self.dirty = True
+
+    @property
+    def value(self):
+        """
+        Value of the source output. Arrays are passed as read-only views of 
+        the source buffer, so any number of conduits can share it without 
+        copying. Ops that write to a param declare it with mutates_params to 
+        receive a private copy instead.
+        """
+
+        return read_only(self.source.get_value())
+
+    @value.setter
+    def value(self, value):
+        self.source.set_value(value)
+
+def read_only(value):
+    """
+    Return read-only view of VALUE if it is a writeable array, else VALUE.
+    """
+
+    if isinstance(value, np.ndarray) and value.flags.writeable:
+        value = value.view()
+        value.flags.writeable = False
+    return value
+
+def pack_outputs(names, outs):
+    """
+    Return dict mapping output NAMES to the values OUTS returned by an op. A 
+    value that is not a dict is treated as a dict with the single key 'data'. 
+    Values are matched to NAMES by position.
+    """
+
+    if not isinstance(outs, dict):
+        outs = {'data': outs}
+    return {name: outs[out] for name, out in zip(names, outs)}
+
+def copy_mutated(op, params):
+    """
+    Replace array values in dict PARAMS with private copies for the params OP
+    declared with mutates_params. Returns PARAMS.
+    """
+
+    for name in getattr(op, 'mutated_params', ()):
+        if isinstance(params.get(name), np.ndarray):
+            params[name] = np.array(params[name])
+    return params
+
+def mutates_params(*names):
+    """
+    Decorator declaring that an operation writes to the params in NAMES. Nodes 
+    pass such ops a writeable copy of array values instead of the shared, 
+    read-only buffer.
+    """
+
+    def decorate(op):
+        op.mutated_params = names
+        return op
+    return decorate
 
 def ensure_is_listlike(thing):
     """
@@ -440,6 +794,8 @@ class OperationsManager:
                         "enabled": e
                     } for n, r, d, e in zip(varnames, param_required, 
                                             param_defaults, enabled)
+                    if n not in (getattr(op, 'buffer_param', None), 
+                                 getattr(op, 'precision_param', None))
                 ],
                 "outputs": outputs
             }
@@ -1,21 +1,177 @@
 import numpy as np
 
-def convert_data_type(data, datatype):
+from .. import bands, stats
+from ..tiling import pointwise
+from ..lut import IDENTITY, lookup_table, apply_chain
+from ..arena import output_buffer, same_layout, cast_into
+from ..precision import precision_policy, as_compute, compute_dtype
+
+def _convert_layout(params):
+    if not isinstance(params.get('data'), np.ndarray):
+        return None
+    return params['data'].shape, np.dtype(params['datatype'])
+
+@pointwise
+@output_buffer(_convert_layout)
+def convert_data_type(data, datatype, out=None):
     """
     Convert DATA to DATATYPE.
     """
 
+    if not isinstance(data, np.ndarray):
+        return {'data': cast_into(np.asarray(data), datatype, out)}
+
+    result = np.empty(data.shape, datatype) if out is None else out
     op_output = {
-        'data': data.astype(datatype)
+        'data': bands.map_bands(lambda src, dst, top: cast_into(src, dst.dtype, dst), 
+                                data, result)
     }
     return op_output
 
-def rescale_range(data, out_min, out_max):
+def _rescale_table(params, levels):
+    out_min, out_max = _default_range(np.dtype('uint8'), params['out_min'], params['out_max'])
+    present = levels()
+    in_min, in_max = present[0], present[-1]
+
+    in_range = in_max - in_min
+    out_range = out_max - out_min
+    table = (out_range / in_range) * (np.clip(IDENTITY, in_min, in_max) - in_min) + out_min
+    table = table.astype('uint8')
+
+    out_levels = table[present]
+    return table, {'out_min': out_levels.min(), 'out_max': out_levels.max()}
+
+@precision_policy
+@lookup_table(_rescale_table)
+@output_buffer(same_layout())
+def rescale_range(data, out_min, out_max, out=None, precision=None):
     """
     Rescale DATA to between OUT_MIN and OUT_MAX.
+
+    uint8 data is mapped through a lookup table and is exact under every 
+    precision policy. Other data is scaled in floats. Under 'float32', and 
+    'native' for integer data, integers above 2**24 lose their lowest bits 
+    and results may be one level lower than under 'float64'.
     """
 
+    if isinstance(data, np.ndarray) and data.dtype == 'uint8':
+        return apply_chain([rescale_range], [{'out_min': out_min, 'out_max': out_max}], data, out)
+
     in_dtype = data.dtype
+    out_min, out_max = _default_range(in_dtype, out_min, out_max)
+
+    in_min, in_max = stats.min_max(data)
+    dtype = compute_dtype(in_dtype, precision)
+    if dtype is not None:
+        in_min, in_max = dtype.type(in_min), dtype.type(in_max)
+    in_range = in_max - in_min
+    out_range = out_max - out_min
+
+    # scale chunk by chunk, taking the bounds of each result chunk while it 
+    # is still in cache
+    result = np.empty(data.shape, in_dtype) if out is None else out
+    bounds = stats.MinMax()
+    for src, dst in stats.chunks(data, result):
+        scaled = (out_range / in_range) * (as_compute(src, precision) - in_min) + out_min
+        np.copyto(dst, scaled, casting='unsafe')
+        bounds.update(dst)
+
+    op_output = {
+        'data': result, 
+        'out_min': bounds.min, 
+        'out_max': bounds.max
+    }
+    return op_output
+
+def _float_layout(params):
+    data = params.get('data')
+    if not isinstance(data, np.ndarray):
+        return None
+    return data.shape, _float_dtype(data.dtype, params.get('precision'))
+
+def _float_dtype(dtype, precision):
+    """
+    Return float type of the result of a normalization of data of DTYPE 
+    under policy PRECISION. By default, float data keeps its type and other 
+    data becomes float64.
+    """
+
+    dtype = np.dtype(dtype)
+    computed = compute_dtype(dtype, precision)
+    if computed is not None:
+        return computed
+    return dtype if dtype.kind == 'f' else np.dtype('float64')
+
+@precision_policy
+@output_buffer(_float_layout)
+def standardize(data, out=None, precision=None):
+    """
+    Shift and scale DATA to zero mean and unit standard deviation. Constant 
+    DATA becomes all zeros. 
+
+    The mean and standard deviation are accumulated in float64 under every 
+    precision policy. The result is float64 by default for integer data, 
+    and otherwise has the type chosen by the policy.
+    """
+
+    mean, var = stats.mean_var(data)
+    std = np.sqrt(var)
+    scale = 1.0 / std if std > 0 else 0.0
+
+    result = np.empty(data.shape, _float_dtype(data.dtype, precision)) if out is None else out
+    for src, dst in stats.chunks(data, result):
+        np.copyto(dst, (as_compute(src, precision) - mean) * scale, casting='unsafe')
+
+    op_output = {
+        'data': result, 
+        'mean': mean, 
+        'std': std
+    }
+    return op_output
+
+@precision_policy
+@output_buffer(_float_layout)
+def normalize_percentiles(data, low=1.0, high=99.0, out=None, precision=None):
+    """
+    Map the LOW and HIGH percentiles of DATA to 0 and 1, clipping values 
+    outside them. 
+
+    Percentiles are read from a histogram with a bin for every level of 
+    integer data, or 4096 bins for float data, so for float data they are 
+    accurate to 1/4096 of the range of DATA. The result is float64 by 
+    default for integer data, and otherwise has the type chosen by the 
+    precision policy.
+    """
+
+    if not 0 <= low < high <= 100:
+        raise ValueError('percentiles must satisfy 0 <= low < high <= 100 '
+                         '(entered: {}, {})'.format(low, high))
+
+    bounds = stats.min_max(data)
+    levels = data.dtype.kind in 'iub' and int(bounds[1]) - int(bounds[0]) < 1 << 16
+    counts, edges = stats.histogram(data, None if levels else 4096, bounds)
+    lo, hi = stats.quantiles(counts, edges, [low / 100.0, high / 100.0])
+    scale = 1.0 / (hi - lo) if hi > lo else 0.0
+
+    dtype = _float_dtype(data.dtype, precision)
+    result = np.empty(data.shape, dtype) if out is None else out
+    for src, dst in stats.chunks(data, result):
+        scaled = (as_compute(src, precision) - dtype.type(lo)) * dtype.type(scale)
+        np.clip(scaled, 0, 1, out=scaled)
+        np.copyto(dst, scaled, casting='unsafe')
+
+    op_output = {
+        'data': result, 
+        'low': lo, 
+        'high': hi
+    }
+    return op_output
+
+def _default_range(in_dtype, out_min, out_max):
+    """
+    Return OUT_MIN and OUT_MAX, replacing None with the defaults for IN_DTYPE.
+    """
+
     if out_min is None:
         try:
             out_min = np.iinfo(in_dtype).min
@@ -38,15 +194,4 @@ def rescale_range(data, out_min, out_max):
         else:
             out_max = 0
 
-    in_range = data.max() - data.min()
-    out_range = out_max - out_min
-    data = (out_range / in_range) * (data - data.min()) + out_min
-    data = data.astype(in_dtype)
-
-    op_output = {
-        'data': data, 
-        'out_min': data.min(), 
-        'out_max': data.max()
-    }
-    return op_output
-    
\ No newline at end of file
+    return out_min, out_max
@@ -1,56 +1,124 @@
 import warnings
 import numpy as np
-from skimage.transform import resize
 
-def resize_image(data, output_shape):
+from .. import bands, resampling
+from ..tiling import pointwise
+from ..lut import lookup_table, apply_chain
+from ..arena import output_buffer, same_layout, cast_into
+from ..precision import precision_policy, check_policy, as_compute
+
+def _resize_layout(params):
+    data, output_shape = params.get('data'), params.get('output_shape')
+    if not isinstance(data, np.ndarray) or output_shape is None:
+        return None
+    precision = params.get('precision')
+    dtype = np.dtype(precision) if precision in ('float32', 'float64') else data.dtype
+    return resampling.full_shape(data, output_shape), dtype
+
+@precision_policy
+@output_buffer(_resize_layout)
+def resize_image(data, output_shape, interpolation='linear', out=None, precision=None):
     """
-    Resize DATA to OUTPUT_SHAPE.
+    Resize DATA to OUTPUT_SHAPE using INTERPOLATION, one of 'nearest', 
+    'linear', 'cubic', 'area' or 'lanczos'. The result keeps the type and 
+    range of DATA. Large downscales are smoothed first so they do not alias.
+
+    By default, OpenCV interpolates uint8 and uint16 data in fixed point, 
+    which can differ from exact interpolation by one level. The 'float32' 
+    and 'float64' policies convert DATA to that type and return it.
     """
 
-    data = resize(data, output_shape)
+    if check_policy(precision) in ('float32', 'float64'):
+        data = as_compute(np.asarray(data), precision)
 
     op_output = {
-        'data': data
+        'data': resampling.resize(data, output_shape, interpolation, out=out)
     }
     return op_output
 
-def adjust_brightness(data, b):
+def _brightness_table(params, levels):
+    b = _check_factor(params['b'], 'b')
+    return np.clip(np.arange(256) + b, 0, 255.0).astype('uint8'), {}
+
+@pointwise
+@precision_policy
+@lookup_table(_brightness_table)
+@output_buffer(same_layout('uint8'))
+def adjust_brightness(data, b, out=None, precision=None):
     """
     Adjust brightness of DATA by factor B.
+
+    uint8 data is mapped through a lookup table and is exact under every 
+    precision policy. For float data, 'float32' may give one level less 
+    than 'float64' where a sum rounds to a whole level. Under 'native', 
+    integer data and a whole B are added exactly in an integer type.
     """
 
-    b = float(b)
+    b = _check_factor(b, 'b')
     if not isinstance(data, np.ndarray):
         raise ValueError('data must be a numpy array')
-    if not data.dtype == 'uint8':
-        warnings.warn('Type of data is not uint8')
-    if b < -255.0 or b > 255.0:
-        raise ValueError('b must be in range [-255, 255] (entered: {})'.format(b))
+    if data.dtype == 'uint8':
+        return apply_chain([adjust_brightness], [{'b': b}], data, out)
+    warnings.warn('Type of data is not uint8')
+
+    work = np.promote_types(data.dtype, np.int16)
+    exact = precision == 'native' and work.kind in 'iu' and b.is_integer()
 
-    out_data = np.clip(data + b, 0, 255.0)
+    def brighten(src, dst, top):
+        if exact:
+            out_data = np.add(src, int(b), dtype=work)
+            np.clip(out_data, 0, 255, out=out_data)
+        else:
+            out_data = np.clip(as_compute(src, precision) + b, 0, 255.0)
+        cast_into(out_data, 'uint8', dst)
 
     op_output = {
-        'data': out_data.astype('uint8')
+        'data': bands.map_bands(brighten, data, _uint8_like(data, out))
     }
     return op_output
 
-def adjust_contrast(data, c=20.0):
+def _contrast_table(params, levels):
+    c = _check_factor(params['c'], 'c')
+    correction = (259.0 * (c + 255.0)) / (255.0 * (259.0 - c))
+    return np.clip(correction * (np.arange(256) - 128.0) + 128.0, 0, 255.0).astype('uint8'), {}
+
+@pointwise
+@precision_policy
+@lookup_table(_contrast_table)
+@output_buffer(same_layout('uint8'))
+def adjust_contrast(data, c=20.0, out=None, precision=None):
     """
     Adjust contrast of DATA by contrast factor C.
+
+    uint8 data is mapped through a lookup table and is exact under every 
+    precision policy. Other data is scaled in floats, and under 'float32' 
+    or 'native' a value within about 1e-5 of a whole level may land on the 
+    level below the one 'float64' gives.
     """
 
-    c = float(c)
+    c = _check_factor(c, 'c')
     if not isinstance(data, np.ndarray):
         raise ValueError('data must be a numpy array')
-    if not data.dtype == 'uint8':
-        warnings.warn('Type of data is not uint8')
-    if c < -255.0 or c > 255.0:
-        raise ValueError('c must be in range [-255, 255] (entered: {})'.format(c))
+    if data.dtype == 'uint8':
+        return apply_chain([adjust_contrast], [{'c': c}], data, out)
+    warnings.warn('Type of data is not uint8')
 
     correction = (259.0 * (c + 255.0)) / (255.0 * (259.0 - c))
-    out_data = np.clip(correction * (data - 128.0) + 128.0, 0, 255.0)
+
+    def contrast(src, dst, top):
+        out_data = np.clip(correction * (as_compute(src, precision) - 128.0) + 128.0, 0, 255.0)
+        cast_into(out_data, 'uint8', dst)
 
     op_output = {
-        'data': out_data.astype('uint8')
+        'data': bands.map_bands(contrast, data, _uint8_like(data, out))
     }
     return op_output
+
+def _uint8_like(data, out):
+    return np.empty(data.shape, 'uint8') if out is None else out
+
+def _check_factor(value, name):
+    value = float(value)
+    if value < -255.0 or value > 255.0:
+        raise ValueError('{} must be in range [-255, 255] (entered: {})'.format(name, value))
+    return value
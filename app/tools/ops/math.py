@@ -1,9 +1,48 @@
-def multiply(data, scale):
+import numpy as np
+
+from .. import bands
+from ..tiling import pointwise
+from ..arena import output_buffer
+from ..precision import precision_policy, check_policy, as_compute, result_dtype, cast_result
+
+def _product_layout(params):
+    data, scale = params.get('data'), params.get('scale')
+    if not isinstance(data, np.ndarray) or np.ndim(scale) != 0:
+        return None
+    return data.shape, result_dtype(np.result_type(scale, data), params.get('precision'), 
+                                    data.dtype)
+
+@pointwise
+@precision_policy
+@output_buffer(_product_layout)
+def multiply(data, scale, out=None, precision=None):
     """
     Multiply DATA by a factor of SCALE.
+
+    The 'float32' policy computes in and returns single precision floats, 
+    with a relative error of about 1e-7. The 'native' policy returns the 
+    type of DATA, rounding and saturating products of integer data.
     """
 
+    if isinstance(data, np.ndarray) and np.ndim(scale) == 0:
+        dtype = result_dtype(np.result_type(scale, data), precision, data.dtype)
+
+        def scale_band(src, dst, top):
+            if precision is None:
+                np.multiply(scale, src, out=dst)
+            else:
+                cast_result(np.multiply(scale, as_compute(src, precision)), dtype, dst)
+
+        product = bands.map_bands(scale_band, data, 
+                                  np.empty(data.shape, dtype) if out is None else out)
+    elif check_policy(precision) is None:
+        product = scale * data if out is None else np.multiply(scale, data, out=out)
+    else:
+        data = np.asarray(data)
+        dtype = result_dtype(np.result_type(scale, data), precision, data.dtype)
+        product = cast_result(np.multiply(scale, as_compute(data, precision)), dtype, out)
+
     op_output = {
-        'data': scale * data
+        'data': product
     }
     return op_output
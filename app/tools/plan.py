@@ -0,0 +1,662 @@
+from . import cache, executors, lut, opnet
+from .precision import check_policy
+
+
+class Step:
+    """
+    A single op call of a Plan. Params and outputs refer to the values of the
+    run by their integer slot index.
+    """
+
+    __slots__ = ('index', 'name', 'op', 'params', 'outputs')
+
+    def __init__(self, index, name, op, params, outputs):
+        """
+        Inputs:
+            index: Position of this step in the plan.
+            name: Name of the node the step was compiled from.
+            op: Reference to function.
+            params: Tuple of (param name, slot) pairs.
+            outputs: Tuple of (output name, slot) pairs.
+        """
+
+        self.index = index
+        self.name = name
+        self.op = op
+        self.params = params
+        self.outputs = outputs
+
+    def __repr__(self):
+        return "<Step index:{} name:{} op:{}>".format(self.index, self.name, self.op)
+
+class Plan:
+    """
+    Immutable flat execution plan compiled from an OpNet. Nodes become an
+    ordered tuple of op calls that read and write a list of values by integer
+    slot, so running the plan involves no graph traversal. Literal param
+    values are swapped in per run, and the values of a run are kept in a
+    PlanState so later runs only execute the steps affected by changes.
+    OpNet.run runs the plan of its net on a NetState, which keeps the values
+    at the nodes themselves.
+    """
+
+    def __init__(self, net):
+        """
+        Compile NET. Raises GraphCycleError if its conduits form a cycle. The
+        current literal param values of NET become the defaults of the plan.
+        """
+
+        schedule = net.get_schedule()
+
+        # outputs are assigned slots first so conduits can refer to them
+        defaults = []
+        output_slots = {}
+        for node in schedule.order:
+            for output in node.outputs:
+                output_slots[output] = len(defaults)
+                defaults.append(None)
+
+        steps = []
+        literal_slots = {}
+        producers = [None] * len(defaults)
+        for index, node in enumerate(schedule.order):
+            params = []
+            for param in node.params:
+                if isinstance(param._value, opnet.Conduit):
+                    slot = output_slots[param._value.source]
+                else:
+                    slot = len(defaults)
+                    defaults.append(param._value)
+                    producers.append(None)
+                    literal_slots[(node.name, param.name)] = slot
+                params.append((param.name, slot))
+            outputs = tuple((output.name, output_slots[output]) for output in node.outputs)
+            for _, slot in outputs:
+                producers[slot] = index
+            steps.append(Step(index, node.name, node.op, tuple(params), outputs))
+
+        self.steps = tuple(steps)
+        self.defaults = tuple(defaults)
+        self.literal_slots = literal_slots
+        self.precision_params = tuple(
+            (step.name, name) for step in self.steps for name, _ in step.params
+            if name == getattr(step.op, 'precision_param', None) 
+            and (step.name, name) in literal_slots
+        )
+        self.output_slots = {(output.node.name, output.name): slot
+                             for output, slot in output_slots.items()}
+        self.producers = tuple(producers)
+        slot_names = [None] * len(defaults)
+        for (_, name), slot in self.output_slots.items():
+            slot_names[slot] = name
+        self.slot_names = tuple(slot_names)
+        consumers = [[] for _ in defaults]
+        for step in self.steps:
+            for _, slot in step.params:
+                consumers[slot].append(step.index)
+        self.consumers = tuple(tuple(c) for c in consumers)
+        self.predecessors = tuple(
+            tuple(sorted({producers[slot] for _, slot in step.params
+                          if producers[slot] is not None}))
+            for step in self.steps
+        )
+        successors = [[] for _ in self.steps]
+        for index, preds in enumerate(self.predecessors):
+            for pred in preds:
+                successors[pred].append(index)
+        self.successors = tuple(tuple(succ) for succ in successors)
+        self._index = {step.name: step.index for step in self.steps}
+
+    def __len__(self):
+        return len(self.steps)
+
+    def new_state(self):
+        """
+        Return PlanState holding the default values of this plan.
+        """
+
+        return PlanState(self)
+
+    def get_step(self, name):
+        """
+        Return step compiled from the node named NAME.
+        """
+
+        try:
+            return self.steps[self._index[name]]
+        except KeyError:
+            raise NameError("Node {0} was not found in this plan.".format(name))
+
+    def run(self, state=None, literals=None, executor='sequential', max_workers=None,
+            result_cache=None, keep=None, callback=None, targets=None, arena=None, 
+            precision=None, profiler=None):
+        """
+        Execute the steps of this plan whose inputs changed since they last
+        ran with STATE.
+
+        Inputs:
+            state: PlanState holding the values of previous runs, which is
+                updated in place. If None, a new state is created and every
+                step is executed. (default: None)
+            literals: Optional dict mapping (node name, param name) pairs to
+                new literal param values. (default: None)
+            executor: Name of the executor used to run the steps. See
+                OpNet.run. (default: 'sequential')
+            max_workers: Maximum number of concurrent workers for parallel
+                executors. (default: None)
+            result_cache: ResultCache to load step outputs from instead of
+                executing the step, and to store newly computed outputs in.
+                Outputs are written by its background thread. (default: None)
+            keep: If None, every output is kept and returned. Otherwise a list
+                of (node name, output name) pairs. Only these outputs are
+                returned, and other outputs produced by this run are released
+                once their last consumer executed. (default: None)
+            callback: Optional function called with each Step and its outputs
+                as soon as the step finished, before any value is released.
+                Point ops are only fused into a single pass when KEEP is given
+                and CALLBACK is None. (default: None)
+            targets: If None, every step is evaluated. Otherwise a list of
+                (node name, output name) pairs, and only the steps these
+                outputs depend on are evaluated. (default: None)
+            arena: BufferArena providing output buffers to ops that declared 
+                one. Not used by worker processes. (default: None)
+            precision: Precision policy set on every step whose op declared 
+                one. See OpNet.run. (default: None)
+            profiler: profiling.Profiler recording every step executed. A 
+                fused chain of point ops is recorded once, as its last step. 
+                Not used by worker processes. (default: None)
+        Outputs:
+            results: List of dicts with the name and outputs of each node, in
+                the same format and order as OpNet.run.
+        """
+
+        if state is None:
+            state = self.new_state()
+        for (node_name, param_name), value in (literals or {}).items():
+            state.set_literal(node_name, param_name, value)
+        if precision is not None:
+            check_policy(precision)
+            for key in self.precision_params:
+                if state.values[self.literal_slots[key]] != precision:
+                    state.set_literal(key[0], key[1], precision)
+
+        report = None
+        needed = None
+        if targets is not None:
+            targets = {self.output_slot(node, name) for node, name in targets}
+            needed = self._ancestors(self.producers[slot] for slot in targets)
+        if keep is not None:
+            keep = {self.output_slot(node, name) for node, name in keep}
+            keep.update(targets or ())
+            report = keep
+        elif targets is not None:
+            report = targets
+
+        # run every stale step needed for the targets and every needed step 
+        # downstream of one
+        scheduled = set()
+        for step in self.steps:
+            i = step.index
+            if (needed is None or i in needed) and (state.stale[i] 
+                    or any(p in scheduled for p in self.predecessors[i])):
+                scheduled.add(i)
+
+        keys = None
+        loaded = {}
+        if result_cache is not None:
+            keys = self.cache_keys(state)
+            lookup = set(scheduled)
+            if targets is not None:
+                lookup.intersection_update(self.producers[slot] for slot in targets)
+            # look steps up from the end, so steps only feeding cached steps 
+            # are neither loaded nor executed
+            for i in sorted(scheduled, reverse=True):
+                if i not in lookup:
+                    continue
+                outs = result_cache.get(keys[i]) if keys[i] is not None else None
+                if outs is not None:
+                    loaded[i] = self._store(state, self.steps[i], outs)
+                    state.stale[i] = False
+                else:
+                    lookup.update(p for p in self.predecessors[i] if p in scheduled)
+            scheduled = lookup
+
+        remaining = {}
+        if keep is not None:
+            for i in scheduled:
+                for _, slot in self.steps[i].outputs:
+                    remaining[slot] = 0
+            for i in scheduled:
+                for _, slot in self.steps[i].params:
+                    if slot in remaining:
+                        remaining[slot] += 1
+
+        def release_if_unused(slot):
+            if remaining[slot] == 0 and slot not in keep:
+                state.values[slot] = None
+                state.stale[self.producers[slot]] = True
+
+        def complete(chain, outs):
+            step = chain[-1]
+            if keys is not None and keys[step.index] is not None \
+                    and step.index not in loaded:
+                result_cache.put_later(keys[step.index], outs)
+            if callback is not None:
+                callback(step, outs)
+            if keep is None:
+                return outs
+            for member in chain:
+                for _, slot in member.params:
+                    if slot in remaining:
+                        remaining[slot] -= 1
+                        release_if_unused(slot)
+                for _, slot in member.outputs:
+                    release_if_unused(slot)
+            return {name: val for name, val in outs.items() 
+                    if self.output_slots[(step.name, name)] in keep}
+
+        # report loaded steps only after all of them are in place, since a
+        # loaded step may consume the outputs of another
+        for i in sorted(loaded):
+            loaded[i] = complete((self.steps[i],), loaded[i])
+
+        # outputs that are released anyway need not be computed, so 
+        # consecutive point ops are fused into a single pass over the data. 
+        # Fused steps are left stale like released ones, and are not fused 
+        # when CALLBACK expects the outputs of every step.
+        pending = scheduled.difference(loaded)
+        fuse = keep is not None and callback is None
+        chains = self._point_chains(pending, keep) if fuse else {}
+        absorbed = {member.index for chain in chains.values() for member in chain[:-1]}
+        tasks = [_Task(self, state, chains.get(i, (self.steps[i],)), arena) 
+                 for i in sorted(pending.difference(absorbed))]
+
+        run_steps = executors.get_executor(executor)
+        execute = _Task.execute
+        if profiler is not None:
+            execute = profiler.wrap(execute)
+            profiler.start()
+        try:
+            outputs = run_steps(_TaskSchedule(self, tasks), execute, max_workers, 
+                                on_complete=lambda task, outs: complete(task.chain, outs))
+        finally:
+            if profiler is not None:
+                profiler.stop()
+        outputs = {task.step.index: outs for task, outs in outputs.items()}
+        outputs.update(loaded)
+
+        # steps downstream of new values that were not part of this run 
+        # execute on the next one
+        for i in outputs:
+            for succ in self.successors[i]:
+                if succ not in outputs:
+                    state.stale[succ] = True
+
+        results = []
+        for step in self.steps:
+            if report is None:
+                node_outputs = outputs[step.index] if step.index in outputs else \
+                    {name: state.values[slot] for name, slot in step.outputs}
+            else:
+                node_outputs = {name: state.values[slot] 
+                                for name, slot in step.outputs if slot in report}
+
+            if report is None or node_outputs:
+                results.append({
+                    'node': step.name,
+                    'outputs': node_outputs
+                })
+
+        return results
+
+    def _point_chains(self, indices, keep):
+        """
+        Return dict mapping the last step of each chain of consecutive point 
+        ops (see lut.lookup_table) among step INDICES to the tuple of steps in 
+        the chain. Steps are only chained if none of their outputs are in the 
+        slots to KEEP or feed any other step.
+        """
+
+        chains = {}
+        for i in sorted(indices):
+            step = self.steps[i]
+            slot = dict(step.params).get('data')
+            if slot is None or not lut.is_point_op(step.op):
+                continue
+            p = self.producers[slot]
+            if p is None or p not in indices or self.slot_names[slot] != 'data' \
+                    or not lut.is_point_op(self.steps[p].op):
+                continue
+            if any(out in keep or self.consumers[out] != ((i,) if out == slot else ()) 
+                   for _, out in self.steps[p].outputs):
+                continue
+            chains[i] = chains.pop(p, (self.steps[p],)) + (step,)
+
+        return chains
+
+    def cache_keys(self, state):
+        """
+        Return list with the content address of the outputs of each step for 
+        the values in STATE, or None for steps that cannot be cached. 
+        Addresses match those of OpNet.cache_keys, so plans and nets share 
+        cache entries.
+        """
+
+        keys = []
+        for step in self.steps:
+            param_keys = {}
+            for name, slot in step.params:
+                producer = self.producers[slot]
+                if producer is None:
+                    param_keys[name] = state.content_key(slot)
+                else:
+                    upstream = keys[producer]
+                    param_keys[name] = None if upstream is None \
+                        else upstream + ':' + self.slot_names[slot]
+            keys.append(cache.node_key(step.op, param_keys))
+
+        return keys
+
+    def _store(self, state, step, outs):
+        """
+        Store values OUTS returned by the op of STEP in STATE and return them 
+        in a dict keyed by output name.
+        """
+
+        outs = opnet.pack_outputs([name for name, _ in step.outputs], outs)
+        for name, slot in step.outputs:
+            if name in outs:
+                state.values[slot] = outs[name]
+        return outs
+
+    def output_slot(self, node_name, output_name):
+        """
+        Return slot holding output OUTPUT_NAME of node NODE_NAME.
+        """
+
+        try:
+            return self.output_slots[(node_name, output_name)]
+        except KeyError:
+            raise NameError("{0} was not found in outputs of node {1}.".format(
+                output_name, node_name))
+
+    def _ancestors(self, indices):
+        """
+        Return set of step INDICES and the indices of every step they depend on.
+        """
+
+        found = set(indices)
+        stack = list(found)
+        while stack:
+            for pred in self.predecessors[stack.pop()]:
+                if pred not in found:
+                    found.add(pred)
+                    stack.append(pred)
+
+        return found
+
+class PlanState:
+    """
+    Values of the slots of a Plan between runs, along with which steps have 
+    to execute again.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.values = list(plan.defaults)
+        self.keys = [None] * len(plan.defaults)
+        self.stale = [True] * len(plan.steps)
+
+    def set_literal(self, node_name, param_name, value, key=None):
+        """
+        Set literal param PARAM_NAME of node NODE_NAME to VALUE and flag the 
+        step consuming it to execute on the next run. KEY optionally 
+        identifies the content of VALUE for the result cache, as in 
+        Param.set_value.
+        """
+
+        try:
+            slot = self.plan.literal_slots[(node_name, param_name)]
+        except KeyError:
+            raise NameError("{0} is not a literal param of node {1}.".format(
+                param_name, node_name))
+
+        self.values[slot] = value
+        self.keys[slot] = key
+        for index in self.plan.consumers[slot]:
+            self.stale[index] = True
+
+    def content_key(self, slot):
+        """
+        Return hash identifying the literal value in SLOT, or None if it 
+        cannot be hashed.
+        """
+
+        if self.keys[slot] is None:
+            self.keys[slot] = cache.value_digest(self.values[slot])
+        return self.keys[slot]
+
+    def replace_value(self, slot, value):
+        """
+        Swap the value of output SLOT for an equal one, such as a copy of it, 
+        or drop it before its step executes again, without flagging the steps 
+        consuming it.
+        """
+
+        self.values[slot] = value
+
+class NetState(PlanState):
+    """
+    PlanState backed by the nodes of the OpNet a Plan was compiled from. Values
+    are read from and written to the params and outputs of the nodes, and a 
+    step is stale while its node is dirty, so running the plan updates the net
+    the way executing its nodes does. If the attribute incremental is false, 
+    every step is stale whether or not its node is dirty.
+    """
+
+    def __init__(self, plan, net):
+        """
+        Inputs:
+            plan: Plan compiled from NET.
+            net: OpNet holding the values.
+        """
+
+        self.plan = plan
+        self.incremental = True
+        self.nodes = tuple(net.get_node(step.name) for step in plan.steps)
+        self.ports = [None] * len(plan.defaults)
+        for (node_name, param_name), slot in plan.literal_slots.items():
+            self.ports[slot] = net.get_node(node_name).get_param(param_name)
+        for (node_name, output_name), slot in plan.output_slots.items():
+            self.ports[slot] = net.get_node(node_name).get_output(output_name)
+        self.values = _PortValues(self.ports)
+        self.stale = _DirtyFlags(self)
+
+    def set_literal(self, node_name, param_name, value, key=None):
+        try:
+            slot = self.plan.literal_slots[(node_name, param_name)]
+        except KeyError:
+            raise NameError("{0} is not a literal param of node {1}.".format(
+                param_name, node_name))
+
+        self.ports[slot].set_value(value, key)
+
+    def content_key(self, slot):
+        return self.ports[slot].content_key()
+
+    def replace_value(self, slot, value):
+        self.ports[slot].replace_value(value)
+
+class _PortValues:
+    """
+    Values of the params and outputs of a net, indexed by slot like the values
+    of a PlanState.
+    """
+
+    __slots__ = ('ports',)
+
+    def __init__(self, ports):
+        self.ports = ports
+
+    def __len__(self):
+        return len(self.ports)
+
+    def __getitem__(self, slot):
+        return self.ports[slot].get_value()
+
+    def __setitem__(self, slot, value):
+        self.ports[slot].set_value(value)
+
+class _DirtyFlags:
+    """
+    Dirty flags of the nodes of a net, indexed by step like the stale flags of
+    a PlanState.
+    """
+
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+    def __len__(self):
+        return len(self.state.nodes)
+
+    def __getitem__(self, index):
+        return not self.state.incremental or self.state.nodes[index].is_dirty()
+
+    def __setitem__(self, index, stale):
+        if stale:
+            self.state.nodes[index].dirty = True
+        else:
+            self.state.nodes[index].mark_clean()
+
+class _Task:
+    """
+    A Step, or a chain of point op steps fused into one, bound to the 
+    PlanState of a run and exposing the interface of Node that executors 
+    rely on.
+    """
+
+    __slots__ = ('plan', 'state', 'chain', 'arena', 'step', 'op')
+
+    def __init__(self, plan, state, chain, arena=None):
+        self.plan = plan
+        self.state = state
+        self.chain = chain
+        self.arena = arena
+        self.step = chain[-1]
+        self.op = self.step.op if len(chain) == 1 else lut.apply_chain
+
+    @property
+    def name(self):
+        return self.step.name
+
+    def _read(self, slot):
+        value = self.state.values[slot]
+        return value if self.plan.producers[slot] is None else opnet.read_only(value)
+
+    def unpack_params(self):
+        if len(self.chain) > 1:
+            return {
+                'ops': [step.op for step in self.chain],
+                'params': [{name: self._read(slot) for name, slot in step.params 
+                            if name != 'data'} for step in self.chain],
+                'data': self._read(dict(self.chain[0].params)['data'])
+            }
+        values, producers = self.state.values, self.plan.producers
+        params = {name: values[slot] if producers[slot] is None 
+                  else opnet.read_only(values[slot]) for name, slot in self.step.params}
+        return opnet.copy_mutated(self.op, params)
+
+    def param_values(self):
+        if len(self.chain) > 1:
+            params = {'{}.{}'.format(step.name, name): self.state.values[slot]
+                      for step in self.chain for name, slot in step.params if name != 'data'}
+            params['data'] = self.state.values[dict(self.chain[0].params)['data']]
+            return params
+        return {name: self.state.values[slot] for name, slot in self.step.params}
+
+    def set_outputs(self, outs):
+        return self.plan._store(self.state, self.step, outs)
+
+    def get_output(self, name):
+        return _Slot(self.state, self.plan.output_slots[(self.step.name, name)])
+
+    def mark_clean(self):
+        self.state.stale[self.step.index] = False
+
+    def execute(self):
+        params = self.unpack_params()
+        if self.arena is not None:
+            # drop the previous outputs first so their buffers can be reused
+            for _, slot in self.step.outputs:
+                self.state.replace_value(slot, None)
+            self.arena.prepare(self.op, params)
+        outs = self.plan._store(self.state, self.step, self.op(**params))
+        self.state.stale[self.step.index] = False
+        return outs
+
+class _Slot:
+    """
+    Reference to a slot of the values of a run, exposing the interface of 
+    Output that executors rely on.
+    """
+
+    __slots__ = ('state', 'index')
+
+    def __init__(self, state, index):
+        self.state = state
+        self.index = index
+
+    def set_value(self, value):
+        self.state.values[self.index] = value
+
+    def replace_value(self, value):
+        self.state.replace_value(self.index, value)
+
+class _TaskSchedule:
+    """
+    Schedule of the tasks of a run in the form executors expect. The links 
+    between tasks are only worked out if an executor asks for them.
+    """
+
+    def __init__(self, plan, tasks):
+        self.plan = plan
+        self.order = tuple(tasks)
+        self._links = None
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    @property
+    def predecessors(self):
+        return self._link()[0]
+
+    @property
+    def successors(self):
+        return self._link()[1]
+
+    def _link(self):
+        if self._links is not None:
+            return self._links
+
+        task_of = {step.index: task for task in self.order for step in task.chain}
+        predecessors = {}
+        successors = {task: [] for task in self.order}
+        for task in self.order:
+            if len(task.chain) == 1:
+                preds = [task_of[p] for p in self.plan.predecessors[task.step.index] 
+                         if p in task_of]
+            else:
+                preds = {task_of[p] for step in task.chain 
+                         for p in self.plan.predecessors[step.index] if p in task_of}
+                preds.discard(task)
+                preds = sorted(preds, key=lambda pred: pred.step.index)
+            predecessors[task] = preds
+            for pred in preds:
+                successors[pred].append(task)
+        self._links = (predecessors, successors)
+        return self._links
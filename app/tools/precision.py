@@ -0,0 +1,87 @@
+import numpy as np
+
+
+PRECISION_PARAM = 'precision'
+POLICIES = ('float64', 'float32', 'native')
+
+
+def precision_policy(op):
+    """
+    Decorator declaring that OP chooses the type it computes in from its
+    'precision' param, one of POLICIES or None for NumPy's type promotion.
+    Nodes of such ops get the param automatically, OpNet.run sets it for the
+    whole graph, and it is not shown to the client.
+    """
+
+    op.precision_param = PRECISION_PARAM
+    return op
+
+def check_policy(precision):
+    """
+    Return PRECISION. Raises ValueError if it is neither None nor one of
+    POLICIES.
+    """
+
+    if precision is not None and precision not in POLICIES:
+        raise ValueError('Unknown precision policy: {} (expected one of: {})'.format(
+            precision, ', '.join(POLICIES)))
+    return precision
+
+def compute_dtype(dtype, precision):
+    """
+    Return float dtype that data of DTYPE is computed in under policy
+    PRECISION, or None to leave the data as it is.
+
+    'float64' and 'float32' always compute in that type. 'native' computes
+    float data in its own type and integer data in float32.
+    """
+
+    dtype = np.dtype(dtype)
+    if check_policy(precision) is None:
+        return None
+    if precision == 'native':
+        return dtype if dtype.kind == 'f' else np.dtype('float32')
+    return np.dtype(precision)
+
+def as_compute(data, precision):
+    """
+    Return array DATA in the type to compute in under policy PRECISION. DATA
+    is returned as is if it already has that type.
+    """
+
+    dtype = compute_dtype(data.dtype, precision)
+    return data if dtype is None else data.astype(dtype, copy=False)
+
+def result_dtype(dtype, precision, native):
+    """
+    Return dtype of a result that has DTYPE under NumPy's type promotion,
+    adjusted for policy PRECISION: 'float64' and 'float32' turn floats into
+    that type, and 'native' returns NATIVE, the dtype of the input data.
+    """
+
+    dtype = np.dtype(dtype)
+    if check_policy(precision) is None:
+        return dtype
+    if precision == 'native':
+        return np.dtype(native)
+    if dtype.kind == 'f':
+        return np.dtype(precision)
+    if dtype.kind == 'c':
+        return np.dtype('complex128' if precision == 'float64' else 'complex64')
+    return dtype
+
+def cast_result(value, dtype, out=None):
+    """
+    Return array VALUE cast to DTYPE, written to buffer OUT if given. Values
+    cast to an integer type are rounded and saturated to its range instead of
+    truncated and wrapped around.
+    """
+
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'iu' and value.dtype.kind in 'fc':
+        info = np.iinfo(dtype)
+        value = np.clip(np.rint(value.real), info.min, info.max)
+    if out is None:
+        return value.astype(dtype, copy=False)
+    np.copyto(out, value, casting='unsafe')
+    return out
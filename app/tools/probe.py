@@ -0,0 +1,210 @@
+import json
+import struct
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+from imageio import imread
+
+
+# imageio reads TIFF files with tifffile if it is installed, which the TIFF
+# header rules below follow
+_TIFFFILE = importlib.util.find_spec('tifffile') is not None
+
+# channels of 8-bit PNG color types, other than palette images which imageio
+# expands to RGB or RGBA
+_PNG_CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+# JPEG start of frame markers, which hold the image size
+_JPEG_SOF = {0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7,
+             0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf}
+_TIFF_SAMPLE_KINDS = {1: 'uint', 2: 'int', 3: 'float'}
+# sizes in bytes of the TIFF field types read here
+_TIFF_FIELD_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 7: 1}
+
+
+def probe_image(uri):
+    """
+    Return dict with the file format, dtype and shape of the array imageio
+    decodes the image at URI to. Only the header is read for the common PNG,
+    JPEG, TIFF and BMP layouts; other images are decoded.
+
+    Outputs:
+        info: Dict with 'uri', 'format' (one of 'png', 'jpeg', 'tiff', 'bmp'
+            or None if unknown), 'dtype' (name), 'shape' (tuple) and
+            'decoded' (true if the image had to be decoded).
+    """
+
+    fmt, found = read_header(uri)
+    decoded = found is None
+    if decoded:
+        img = imread(uri)
+        found = img.dtype.name, img.shape
+
+    dtype, shape = found
+    return {'uri': uri, 'format': fmt, 'dtype': dtype, 'shape': tuple(shape), 'decoded': decoded}
+
+def read_header(uri):
+    """
+    Return file format of the image at URI and the (dtype name, shape) its 
+    header determines, or None in place of the latter if the image has to be 
+    decoded to find them. See probe_image.
+    """
+
+    with open(uri, 'rb') as f:
+        head = f.read(32)
+        fmt = _detect_format(head)
+        try:
+            if fmt == 'png':
+                return fmt, _probe_png(head)
+            if fmt == 'jpeg':
+                return fmt, _probe_jpeg(f)
+            if fmt == 'tiff' and _TIFFFILE:
+                return fmt, _probe_tiff(f, head)
+            if fmt == 'bmp':
+                return fmt, _probe_bmp(f)
+        except (struct.error, ValueError):
+            # truncated or unusual headers are left to the decoder
+            pass
+    return fmt, None
+
+def probe_images(uris, max_workers=None):
+    """
+    Return list of probe_image dicts for the images at URIS, in order. Files
+    are probed concurrently by up to MAX_WORKERS threads.
+    """
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='probe') as pool:
+        return list(pool.map(probe_image, uris))
+
+def _detect_format(head):
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8'):
+        return 'jpeg'
+    if head[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+        return 'tiff'
+    if head.startswith(b'BM'):
+        return 'bmp'
+    return None
+
+def _probe_png(head):
+    if head[12:16] != b'IHDR':
+        return None
+    width, height, depth, color = struct.unpack('>IIBB', head[16:26])
+    channels = _PNG_CHANNELS.get(color)
+    if channels is None or (channels > 1 and depth != 8):
+        # Pillow reduces 16-bit color to 8 bits, which is left to the decoder
+        # in case later versions do not
+        return None
+
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    if depth == 1:
+        return 'bool', shape
+    return ('uint16' if depth == 16 else 'uint8'), shape
+
+def _probe_jpeg(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if byte != b'\xff':
+            return None
+        marker = f.read(1)[0]
+        while marker == 0xff:
+            marker = f.read(1)[0]
+        if marker == 0x01 or 0xd0 <= marker <= 0xd7:
+            continue
+        if marker in (0xd9, 0xda):
+            # end of image or start of scan without a frame header
+            return None
+
+        length, = struct.unpack('>H', f.read(2))
+        if marker in _JPEG_SOF:
+            precision, height, width, components = struct.unpack('>BHHB', f.read(6))
+            if precision != 8 or height == 0 or components not in (1, 3, 4):
+                return None
+            return 'uint8', (height, width) if components == 1 else (height, width, components)
+        f.seek(length - 2, 1)
+
+def _probe_tiff(f, head):
+    order = '<' if head[:2] == b'II' else '>'
+    magic, offset = struct.unpack(order + 'HI', head[2:8])
+    if magic != 42:
+        # BigTIFF
+        return None
+
+    f.seek(offset)
+    n_entries, = struct.unpack(order + 'H', f.read(2))
+    entries = f.read(12 * n_entries)
+    next_offset, = struct.unpack(order + 'I', f.read(4))
+    if next_offset != 0:
+        # tifffile returns all pages of a series as one array
+        return None
+
+    tags = {}
+    for i in range(n_entries):
+        tag, kind, count, value = struct.unpack(order + 'HHI4s', entries[12 * i:12 * i + 12])
+        tags[tag] = (kind, count, value)
+
+    def first(tag, default):
+        return _tiff_values(f, order, *tags[tag])[0] if tag in tags else default
+
+    width, height = first(256, None), first(257, None)
+    samples = first(277, 1)
+    photometric = first(262, 1)
+    if width is None or height is None or first(284, 1) != 1 or photometric not in (0, 1, 2):
+        return None
+
+    bits = set(_tiff_values(f, order, *tags[258])) if 258 in tags else {1}
+    formats = set(_tiff_values(f, order, *tags[339])) if 339 in tags else {1}
+    if len(bits) != 1 or len(formats) != 1:
+        return None
+    bits, kind = bits.pop(), _TIFF_SAMPLE_KINDS.get(formats.pop())
+    if kind is None or bits not in (8, 16, 32, 64) or (kind == 'float' and bits == 8):
+        return None
+
+    shape = (height, width) if samples == 1 else (height, width, samples)
+    if 270 in tags:
+        # tifffile returns the shape it stored in the description, which may 
+        # differ from the page shape; ImageJ descriptions are left to it too
+        description = _tiff_values(f, order, *tags[270]).lstrip()
+        if description.startswith(b'ImageJ'):
+            return None
+        if description.startswith(b'{'):
+            try:
+                stored = json.loads(description.decode('utf-8')).get('shape')
+            except (UnicodeDecodeError, AttributeError):
+                return None
+            if stored is not None and tuple(stored) != shape:
+                return None
+
+    return '{}{}'.format(kind, bits), shape
+
+def _tiff_values(f, order, kind, count, value):
+    """
+    Return the values of a TIFF field: bytes for ASCII fields, otherwise a
+    tuple of integers.
+    """
+
+    size = _TIFF_FIELD_SIZES.get(kind)
+    if size is None:
+        raise ValueError('unsupported TIFF field type {}'.format(kind))
+    if size * count > 4:
+        position = f.tell()
+        f.seek(struct.unpack(order + 'I', value)[0])
+        value = f.read(size * count)
+        f.seek(position)
+    if kind == 2:
+        return value[:count].rstrip(b'\x00')
+    code = {1: 'B', 3: 'H', 4: 'I', 7: 'B'}[kind]
+    return struct.unpack(order + code * count, value[:size * count])
+
+def _probe_bmp(f):
+    f.seek(14)
+    header_size, = struct.unpack('<I', f.read(4))
+    if header_size < 40:
+        return None
+    width, height, _, bpp, compression = struct.unpack('<iiHHI', f.read(16))
+    # 32-bit images may or may not hold alpha, and paletted images may be
+    # expanded to RGB, so only uncompressed 24-bit images are read here
+    if bpp != 24 or compression != 0:
+        return None
+    return 'uint8', (abs(height), width, 3)
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+
+import numpy as np
+
+
+class Profiler:
+    """
+    Records the wall time, CPU time, peak allocated memory and the arrays in
+    and out of every node executed by the runs it is passed to. Runs given
+    no profiler execute nodes directly, so profiling costs nothing when it
+    is not used.
+    """
+
+    def __init__(self, memory=False):
+        """
+        Inputs:
+            memory: If true, the peak memory allocated by each node is traced
+                with tracemalloc, which slows execution down considerably.
+                Peaks of nodes running concurrently include each other's
+                allocations. (default: False)
+        """
+
+        self.memory = memory
+        self.records = []
+        self.lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._started_tracing = False
+
+    def start(self):
+        """
+        Start tracing memory if requested and not already traced.
+        """
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        """
+        Stop tracing memory if start began it.
+        """
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def wrap(self, execute):
+        """
+        Return function executing a node with EXECUTE and recording it.
+        """
+
+        def profiled(node):
+            params = node.param_values()
+            if self.memory and tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            else:
+                base = None
+            start = time.perf_counter()
+            cpu = time.thread_time()
+
+            outs = execute(node)
+
+            cpu = time.thread_time() - cpu
+            end = time.perf_counter()
+            peak = tracemalloc.get_traced_memory()[1] - base if base is not None else None
+            self._record(node, start, end, cpu, peak, params, outs)
+            return outs
+        return profiled
+
+    def _record(self, node, start, end, cpu, peak, params, outs):
+        record = {
+            'node': node.name,
+            'op': getattr(node.op, '__name__', str(node.op)),
+            'start': start - self._t0,
+            'wall': end - start,
+            'cpu': cpu,
+            'peak_bytes': peak,
+            'thread': threading.get_ident(),
+            'inputs': {name: describe(value) for name, value in params.items()},
+            'outputs': {name: describe(value) for name, value in outs.items()}
+        }
+        with self.lock:
+            self.records.append(record)
+
+    def summary(self):
+        """
+        Return list of the records of executed nodes, slowest first. Times
+        are in seconds; CPU time only counts the thread that ran the node.
+        """
+
+        return sorted(self.records, key=lambda r: r['wall'], reverse=True)
+
+    def trace_events(self):
+        """
+        Return records in the Chrome trace_event format, which chrome://tracing
+        and Perfetto display as a timeline with a row per thread.
+        """
+
+        pid = os.getpid()
+        events = []
+        for r in sorted(self.records, key=lambda r: r['start']):
+            events.append({
+                'name': r['node'],
+                'cat': r['op'],
+                'ph': 'X',
+                'ts': r['start'] * 1e6,
+                'dur': r['wall'] * 1e6,
+                'pid': pid,
+                'tid': r['thread'],
+                'args': {
+                    'cpu_ms': r['cpu'] * 1e3,
+                    'peak_bytes': r['peak_bytes'],
+                    'inputs': r['inputs'],
+                    'outputs': r['outputs']
+                }
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_trace(self, path):
+        """
+        Write trace_events to the JSON file at PATH.
+        """
+
+        with open(path, 'w') as f:
+            json.dump(self.trace_events(), f)
+
+def describe(value):
+    """
+    Return JSON-serializable dict with the shape, dtype and size in bytes of
+    array VALUE, or the type name of other values.
+    """
+
+    if isinstance(value, np.ndarray):
+        return {'shape': list(value.shape), 'dtype': value.dtype.name, 'nbytes': value.nbytes}
+    return {'type': type(value).__name__}
@@ -0,0 +1,177 @@
+import numpy as np
+import cv2 as cv
+from skimage.transform import resize as sk_resize
+
+from .precision import cast_result
+
+
+INTERPOLATIONS = ('nearest', 'linear', 'cubic', 'area', 'lanczos')
+BACKENDS = ('opencv', 'skimage', 'numpy')
+
+_CV_FLAGS = {
+    'nearest': cv.INTER_NEAREST_EXACT,
+    'linear': cv.INTER_LINEAR,
+    'cubic': cv.INTER_CUBIC,
+    'area': cv.INTER_AREA,
+    'lanczos': cv.INTER_LANCZOS4
+}
+# skimage has no area or lanczos filter, so these use its antialiased spline
+_SK_ORDERS = {'nearest': 0, 'linear': 1, 'cubic': 3, 'area': 1, 'lanczos': 3}
+_CV_DTYPES = {np.dtype(t) for t in ('uint8', 'uint16', 'int16', 'float32', 'float64')}
+# types OpenCV cannot interpolate, mapped to a type it can that holds them
+_CV_WORK = {
+    'bool': 'uint8',
+    'int8': 'int16',
+    'int32': 'float64',
+    'uint32': 'float64',
+    'int64': 'float64',
+    'uint64': 'float64',
+    'float16': 'float32'
+}
+_CV_MAX_CHANNELS = 4
+
+
+def resize(data, output_shape, interpolation='linear', backend=None, antialias=True,
+           out=None):
+    """
+    Return array DATA resized to OUTPUT_SHAPE, with the type and range of DATA.
+
+    Inputs:
+        data: Array to resize, usually rows x cols or rows x cols x channels.
+        output_shape: Sizes of the leading dimensions of the result, usually
+            (rows, cols). Missing dimensions keep the size they have in DATA.
+        interpolation: One of INTERPOLATIONS. (default: 'linear')
+        backend: One of BACKENDS, or None to pick the fastest one supporting
+            DATA with choose_backend. (default: None)
+        antialias: If true, data is smoothed before large downscales so fine
+            detail does not alias. (default: True)
+        out: Optional array of the output shape and the type of DATA to write
+            the result to. (default: None)
+    Outputs:
+        resized: Resized array.
+    """
+
+    data = np.asarray(data)
+    output_shape = full_shape(data, output_shape)
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError('Unknown interpolation: {} (expected one of: {})'.format(
+            interpolation, ', '.join(INTERPOLATIONS)))
+    if backend is None:
+        backend = choose_backend(data, output_shape, interpolation)
+    elif backend not in BACKENDS:
+        raise ValueError('Unknown resize backend: {} (expected one of: {})'.format(
+            backend, ', '.join(BACKENDS)))
+
+    return _RESIZERS[backend](data, output_shape, interpolation, antialias, out)
+
+def full_shape(data, output_shape):
+    """
+    Return OUTPUT_SHAPE as a tuple of ints, completed with the trailing
+    dimensions of DATA it leaves out.
+    """
+
+    output_shape = tuple(int(n) for n in output_shape)
+    if len(output_shape) > data.ndim:
+        raise ValueError('output_shape {} has more dimensions than data of shape {}'.format(
+            output_shape, data.shape))
+    if any(n < 1 for n in output_shape):
+        raise ValueError('output_shape must be positive (entered: {})'.format(output_shape))
+    return output_shape + data.shape[len(output_shape):]
+
+def choose_backend(data, output_shape, interpolation):
+    """
+    Return name of the fastest backend able to resize DATA to OUTPUT_SHAPE
+    with INTERPOLATION. OpenCV handles images of up to 4 channels, converting
+    types it lacks to ones that hold them. NumPy handles nearest sampling and
+    area downscales by whole factors for any type and number of dimensions.
+    skimage handles everything else.
+    """
+
+    if _fits_opencv(data, output_shape, interpolation):
+        return 'opencv'
+    if interpolation == 'nearest' or \
+            (interpolation == 'area' and _block_factors(data.shape, output_shape)):
+        return 'numpy'
+    return 'skimage'
+
+def _fits_opencv(data, output_shape, interpolation):
+    if data.ndim not in (2, 3) or data.size == 0 or output_shape[2:] != data.shape[2:]:
+        return False
+    if data.ndim == 3 and data.shape[2] > _CV_MAX_CHANNELS:
+        return False
+    if data.dtype in _CV_DTYPES:
+        return True
+    # nearest sampling is exact in numpy, while a work type could round
+    return interpolation != 'nearest' and data.dtype.name in _CV_WORK
+
+def _block_factors(shape, output_shape):
+    """
+    Return tuple with the whole factor by which each dimension of SHAPE
+    shrinks to OUTPUT_SHAPE, or None if a dimension does not shrink by one.
+    """
+
+    if any(n % m for n, m in zip(shape, output_shape)):
+        return None
+    return tuple(n // m for n, m in zip(shape, output_shape))
+
+def _resize_opencv(data, output_shape, interpolation, antialias, out):
+    rows, cols = output_shape[:2]
+    work = data
+    if data.dtype not in _CV_DTYPES:
+        work = data.astype(_CV_WORK[data.dtype.name])
+
+    # OpenCV drops a channel axis of length 1
+    dst = out
+    if work.ndim == 3 and work.shape[2] == 1:
+        work = work[:, :, 0]
+        dst = None if out is None else out[:, :, 0]
+    if dst is not None and (dst.dtype != work.dtype or not dst.flags.c_contiguous):
+        dst = None
+
+    if antialias and interpolation in ('linear', 'cubic', 'lanczos'):
+        # halve the image with a gaussian pyramid until it is within a factor
+        # of two of the output, where the interpolation no longer aliases
+        while work.shape[0] >= 2 * rows and work.shape[1] >= 2 * cols:
+            work = cv.pyrDown(work)
+
+    resized = cv.resize(work, (cols, rows), dst=dst, interpolation=_CV_FLAGS[interpolation])
+    if dst is not None:
+        return out
+    resized = resized.reshape(output_shape)
+    if out is None and resized.dtype == data.dtype:
+        return resized
+    return cast_result(resized, data.dtype, out)
+
+def _resize_skimage(data, output_shape, interpolation, antialias, out):
+    # skimage only samples bool data
+    order = 0 if data.dtype == bool else _SK_ORDERS[interpolation]
+    resized = sk_resize(data, output_shape, order=order, preserve_range=True,
+                        anti_aliasing=antialias and order > 0)
+    return cast_result(resized, data.dtype, out)
+
+def _resize_numpy(data, output_shape, interpolation, antialias, out):
+    if interpolation == 'nearest':
+        # sample the input pixel under the centre of each output pixel
+        resized = data
+        for axis, (n, m) in enumerate(zip(data.shape, output_shape)):
+            if n != m:
+                index = ((np.arange(m) + 0.5) * (n / m)).astype(np.intp)
+                resized = np.take(resized, np.minimum(index, n - 1), axis=axis)
+    elif interpolation == 'area' and _block_factors(data.shape, output_shape):
+        factors = _block_factors(data.shape, output_shape)
+        blocks = data.reshape([d for pair in zip(output_shape, factors) for d in pair])
+        dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+        resized = blocks.mean(axis=tuple(range(1, blocks.ndim, 2)), dtype=dtype)
+    else:
+        raise ValueError("The numpy backend supports only 'nearest' interpolation and "
+                         "'area' downscales by whole factors.")
+
+    if out is None and resized.dtype == data.dtype:
+        return resized if resized is not data else data.copy()
+    return cast_result(resized, data.dtype, out)
+
+_RESIZERS = {
+    'opencv': _resize_opencv,
+    'skimage': _resize_skimage,
+    'numpy': _resize_numpy
+}
@@ -0,0 +1,106 @@
+from collections import deque
+
+
+class GraphCycleError(ValueError):
+    """
+    Raised when the conduits of an OpNet form a cycle.
+    """
+
+    pass
+
+
+class Schedule:
+    """
+    Topological execution order for the nodes of an OpNet.
+    """
+
+    def __init__(self, nodes, conduits):
+        """
+        Order NODES so that every node runs after the nodes feeding its params.
+
+        Inputs:
+            nodes: Iterable of Node objects, in insertion order.
+            conduits: Iterable of Conduit objects connecting the nodes.
+        """
+
+        nodes = list(nodes)
+        self.successors = {node: [] for node in nodes}
+        self.predecessors = {node: [] for node in nodes}
+        for conduit in conduits:
+            src = conduit.source.node
+            dst = conduit.output.node
+            self.successors[src].append(dst)
+            self.predecessors[dst].append(src)
+
+        self.depths = self._compute_depths(nodes)
+
+        # bucket nodes by depth, keeping insertion order within each level
+        levels = [[] for _ in range(max(self.depths.values(), default=-1) + 1)]
+        for node in nodes:
+            levels[self.depths[node]].append(node)
+        self.levels = [tuple(level) for level in levels]
+        self.order = tuple(node for level in self.levels for node in level)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def descendants(self, nodes):
+        """
+        Return set of NODES and every node reachable from them via conduits.
+        """
+
+        found = set(nodes)
+        stack = list(found)
+        while stack:
+            for succ in self.successors[stack.pop()]:
+                if succ not in found:
+                    found.add(succ)
+                    stack.append(succ)
+
+        return found
+
+    def ancestors(self, nodes):
+        """
+        Return set of NODES and every node they depend on via conduits.
+        """
+
+        found = set(nodes)
+        stack = list(found)
+        while stack:
+            for pred in self.predecessors[stack.pop()]:
+                if pred not in found:
+                    found.add(pred)
+                    stack.append(pred)
+
+        return found
+
+    def _compute_depths(self, nodes):
+        """
+        Assign each node the length of the longest path from a root node to it.
+        Runs Kahn's algorithm, so cost is linear in the number of nodes and
+        conduits.
+        """
+
+        pending = {node: len(self.predecessors[node]) for node in nodes}
+        depths = {node: 0 for node in nodes}
+        ready = deque(node for node in nodes if pending[node] == 0)
+
+        n_visited = 0
+        while ready:
+            node = ready.popleft()
+            n_visited += 1
+            for succ in self.successors[node]:
+                depths[succ] = max(depths[succ], depths[node] + 1)
+                pending[succ] -= 1
+                if pending[succ] == 0:
+                    ready.append(succ)
+
+        if n_visited < len(nodes):
+            cyclic = [node.name for node in nodes if pending[node] > 0]
+            raise GraphCycleError(
+                "Conduits form a cycle. Unable to schedule nodes: {}".format(', '.join(cyclic)))
+
+        return depths
@@ -0,0 +1,178 @@
+import numpy as np
+
+
+# sized to stay in the L2 cache along with the temporaries of a chunk
+CHUNK_BYTES = 1 << 18
+
+
+def chunks(*arrays, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield tuples of corresponding chunks of ARRAYS, which must share their
+    shape. Chunks of the first array take about CHUNK_BYTES, so a kernel
+    applied chunk by chunk reads each array from memory only once however
+    many passes it makes over a chunk. Chunks are views, so writing to a
+    chunk writes to its array.
+    """
+
+    shape = arrays[0].shape
+    if any(arr.shape != shape for arr in arrays):
+        raise ValueError('arrays must share their shape (got: {})'.format(
+            [arr.shape for arr in arrays]))
+    if arrays[0].size == 0:
+        return
+
+    if all(arr.flags.c_contiguous for arr in arrays):
+        flat = [arr.reshape(-1) for arr in arrays]
+        step = max(chunk_bytes // arrays[0].itemsize, 1)
+        for start in range(0, flat[0].size, step):
+            yield tuple(arr[start:start + step] for arr in flat)
+    elif len(shape) > 1:
+        # views that cannot be flattened without a copy are split by rows
+        step = max(chunk_bytes * shape[0] // arrays[0].nbytes, 1)
+        for start in range(0, shape[0], step):
+            yield tuple(arr[start:start + step] for arr in arrays)
+    else:
+        step = max(chunk_bytes // arrays[0].itemsize, 1)
+        for start in range(0, shape[0], step):
+            yield tuple(arr[start:start + step] for arr in arrays)
+
+class MinMax:
+    """
+    Running minimum and maximum of the chunks of an array. NaN propagates as
+    in np.min and np.max.
+    """
+
+    def __init__(self):
+        self.min = None
+        self.max = None
+
+    def update(self, chunk):
+        """
+        Account for the values of array CHUNK.
+        """
+
+        if chunk.size == 0:
+            return
+        lo, hi = chunk.min(), chunk.max()
+        self.min = lo if self.min is None else np.minimum(self.min, lo)
+        self.max = hi if self.max is None else np.maximum(self.max, hi)
+
+class MeanVar:
+    """
+    Running count, mean and sum of squared deviations of the chunks of an
+    array, merged with Chan's pairwise update so the result is as accurate
+    as a two-pass computation. Sums are kept in float64.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, chunk):
+        """
+        Account for the values of array CHUNK.
+        """
+
+        n = chunk.size
+        if n == 0:
+            return
+        mean = chunk.mean(dtype=np.float64)
+        dev = (chunk - mean).ravel()
+        m2 = float(np.dot(dev, dev))
+
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def var(self, ddof=0):
+        """
+        Return variance of the values seen, with DDOF delta degrees of
+        freedom as in np.var.
+        """
+
+        return self.m2 / (self.count - ddof) if self.count > ddof else np.nan
+
+def min_max(data):
+    """
+    Return minimum and maximum of array DATA, reading it once. Raises
+    ValueError if DATA is empty.
+    """
+
+    bounds = MinMax()
+    for (chunk,) in chunks(data):
+        bounds.update(chunk)
+    if bounds.min is None:
+        raise ValueError('zero-size array has no minimum or maximum')
+    return bounds.min, bounds.max
+
+def mean_var(data, ddof=0):
+    """
+    Return mean and variance of array DATA, reading it once. See MeanVar.
+    """
+
+    acc = MeanVar()
+    for (chunk,) in chunks(data):
+        acc.update(chunk)
+    return (acc.mean if acc.count else np.nan), acc.var(ddof)
+
+def histogram(data, bins=256, range=None):
+    """
+    Return counts and bin edges of the values of array DATA, as np.histogram
+    with uniform bins.
+
+    Inputs:
+        data: Array of numbers.
+        bins: Number of bins, or None to count every integer level between
+            the bounds of integer data separately. (default: 256)
+        range: (min, max) covered by the bins. Computed from DATA in an
+            extra pass if None. (default: None)
+    Outputs:
+        counts: Array with the number of values in each bin.
+        edges: Array with the bins + 1 bin edges.
+    """
+
+    if range is None:
+        range = min_max(data)
+    lo, hi = range
+
+    if bins is None:
+        if data.dtype.kind not in 'iub':
+            raise ValueError('bins can only be None for integer data')
+        lo, hi = int(lo), int(hi)
+        counts = np.zeros(hi - lo + 1, dtype=np.intp)
+        for (chunk,) in chunks(data):
+            levels = chunk.ravel().astype(np.int64) - lo
+            levels = levels[(levels >= 0) & (levels < counts.size)]
+            counts += np.bincount(levels, minlength=counts.size)
+        return counts, np.arange(lo, hi + 2)
+
+    if data.dtype == np.uint8 and bins == 256 and (lo, hi) == (0, 256):
+        counts = np.zeros(256, dtype=np.intp)
+        for (chunk,) in chunks(data):
+            counts += np.bincount(chunk.ravel(), minlength=256)
+        return counts, np.arange(257)
+
+    if lo == hi:
+        # widen an empty range the way np.histogram does
+        lo, hi = lo - 0.5, hi + 0.5
+    counts = np.zeros(bins, dtype=np.intp)
+    for (chunk,) in chunks(data):
+        counts += np.histogram(chunk, bins=bins, range=(lo, hi))[0]
+    return counts, np.linspace(lo, hi, bins + 1)
+
+def quantiles(counts, edges, qs):
+    """
+    Return values below which the fractions QS of the values counted in the
+    histogram COUNTS with EDGES lie. Values are interpolated linearly within
+    a bin, so they are accurate to within one bin width.
+    """
+
+    cdf = np.cumsum(counts)
+    targets = np.asarray(qs, dtype=np.float64) * cdf[-1]
+    i = np.minimum(np.searchsorted(cdf, targets, side='left'), len(counts) - 1)
+    before = np.where(i > 0, cdf[i - 1], 0)
+    frac = np.where(counts[i] > 0, (targets - before) / np.maximum(counts[i], 1), 0.0)
+    return edges[i] + np.clip(frac, 0, 1) * (edges[i + 1] - edges[i])
@@ -0,0 +1,294 @@
+import os
+import time
+import warnings
+import threading
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import io
+
+
+# temporary files older than this many seconds were left by a creation that 
+# did not finish, while younger ones may still be written by another process
+TMP_MAX_AGE = 3600
+
+class ThumbnailStore:
+    """
+    Folder of thumbnails named by their io.hash_file keys and sharded into
+    subfolders by the first characters of the key. Thumbnails are evicted
+    least recently used first once their total size exceeds a budget, and
+    when they were not used for longer than a maximum age, which is checked 
+    on every lookup. The time of last use is recorded as the modification 
+    time of the file.
+    """
+
+    def __init__(self, directory, ext='.jpg', max_bytes=None, max_age=None):
+        """
+        Open store at DIRECTORY, creating it if needed. Thumbnails stored
+        flat in DIRECTORY are moved into their shards.
+
+        Inputs:
+            directory: Path to folder holding the thumbnails.
+            ext: Extension of the thumbnail files, which sets their format.
+                (default: '.jpg')
+            max_bytes: Maximum total size in bytes of all thumbnails, or None
+                for no limit. (default: None)
+            max_age: Maximum time in seconds since a thumbnail was last used,
+                or None for no limit. (default: None)
+        """
+
+        self.directory = directory
+        self.ext = ext
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(directory):
+            if entry.is_dir():
+                for thumb in os.scandir(entry.path):
+                    self._found(thumb, found)
+            else:
+                self._found(entry, found, migrate=True)
+
+        # order entries by last use
+        for used, key, size in sorted(found):
+            self.entries[key] = (size, used)
+            self.total_bytes += size
+        with self.lock:
+            self._evict()
+
+    def _found(self, entry, found, migrate=False):
+        if '.tmp' in entry.name:
+            try:
+                if entry.stat().st_mtime < time.time() - TMP_MAX_AGE:
+                    os.remove(entry.path)
+            except OSError:
+                # finished or removed by another process
+                pass
+            return
+        if not entry.name.endswith(self.ext):
+            return
+        stat = entry.stat()
+        key = entry.name[:-len(self.ext)]
+        if migrate:
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(entry.path, path)
+        found.append((stat.st_mtime, key, stat.st_size))
+
+    def relative_path(self, key):
+        """
+        Return path of the thumbnail with KEY relative to the directory.
+        """
+
+        return os.path.join(key[:2], key + self.ext)
+
+    def path(self, key):
+        return os.path.join(self.directory, self.relative_path(key))
+
+    def lookup(self, key):
+        """
+        Return relative path of the thumbnail with KEY, marking it as used,
+        or None if it is not stored.
+        """
+
+        path = self.path(key)
+        now = time.time()
+        with self.lock:
+            if key not in self.entries:
+                # may have been stored by another process sharing the folder
+                if not os.path.exists(path):
+                    self.misses += 1
+                    return None
+                self.entries[key] = (os.path.getsize(path), now)
+                self.total_bytes += self.entries[key][0]
+            self.entries[key] = (self.entries[key][0], now)
+            self.entries.move_to_end(key)
+            self.hits += 1
+            # a server creating no thumbnails must still expire old ones
+            self._evict()
+
+        try:
+            os.utime(path)
+        except OSError:
+            # evicted by another process
+            with self.lock:
+                size, _ = self.entries.pop(key, (0, None))
+                self.total_bytes -= size
+            return None
+        return self.relative_path(key)
+
+    def add(self, key, tmp_path):
+        """
+        Store the thumbnail file at TMP_PATH, which is moved, under KEY.
+        Returns its relative path.
+        """
+
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self.lock:
+            old_size, _ = self.entries.pop(key, (0, None))
+            self.entries[key] = (size, time.time())
+            self.total_bytes += size - old_size
+            self._evict()
+        return self.relative_path(key)
+
+    def stats(self):
+        """
+        Return dict with the number of 'hits' and 'misses' of lookups so far,
+        and the number of 'entries' and their total 'bytes'.
+        """
+
+        with self.lock:
+            self._evict()
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self.entries), 'bytes': self.total_bytes}
+
+    def _evict(self):
+        """
+        Remove least recently used thumbnails until the store fits its
+        budgets.
+        """
+
+        oldest = time.time() - self.max_age if self.max_age is not None else None
+        while self.entries:
+            key, (size, used) = next(iter(self.entries.items()))
+            if not ((self.max_bytes is not None and self.total_bytes > self.max_bytes)
+                    or (oldest is not None and used < oldest)):
+                break
+            del self.entries[key]
+            self.total_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+class ThumbnailPool:
+    """
+    Creates thumbnails on a pool of worker threads. Thumbnails of a folder
+    can be queued in the background, and requested thumbnails are created
+    ahead of queued ones, since only a few queued thumbnails are handed to
+    the pool at a time.
+    """
+
+    def __init__(self, store, max_workers=None):
+        """
+        Inputs:
+            store: ThumbnailStore the thumbnails are saved in.
+            max_workers: Number of worker threads, or None for the number of
+                CPUs. (default: None)
+        """
+
+        self.store = store
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='thumb')
+        # callbacks of finished futures may run while the lock is held
+        self.lock = threading.RLock()
+        self.queued = OrderedDict()
+        self.running = {}
+
+    def queue(self, uris, keys=None):
+        """
+        Create thumbnails of the images at URIS in the background, replacing
+        the thumbnails queued by earlier calls that did not start yet. KEYS
+        optionally maps URIS to their io.hash_file keys.
+        """
+
+        keys = keys or {}
+        with self.lock:
+            self.queued = OrderedDict(
+                (uri, keys.get(uri)) for uri in uris if uri not in self.running)
+            self._fill()
+
+    def get(self, uri, key=None):
+        """
+        Return relative path of the thumbnail of the image at URI, creating
+        it if needed. Raises the error of a failed creation.
+        """
+
+        return self._request([uri], {uri: key} if key else {})[0].result()
+
+    def get_many(self, uris, keys=None):
+        """
+        Return list of relative paths of the thumbnails of the images at URIS,
+        created concurrently if needed, with None for thumbnails that could
+        not be created.
+        """
+
+        paths = []
+        for uri, future in zip(uris, self._request(uris, keys or {})):
+            try:
+                paths.append(future.result())
+            except Exception as e:
+                warnings.warn('Could not create thumbnail of {}: {}'.format(uri, e))
+                paths.append(None)
+        return paths
+
+    def close(self):
+        """
+        Drop queued thumbnails and stop the workers once they are done.
+        """
+
+        with self.lock:
+            self.queued.clear()
+        self.pool.shutdown(wait=False)
+
+    def _request(self, uris, keys):
+        with self.lock:
+            futures = []
+            for uri in uris:
+                self.queued.pop(uri, None)
+                future = self.running.get(uri)
+                if future is None:
+                    future = self._submit(uri, keys.get(uri))
+                futures.append(future)
+            return futures
+
+    def _fill(self):
+        # keep the pool busy without handing it the whole queue, so requests
+        # wait for at most a few queued thumbnails
+        while self.queued and len(self.running) < 2 * self.max_workers:
+            uri, key = self.queued.popitem(last=False)
+            try:
+                self._submit(uri, key)
+            except RuntimeError:
+                # the pool was shut down, along with the interpreter
+                self.queued.clear()
+
+    def _submit(self, uri, key):
+        future = self.pool.submit(self._create, uri, key)
+        self.running[uri] = future
+        future.add_done_callback(partial(self._done, uri))
+        return future
+
+    def _done(self, uri, future):
+        with self.lock:
+            if self.running.get(uri) is future:
+                del self.running[uri]
+            self._fill()
+
+    def _create(self, uri, key):
+        if key is None:
+            key = io.hash_file(uri)
+        relative = self.store.lookup(key)
+        if relative is None:
+            # write under a temporary name, so a thumbnail is never served
+            # half written
+            tmp_path = os.path.join(self.store.directory, '{}-{}-{}.tmp{}'.format(
+                key, os.getpid(), threading.get_ident(), self.store.ext))
+            try:
+                io.create_thumbnail(uri, tmp_path)
+                relative = self.store.add(key, tmp_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return relative
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+
+
+DEFAULT_TILE_SHAPE = (1024, 1024)
+
+
+def pointwise(op):
+    """
+    Decorator declaring that each output pixel of OP depends only on the same
+    pixel of its array params, so OP can be applied to an image tile by tile.
+    """
+
+    op.tile_halo = 0
+    return op
+
+def stencil(halo):
+    """
+    Decorator declaring that each output pixel of an op depends on the input
+    pixels within HALO rows and columns of it. HALO is an int or a function
+    taking the dict of param values and returning an int.
+    """
+
+    def decorate(op):
+        op.tile_halo = halo
+        return op
+    return decorate
+
+def get_halo(node):
+    """
+    Return halo of the op at NODE, or None if the op cannot be tiled.
+    """
+
+    halo = getattr(node.op, 'tile_halo', None)
+    if callable(halo):
+        halo = halo(node.param_values())
+    return halo
+
+def run_tiled(net, inputs, outputs, tile_shape=DEFAULT_TILE_SHAPE, **run_kwargs):
+    """
+    Run NET over images too large to hold in memory by streaming tiles of the
+    inputs through the graph and writing each tile of the results to OUTPUTS.
+
+    Every node downstream of a tiled input must be declared pointwise or
+    stencil. Nodes that do not depend on a tiled input run once. Tiles are
+    read with enough surrounding context for the stencils along every path,
+    so results match running on the whole image.
+
+    Inputs:
+        net: OpNet to run.
+        inputs: Dict mapping (node, param name) pairs to images of identical
+            height and width. Images can be any array-like supporting slicing,
+            such as those returned by io.open_image_lazy.
+        outputs: Dict mapping (node, output name) pairs to the destination of
+            that output: a path ending in .npy or .tif/.tiff, or a writeable
+            array of the full output shape.
+        tile_shape: (rows, cols) of each tile. (default: (1024, 1024))
+        run_kwargs: Keyword arguments passed to OpNet.run for each tile.
+    Outputs:
+        results: Dict mapping the keys of OUTPUTS to the written arrays.
+    """
+
+    inputs = {(net._get(node), name): img for (node, name), img in inputs.items()}
+    outputs = {(net._get(node), name): dest for (node, name), dest in outputs.items()}
+    shapes = {tuple(img.shape[:2]) for img in inputs.values()}
+    if len(shapes) != 1:
+        raise ValueError('tiled inputs must share height and width (got: {})'.format(shapes))
+    height, width = shapes.pop()
+
+    tiled = net.get_schedule().descendants(node for node, _ in inputs)
+    margin = _tile_margin(net, tiled, {node for node, _ in outputs})
+
+    # nodes that do not depend on the tiles keep their outputs between tiles
+    keep = list(outputs) + [(node, output.name) for node in net.nodes 
+                            if node not in tiled for output in node.outputs]
+    run_kwargs['incremental'] = True
+
+    written = {}
+    for r0 in range(0, height, tile_shape[0]):
+        r1 = min(r0 + tile_shape[0], height)
+        for c0 in range(0, width, tile_shape[1]):
+            c1 = min(c0 + tile_shape[1], width)
+
+            # read tile with surrounding context, clipped to the image
+            wr0, wr1 = max(r0 - margin, 0), min(r1 + margin, height)
+            wc0, wc1 = max(c0 - margin, 0), min(c1 + margin, width)
+            for (node, name), img in inputs.items():
+                node.get_param(name).set_value(np.asarray(img[wr0:wr1, wc0:wc1]))
+
+            results = net.run(keep=keep, **run_kwargs)
+            values = {(net.get_node(r['node']), name): val
+                      for r in results for name, val in r['outputs'].items()}
+            for key, dest in outputs.items():
+                tile = np.asarray(values[key])
+                if tile.shape[:2] != (wr1 - wr0, wc1 - wc0):
+                    raise ValueError('{} changed the shape of its tile from {} to {}'.format(
+                        key[0].name, (wr1 - wr0, wc1 - wc0), tile.shape[:2]))
+                if key not in written:
+                    written[key] = _open_output(dest, (height, width) + tile.shape[2:], tile.dtype)
+                written[key][r0:r1, c0:c1] = tile[r0 - wr0:r1 - wr0, c0 - wc0:c1 - wc0]
+
+    for arr in written.values():
+        if hasattr(arr, 'flush'):
+            arr.flush()
+    return written
+
+def _tile_margin(net, tiled, output_nodes):
+    """
+    Return number of context pixels needed around a tile so every stencil
+    among the TILED nodes feeding OUTPUT_NODES sees the same data as on the 
+    whole image. Raises ValueError if a tiled node cannot be tiled.
+    """
+
+    schedule = net.get_schedule()
+    acc = {}
+    for node in schedule.order:
+        if node not in tiled:
+            continue
+        halo = get_halo(node)
+        if halo is None:
+            raise ValueError('{} depends on a tiled input but its op is not declared '
+                             'pointwise or stencil.'.format(node.name))
+        acc[node] = halo + max((acc[p] for p in schedule.predecessors[node] if p in acc),
+                               default=0)
+
+    return max((acc.get(node, 0) for node in output_nodes), default=0)
+
+def _open_output(dest, shape, dtype):
+    """
+    Return writeable array of SHAPE and DTYPE backed by DEST.
+    """
+
+    if not isinstance(dest, str):
+        if tuple(dest.shape) != shape:
+            raise ValueError('output array has shape {} (expected: {})'.format(dest.shape, shape))
+        return dest
+
+    ext = os.path.splitext(dest)[1].lower()
+    if ext == '.npy':
+        return np.lib.format.open_memmap(dest, mode='w+', dtype=dtype, shape=shape)
+    if ext in ('.tif', '.tiff'):
+        try:
+            import tifffile
+        except ImportError:
+            raise ValueError('tifffile is required to write tiled TIFF outputs.')
+        return tifffile.memmap(dest, shape=shape, dtype=dtype)
+    raise ValueError('Unsupported output format: {}'.format(dest))
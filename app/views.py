@@ -1,15 +1,20 @@
 import re
 import os
 import json
+import uuid
+import hashlib
 import warnings
 import importlib
+import threading
+from collections import OrderedDict
 
 import numpy as np
-from flask import request, render_template, jsonify, url_for, Blueprint
+from flask import request, session, render_template, jsonify, url_for, Blueprint, \
+    Response, stream_with_context
 
 from app import app
 from .tools import io as io
-from .tools import opnet, ops
+from .tools import opnet, ops, cache, plan, executors, arena, bands, profiling, probe, folders, thumbnails
 
 
 config = app.config['APPDATA']
@@ -26,6 +31,50 @@ for pkg in config['PACKAGES']:
         warnings.warn('Could not find package: {}'.format(p_root))
 config['PACKAGES'] = pkgs
 
+# persistent cache of node outputs shared by all sessions
+if config['RESULT_CACHE_DIR']:
+    result_cache = cache.ResultCache(
+        config['RESULT_CACHE_DIR'], config['RESULT_CACHE_MAX_BYTES'])
+else:
+    result_cache = None
+
+# output buffers reused by ops across nodes, runs and sessions
+if config['BUFFER_ARENA_MAX_BYTES']:
+    buffer_arena = arena.BufferArena(config['BUFFER_ARENA_MAX_BYTES'])
+else:
+    buffer_arena = None
+
+# files of the folders opened before, so reopening one only probes new files
+if config['FOLDER_INDEX_PATH']:
+    folder_index = folders.FolderIndex(config['FOLDER_INDEX_PATH'])
+else:
+    folder_index = None
+
+# thumbnails are created by worker threads, in the background for open folders,
+# and evicted once unused for long or over budget
+thumbnail_store = thumbnails.ThumbnailStore(
+    os.path.join('app', 'static', config['THUMBS_DIR']), 
+    config['THUMBNAIL_EXT'], 
+    config['THUMBNAIL_MAX_BYTES'], 
+    config['THUMBNAIL_MAX_AGE_DAYS'] * 86400 if config['THUMBNAIL_MAX_AGE_DAYS'] else None
+)
+thumbnail_pool = thumbnails.ThumbnailPool(thumbnail_store, config['THUMBNAIL_WORKERS'])
+
+# large arrays are split into row bands processed by a shared thread pool
+bands.configure(config['BAND_MIN_BYTES'], config['BAND_WORKERS'])
+
+# compiled plans of recent graph structures, shared by all sessions
+plans = OrderedDict()
+plans_lock = threading.Lock()
+
+# plan states of recent sessions, reused by /run-graph for incremental runs
+live_graphs = OrderedDict()
+live_graphs_lock = threading.Lock()
+
+# images of the active folder, listed when its first page is requested
+folder_listing = {}
+folder_listing_lock = threading.Lock()
+
 # load blueprint to source file folder
 folder_bp = Blueprint('files', __name__, static_folder='current')
 app.register_blueprint(folder_bp, url_prefix='/files')
@@ -48,6 +97,8 @@ lops = [
     [ops.multiply, 'Math', 'data'],
     [ops.convert_data_type, 'Data', 'data'],
     [ops.rescale_range, 'Data', ['data', 'out_min', 'out_max']],
+    [ops.standardize, 'Data', ['data', 'mean', 'std']],
+    [ops.normalize_percentiles, 'Data', ['data', 'low', 'high']],
     [ops.resize_image, 'Image', 'data'],
     [ops.adjust_brightness, 'Image', 'data'],
     [ops.adjust_contrast, 'Image', 'data']
@@ -70,6 +121,10 @@ def home():
         except Exception as e:
             print(e)
 
+    # the outputs sent for live graphs refer to the deleted files
+    with live_graphs_lock:
+        live_graphs.clear()
+
     return render_template('index.html')
 
 @app.route('/get-config')
@@ -91,17 +146,43 @@ def available_operations():
 @app.route('/set-folder', methods=['POST'])
 def set_folder():
     """
-    Set active folder for data methods. Returns list of all images in folder.
+    Set active folder for data methods. Returns list of all images in folder. 
+    If the form field 'limit' is given, only the images from the form field 
+    'offset' (default: 0) on are returned, at most LIMIT of them, in a dict 
+    with the 'images', the 'total' number of images and the offset of the 
+    'next' page, or null after the last page. The folder is listed again for 
+    the first page and reused for the following ones. Later pages of any 
+    folder but the one listed last are refused with 409.
     """
 
     new_folder = request.form['folder']
-    config["FILE_DIR"] = new_folder
-
-    # set blueprint static folder
-    folder_bp.static_folder = new_folder
-
-    image_list = io.list_all_images(config["FILE_DIR"])
-    images_info = [io.get_image_info(uri) for uri in image_list]
+    try:
+        offset = int(request.form.get('offset', 0))
+        limit = int(request.form['limit']) if 'limit' in request.form else None
+    except ValueError as e:
+        return jsonify({'error': 'Invalid page: {}'.format(e)}), 400
+    if offset < 0 or (limit is not None and limit <= 0):
+        return jsonify({'error': 'Invalid page: offset must not be negative and '
+                                 'limit must be positive.'}), 400
+
+    with folder_listing_lock:
+        if offset > 0 and folder_listing.get('folder') != new_folder:
+            # another folder was opened since this one was listed
+            return jsonify({'error': 'Folder {} is no longer active.'.format(new_folder)}), 409
+        if offset == 0:
+            config["FILE_DIR"] = new_folder
+
+            # set blueprint static folder
+            folder_bp.static_folder = new_folder
+
+            folder_listing['folder'] = new_folder
+            folder_listing['images'] = _list_images()
+            if config['THUMBNAIL_PREFETCH']:
+                thumbnail_pool.queue(folder_listing['images'], _thumbnail_keys(folder_listing['images']))
+        image_list = folder_listing['images']
+
+    page = image_list if limit is None else image_list[offset:offset + limit]
+    images_info = [io.get_image_info(uri) for uri in page]
 
     for img in images_info:
         img['route'] = url_for(
@@ -109,7 +190,14 @@ def set_folder():
             filename=img['filename']
         )
 
-    return jsonify(images_info)
+    if limit is None:
+        return jsonify(images_info)
+    end = offset + len(page)
+    return jsonify({
+        'images': images_info,
+        'total': len(image_list),
+        'next': end if end < len(image_list) else None
+    })
 
 @app.route('/get-thumbnail', methods=['POST'])
 def get_thumbnail():
@@ -118,36 +206,49 @@ def get_thumbnail():
     """
 
     img_uri = request.form['uri']
-
-    # create thumbnails folder if does not exist
-    thumbs_dir = os.path.join('app', 'static', config['THUMBS_DIR'])
-    if not os.path.exists(thumbs_dir):
-        os.makedirs(thumbs_dir)
-
-    # get name of thumbnail file
-    thumbnail_fname = io.hash_file(img_uri) + config['THUMBNAIL_EXT']
-    fpath_server = os.path.join(thumbs_dir, thumbnail_fname)
-
-    # verify thumbnail exists
-    if not os.path.exists(fpath_server):
-        io.create_thumbnail(img_uri, fpath_server)
+    thumbnail_fname = thumbnail_pool.get(img_uri)
 
     # return relative path to client
     fpath_client = os.path.join('static', config['THUMBS_DIR'], thumbnail_fname)
     return fpath_client
 
+@app.route('/get-thumbnails', methods=['POST'])
+def get_thumbnails():
+    """
+    Find and/or create thumbnails for the files in the JSON list held by the 
+    form field 'uris'. Returns list of their relative paths, with null for 
+    files whose thumbnail could not be created.
+    """
+
+    img_uris = json.loads(request.form['uris'])
+    thumbnail_fnames = thumbnail_pool.get_many(img_uris)
+    return jsonify([
+        None if fname is None else os.path.join('static', config['THUMBS_DIR'], fname)
+        for fname in thumbnail_fnames
+    ])
+
+@app.route('/thumbnail-stats')
+def thumbnail_stats():
+    """
+    Return hits, misses, number and total size in bytes of stored thumbnails.
+    """
+
+    return jsonify(thumbnail_store.stats())
+
 @app.route('/data-summary', methods=['GET', 'POST'])
 def data_summary():
     """
-    Run all data operations and return output to user.
+    Run all data operations and return output to user. Images are probed 
+    once, reading only their headers where possible.
     """
 
-    img_names = io.list_all_images(config["FILE_DIR"])
+    img_names = _list_images()
+    probes = _probe_images(img_names)
 
     ops_output = []
     ops_output.append(io.count_file_types(img_names))
-    ops_output.append(io.count_data_types(img_names))
-    ops_output.append(io.get_image_shapes(img_names))
+    ops_output.append(io.count_data_types(img_names, probes))
+    ops_output.append(io.get_image_shapes(img_names, probes))
 
     return jsonify(ops_output)
 
@@ -157,40 +258,305 @@ def count_data_types():
     Count all unique data types in list of images at DATA_FOLDER.
     """
 
-    img_names = io.list_all_images(config["FILE_DIR"])
-    out = io.count_data_types(img_names)
+    img_names = _list_images()
+    out = io.count_data_types(img_names, _probe_images(img_names))
     return jsonify(out)
 
 @app.route('/run-graph', methods=['POST'])
 def run_graph():
     """
-    Run all operations and return output to user.
+    Run all operations and return output to user. Graphs are compiled to a 
+    plan once per structure, and the values of each session are kept between 
+    calls, so rerunning a graph with only literal params changed re-executes 
+    just the affected nodes and the nodes downstream of them. If the form 
+    field 'targets' holds a JSON list of node names or [node, output] pairs, 
+    only the nodes needed for these outputs are run and only they are 
+    returned. If the form field 'profile' is 'true', the results are returned 
+    under 'results' along with a 'profile' of the nodes executed and the URL 
+    of its Chrome trace file.
     """
 
     graph_schematic = json.loads(request.form['graph'])
     print(graph_schematic)
+    targets = json.loads(request.form['targets']) if 'targets' in request.form else None
+    profiler = None
+    if request.form.get('profile') == 'true':
+        profiler = profiling.Profiler(memory=config['PROFILE_MEMORY'])
 
-    graph = opnet.OpNet()
+    try:
+        key, compiled = _get_plan(graph_schematic)
+    except opnet.GraphCycleError as e:
+        return jsonify({'error': str(e)}), 400
+
+    session_id = session.setdefault('graph_id', uuid.uuid4().hex)
+    with live_graphs_lock:
+        live = live_graphs.get(session_id)
+        if live is None or live.key != key:
+            live = LiveGraph(compiled, key)
+            live_graphs[session_id] = live
+            while len(live_graphs) > config['MAX_LIVE_GRAPHS']:
+                live_graphs.popitem(last=False)
+        live_graphs.move_to_end(session_id)
+
+    with live.lock:
+        for node in graph_schematic['nodes']:
+            for p in node['params']:
+                param_key = (node['name'], p['name'])
+                if param_key not in compiled.literal_slots:
+                    continue
+
+                # images are identified by path and modification time
+                raw = (p['type'], p['value'])
+                if p['type'] == 'image':
+                    raw = (p['type'], io.hash_file(p['value']))
+
+                if live.raw_params.get(param_key) != raw:
+                    live.state.set_literal(
+                        node['name'], 
+                        p['name'], 
+                        _parse_param(p), 
+                        key=raw[1] if p['type'] == 'image' else None
+                    )
+                    live.raw_params[param_key] = raw
+
+        if targets is not None:
+            try:
+                targets = _expand_targets(compiled, targets)
+            except (NameError, ValueError, TypeError) as e:
+                return jsonify({'error': 'Invalid targets: {}'.format(e)}), 400
+
+        def send_outputs(step, outs):
+            # write outputs for the client as soon as each node finishes, so 
+            # intermediate arrays can be released during the run
+            live.sent_outputs[step.name] = {key: _sanitize_output(key, val) 
+                                            for key, val in outs.items()}
+
+        compiled.run(
+            live.state,
+            executor=config['EXECUTOR'], 
+            max_workers=config['MAX_WORKERS'], 
+            result_cache=result_cache,
+            keep=[] if config['RELEASE_INTERMEDIATES'] else None,
+            callback=send_outputs,
+            targets=targets,
+            arena=buffer_arena,
+            precision=config['PRECISION'],
+            profiler=profiler
+        )
+
+        # nodes that were not recomputed reuse the files written previously
+        if targets is None:
+            results = [{'node': step.name, 'outputs': live.sent_outputs[step.name]}
+                       for step in compiled.steps]
+        else:
+            results = []
+            for step in compiled.steps:
+                names = [name for target, name in targets if target == step.name]
+                if names:
+                    results.append({
+                        'node': step.name,
+                        'outputs': {name: live.sent_outputs[step.name][name] for name in names}
+                    })
+
+    if profiler is not None:
+        trace_fname = 'trace-{}.json'.format(uuid.uuid4().hex)
+        profiler.save_trace(os.path.join(TEMP_DIR, trace_fname))
+        return jsonify({
+            'results': results,
+            'profile': {
+                'nodes': profiler.summary(),
+                'trace': os.path.join('/static/temp/', trace_fname)
+            }
+        })
+    return jsonify(results)
+
+@app.route('/run-batch', methods=['POST'])
+def run_batch():
+    """
+    Run graph once for every image in the active folder, streaming progress 
+    back as one JSON object per line. The image is set on the param named by 
+    the form fields 'node' and 'param'. If the form field 'outputs' holds a 
+    JSON list of node names or [node, output] pairs, only these outputs are 
+    returned and all others are released during each run. Images that fail 
+    to load or run are reported with an 'error' instead of 'results'.
+    """
+
+    graph_schematic = json.loads(request.form['graph'])
+    input_key = (request.form['node'], request.form['param'])
+    keep = json.loads(request.form['outputs']) if 'outputs' in request.form else None
+
+    try:
+        _, compiled = _get_plan(graph_schematic)
+    except opnet.GraphCycleError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # the response is sent before the first image runs, so the request is 
+    # checked here
+    if input_key not in compiled.literal_slots:
+        return jsonify({'error': 'Invalid input: {} of node {} is not a literal param.'.format(
+            input_key[1], input_key[0])}), 400
+    if keep is not None:
+        try:
+            keep = _expand_targets(compiled, keep)
+        except (NameError, ValueError, TypeError) as e:
+            return jsonify({'error': 'Invalid outputs: {}'.format(e)}), 400
+
+    # nodes that do not depend on the image run only for the first one
+    state = compiled.new_state()
     for node in graph_schematic['nodes']:
-        node_params = {}
         for p in node['params']:
-            if p['type'] == 'image':
-                node_params[p['name']] = io.load_image(p['value'])
-            elif not isinstance(p['value'], str):
-                node_params[p['name']] = p['value']
-            elif _s_abs(p['value']).isdigit():
-                node_params[p['name']] = int(p['value'])
-            elif len(p['value'].split('.')) == 2 \
-                 and all(_s_abs(s).isdigit() for s in p['value'].split('.')):
-                node_params[p['name']] = float(p['value'])
-            elif p['value'][0] == '[' and p['value'][-1] == ']':
-                node_params[p['name']] = json.loads(p['value'])
+            key = (node['name'], p['name'])
+            if key in compiled.literal_slots and key != input_key:
+                state.set_literal(node['name'], p['name'], _parse_param(p))
+
+    img_names = _list_images()
+
+    def load(uri):
+        # a failed image must not stop the prefetch of the following ones
+        try:
+            return io.load_image(uri), None
+        except Exception as e:
+            return None, e
+
+    def generate():
+        batch = executors.prefetch(img_names, load, config['BATCH_PREFETCH'])
+        for i, (uri, (img, error)) in enumerate(batch):
+            progress = {
+                'index': i,
+                'total': len(img_names),
+                'uri': uri
+            }
+            try:
+                if error is not None:
+                    raise error
+                results = compiled.run(
+                    state,
+                    literals={input_key: img},
+                    executor=config['EXECUTOR'], 
+                    max_workers=config['MAX_WORKERS'],
+                    keep=keep,
+                    arena=buffer_arena,
+                    precision=config['PRECISION']
+                )
+                for node in results:
+                    node['outputs'] = {key: _sanitize_output(key, val) 
+                                       for key, val in node['outputs'].items()}
+            except Exception as e:
+                progress['error'] = '{}: {}'.format(type(e).__name__, e)
             else:
-                node_params[p['name']] = p['value']
+                progress['results'] = results
+            yield json.dumps(progress) + '\n'
 
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+class LiveGraph:
+    """
+    Values of a compiled graph kept between /run-graph calls of a session, 
+    along with the raw param values it was last given and the responses sent 
+    for the outputs of each node.
+    """
+
+    def __init__(self, compiled, key):
+        self.plan = compiled
+        self.key = key
+        self.state = compiled.new_state()
+        self.raw_params = {}
+        self.sent_outputs = {}
+        self.lock = threading.Lock()
+
+def _list_images():
+    """
+    Return paths of the images in the active folder.
+    """
+
+    if folder_index is None:
+        return io.list_all_images(config["FILE_DIR"])
+    return folder_index.scan(config["FILE_DIR"], io.IMAGE_EXTS)
+
+def _probe_images(img_names):
+    """
+    Return probe.probe_image dicts of IMG_NAMES, reusing indexed ones.
+    """
+
+    if folder_index is None:
+        return probe.probe_images(img_names, config['PROBE_WORKERS'])
+    return folder_index.probes(img_names, config['PROBE_WORKERS'])
+
+def _thumbnail_keys(img_names):
+    """
+    Return dict mapping IMG_NAMES to their thumbnail keys if indexed.
+    """
+
+    if folder_index is None:
+        return {}
+    return {name: entry['thumb_key'] for name, entry in folder_index.entries(img_names).items()}
+
+def _get_plan(graph_schematic):
+    """
+    Return structure key and compiled Plan of GRAPH_SCHEMATIC, compiling it 
+    only if no graph of the same structure was compiled recently. Raises 
+    GraphCycleError if the conduits form a cycle.
+    """
+
+    key = hashlib.sha1(
+        json.dumps(_graph_structure(graph_schematic)).encode('utf-8')).hexdigest()
+    with plans_lock:
+        compiled = plans.get(key)
+        if compiled is not None:
+            plans.move_to_end(key)
+            return key, compiled
+
+    compiled = plan.Plan(_build_graph(graph_schematic))
+    with plans_lock:
+        plans[key] = compiled
+        while len(plans) > config['MAX_PLANS']:
+            plans.popitem(last=False)
+    return key, compiled
+
+def _expand_targets(compiled, targets):
+    """
+    Return list of (node name, output name) pairs from TARGETS, a list of node 
+    names or [node, output] pairs. A node name stands for all its outputs. 
+    Raises NameError if a node or output does not exist.
+    """
+
+    pairs = []
+    for target in targets:
+        if isinstance(target, str):
+            pairs.extend((target, name) for name, _ in compiled.get_step(target).outputs)
+        else:
+            node_name, output_name = target
+            compiled.output_slot(node_name, output_name)
+            pairs.append((node_name, output_name))
+    return pairs
+
+def _graph_structure(graph_schematic):
+    """
+    Return hashable description of the nodes and conduits of GRAPH_SCHEMATIC, 
+    ignoring literal param values.
+    """
+
+    nodes = tuple(
+        (n['name'], n['op'], tuple(p['name'] for p in n['params']), tuple(n['outputs']))
+        for n in graph_schematic['nodes']
+    )
+    conduits = tuple(sorted(
+        (c['output_node'], c['output'], c['param_node'], c['param'])
+        for c in graph_schematic['conduits']
+    ))
+    return nodes, conduits
+
+def _build_graph(graph_schematic):
+    """
+    Create OpNet with the nodes and conduits of GRAPH_SCHEMATIC. Param values 
+    are left unset.
+    """
+
+    graph = opnet.OpNet()
+    for node in graph_schematic['nodes']:
         graph.add_node(
             op_manager.ops[node['op']]['ref'], 
-            node_params, 
+            {p['name']: None for p in node['params']}, 
             node['outputs'], 
             name=node['name']
         )
@@ -203,18 +569,38 @@ def run_graph():
             conduit['param']
         )
 
-    results = graph.run()
-    for node in results:
-        for key, val in node['outputs'].items():
-            newval, datatype = io.json_sanitize(val)
+    return graph
 
-            node['outputs'][key] = {
-                'name': key,
-                'value': newval,
-                'datatype': datatype
-            }
+def _parse_param(p):
+    """
+    Convert param P sent by the client to the value passed to its operation.
+    """
 
-    return jsonify(results)
+    if p['type'] == 'image':
+        return io.load_image(p['value'])
+    elif not isinstance(p['value'], str):
+        return p['value']
+    elif _s_abs(p['value']).isdigit():
+        return int(p['value'])
+    elif len(p['value'].split('.')) == 2 \
+         and all(_s_abs(s).isdigit() for s in p['value'].split('.')):
+        return float(p['value'])
+    elif p['value'][0] == '[' and p['value'][-1] == ']':
+        return json.loads(p['value'])
+    else:
+        return p['value']
+
+def _sanitize_output(name, val):
+    """
+    Return JSON-serializable description of output NAME with value VAL.
+    """
+
+    newval, datatype = io.json_sanitize(val)
+    return {
+        'name': name,
+        'value': newval,
+        'datatype': datatype
+    }
 
 def _s_abs(s):
     return re.sub('-', '', s)